@@ -0,0 +1,141 @@
+"""
+Declarative achievement engine.
+
+Achievements are data (achievements.json): each one is a threshold on a
+single user_stats counter. Rules are indexed by counter and sorted by
+threshold, so an action only evaluates the rules on the counters it changed,
+against a cached set of the user's already-earned achievement IDs. New awards
+for any number of users are written with one storage call.
+"""
+
+import json
+import os
+from bisect import bisect_right
+from dotenv import load_dotenv
+import storage
+from cache import TTLCache
+
+# Load environment variables
+load_dotenv()
+
+# user_stats counters each activity delta can change
+DELTA_COUNTERS = {
+    'messages': ('total_messages',),
+    'grammar_checks': ('grammar_checks',),
+    'vocab_lookups': ('vocab_lookups', 'words_learned'),
+}
+
+# Counters that can move on any action (points, and the level/streak derived from them)
+ACTIVITY_COUNTERS = ('total_points', 'level', 'current_streak')
+
+# Awarding points can raise the level, which can unlock level achievements
+BONUS_COUNTERS = ('total_points', 'level')
+
+def load_catalog(path):
+    """Load achievement definitions from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def counters_for(delta_fields):
+    """Counters touched by a stats delta such as {'messages': 1}"""
+    counters = set(ACTIVITY_COUNTERS)
+    for field in delta_fields:
+        counters.update(DELTA_COUNTERS.get(field, ()))
+    return counters
+
+class AchievementEngine:
+    """Evaluates only the rules affected by a change and awards in bulk"""
+
+    def __init__(self, catalog, earned_cache_size=10000, earned_cache_ttl=600):
+        self.catalog = {a['id']: a for a in catalog}
+        self._rules = {}    # counter -> (sorted thresholds, rules in the same order)
+        for achievement in sorted(catalog, key=lambda a: a['threshold']):
+            thresholds, rules = self._rules.setdefault(achievement['counter'], ([], []))
+            thresholds.append(achievement['threshold'])
+            rules.append(achievement)
+        self._earned = TTLCache(maxsize=earned_cache_size, ttl=earned_cache_ttl)
+        self.rules_evaluated = 0
+        self.awarded = 0
+
+    def reached(self, stats, counters):
+        """Achievements whose threshold is met on any of the given counters"""
+        found = []
+        for counter in counters:
+            if counter not in self._rules:
+                continue
+            thresholds, rules = self._rules[counter]
+            count = bisect_right(thresholds, stats.get(counter) or 0)
+            self.rules_evaluated += count
+            found.extend(rules[:count])
+        return found
+
+    async def _load_earned(self, user_ids):
+        """Fill the earned-set cache for users not in it (one query for all)"""
+        missing = [u for u in user_ids if self._earned.get(u) is None]
+        if not missing:
+            return
+
+        earned = await storage.db.get_earned_achievements(missing)
+        for user_id, ids in earned.items():
+            self._earned.set(user_id, ids)
+
+    async def process(self, changes):
+        """
+        changes: {user_id: (stats, counters)} after a stats update.
+        Awards every newly reached achievement and returns
+        {user_id: {"stats": latest stats, "new_achievements": [...]}}.
+        """
+        results = {
+            user_id: {"stats": stats, "new_achievements": []}
+            for user_id, (stats, _) in changes.items()
+        }
+        pending = {user_id: counters for user_id, (_, counters) in changes.items()}
+
+        # Bonus points can unlock level achievements, so repeat until nothing new
+        while pending:
+            await self._load_earned(list(pending))
+
+            awards = []
+            for user_id, counters in pending.items():
+                earned = self._earned.get(user_id) or set()
+                for achievement in self.reached(results[user_id]["stats"], counters):
+                    if achievement['id'] not in earned:
+                        awards.append({
+                            "user_id": user_id,
+                            "achievement_id": achievement['id'],
+                            "achievement_name": achievement['name'],
+                            "points": achievement['points'],
+                        })
+            if not awards:
+                break
+
+            awarded = await storage.db.award_achievements(awards)
+
+            # Attempted IDs are earned either way (ON CONFLICT means already earned)
+            for award in awards:
+                earned = self._earned.get(award['user_id']) or set()
+                earned.add(award['achievement_id'])
+                self._earned.set(award['user_id'], earned)
+
+            pending = {}
+            for item in awarded:
+                user_id = item['user_id']
+                results[user_id]["stats"] = item['stats']
+                results[user_id]["new_achievements"].extend(item['new_achievements'])
+                self.awarded += len(item['new_achievements'])
+                pending[user_id] = BONUS_COUNTERS
+
+        return results
+
+    def stats(self):
+        return {
+            "achievements": len(self.catalog),
+            "counters_indexed": len(self._rules),
+            "rules_evaluated": self.rules_evaluated,
+            "awarded": self.awarded,
+            "earned_cache": self._earned.stats(),
+        }
+
+engine = AchievementEngine(
+    load_catalog(os.getenv("ACHIEVEMENTS_PATH", os.path.join(os.path.dirname(__file__), "achievements.json")))
+)
@@ -0,0 +1,189 @@
+"""
+Admission control for LLM work.
+
+Groq calls are the scarce resource: every upstream completion holds one of
+LLM_MAX_CONCURRENCY slots. When all slots are busy, callers wait in a
+priority queue (interactive chat ahead of grammar/vocabulary, ahead of bulk
+batch lookups) for at most LLM_QUEUE_TIMEOUT seconds. Each user also has a
+token bucket of USER_RATE_BURST requests refilled at USER_RATE_LIMIT per
+minute. Instead of piling up until the provider rate-limits everybody, a
+request that cannot be admitted fails fast with Rejected, which the API
+turns into 429 Too Many Requests with a Retry-After header.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Lower runs first
+INTERACTIVE = 0    # /chat
+STANDARD = 1       # /grammar-check, /vocabulary
+BULK = 2           # /vocabulary/batch
+BACKGROUND = 3
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STANDARD: "standard", BULK: "bulk", BACKGROUND: "background"}
+
+class Rejected(Exception):
+    """Request not admitted; retry_after is a whole number of seconds"""
+
+    def __init__(self, reason, retry_after, message):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class AdmissionController:
+    """Global concurrency cap with a priority wait queue, plus per-user token buckets"""
+
+    def __init__(self, max_concurrent=32, max_queue=200, queue_timeout=10.0,
+                 rate_per_minute=30, burst=10, max_users=10000):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_users = max_users
+        self.active = 0
+        self.queued = 0
+        self._waiters = []    # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._buckets = OrderedDict()    # user key -> (tokens, last refill), least recently used first
+        self._service_time = 1.0    # moving average of seconds a slot is held
+        self.admitted = 0
+        self.rejected = Counter()
+
+    def _reject(self, reason, retry_after, message):
+        self.rejected[reason] += 1
+        raise Rejected(reason, retry_after, message)
+
+    def _queue_retry_after(self):
+        """Rough time for the current queue to drain"""
+        return self._service_time * (self.queued + 1) / self.max_concurrent
+
+    def check_rate(self, key, cost=1):
+        """Take `cost` tokens from the user's bucket or raise Rejected"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < cost:
+            self._buckets[key] = (tokens, now)
+            self._reject("rate_limited", (cost - tokens) / self.rate,
+                         "You're sending requests too quickly. Please slow down.")
+        self._buckets[key] = (tokens - cost, now)
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+
+    def grant(self, key, wanted):
+        """Take up to `wanted` tokens from the user's bucket; return how many were granted"""
+        if self.rate <= 0 or wanted <= 0:
+            return max(wanted, 0)
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        granted = min(wanted, int(tokens))
+        self._buckets[key] = (tokens - granted, now)
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        if granted < wanted:
+            self.rejected["rate_limited"] += wanted - granted
+        return granted
+
+    def check_capacity(self):
+        """Fail fast if a new request would find the wait queue already full"""
+        if self.active >= self.max_concurrent and self.queued >= self.max_queue:
+            self._reject("queue_full", self._queue_retry_after(),
+                         "LinguaSpark is busy right now. Please try again shortly.")
+
+    def admit(self, key, cost=1):
+        """
+        Up-front check for an incoming request, before any response is sent:
+        capacity first, so a request turned away for load keeps its tokens.
+        """
+        self.check_capacity()
+        self.check_rate(key, cost)
+
+    async def acquire(self, priority=STANDARD):
+        """Take a concurrency slot, waiting in priority order if none is free"""
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return
+        self.check_capacity()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.queued += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                future.cancel()
+                self.queued -= 1
+                self._prune()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("queue_timeout", self._queue_retry_after(),
+                             "LinguaSpark is busy right now. Please try again shortly.")
+            raise
+        self.admitted += 1
+
+    def release(self):
+        """Return a slot, handing it straight to the highest-priority waiter"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.queued -= 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _prune(self):
+        # Drop abandoned waiters once they outnumber live ones
+        if len(self._waiters) > 2 * self.queued + 16:
+            self._waiters = [w for w in self._waiters if not w[2].done()]
+            heapq.heapify(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, priority=STANDARD):
+        """Hold a concurrency slot for the duration of one LLM call"""
+        started = time.monotonic()
+        await self.acquire(priority)
+        acquired = time.monotonic()
+        metrics.admission_wait.labels(PRIORITY_NAMES.get(priority, str(priority))).observe(acquired - started)
+        try:
+            yield
+        finally:
+            self.release()
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - acquired)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "tracked_users": len(self._buckets),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+controller = AdmissionController(
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "200")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+    rate_per_minute=float(os.getenv("USER_RATE_LIMIT", "30")),
+    burst=int(os.getenv("USER_RATE_BURST", "10")),
+)
@@ -1,85 +1,85 @@
+import asyncio
+import base64
 import hashlib
+import hmac
+import json
 import os
-from datetime import datetime, timedelta
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+import achievements
+import leaderboard
+import storage
+import tokens
+from cache import TTLCache
 
-# Load environment variables
-load_dotenv()
+# Process-wide identity cache: username -> users row.
+# Saves the users SELECT that almost every endpoint starts with.
+_user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("USER_CACHE_TTL", "300")),
+)
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# PBKDF2 work factor for new password hashes. Raising it re-hashes each
+# user's password on their next login.
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("⚠️ SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+def hash_password(password, salt=None, iterations=PASSWORD_HASH_ITERATIONS):
+    """Hash password with salted PBKDF2-HMAC-SHA256 ("pbkdf2_sha256$iterations$salt$hash")"""
+    salt = salt or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations)
+    return f"pbkdf2_sha256${iterations}${salt}${base64.b64encode(digest).decode()}"
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def verify_password(password, stored):
+    """Check a password against a stored hash (PBKDF2, or legacy unsalted SHA-256)"""
+    if stored.startswith('pbkdf2_sha256$'):
+        _, iterations, salt, _ = stored.split('$')
+        return hmac.compare_digest(hash_password(password, salt, int(iterations)), stored)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
 
-def hash_password(password):
-    """Hash password with SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def needs_rehash(stored):
+    """True for legacy SHA-256 hashes and hashes made with an older work factor"""
+    return not stored.startswith(f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}$")
 
-def get_user_by_username(username):
-    """Get user from Supabase by username"""
+async def get_user_by_username(username):
+    """Get user by username (identity cache first, then the database)"""
+    user = _user_cache.get(username)
+    if user is not None:
+        return user
     try:
-        response = supabase.table('users').select('*').eq('username', username).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0]
-        return None
+        user = await storage.db.get_user_by_username(username)
+        if user:
+            _user_cache.set(username, user)
+        return user
     except Exception as e:
         print(f"Error getting user: {e}")
         return None
 
-def get_user_by_email(email):
-    """Get user from Supabase by email"""
+async def get_user_by_email(email):
+    """Get user by email"""
     try:
-        response = supabase.table('users').select('*').eq('email', email).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0]
-        return None
+        return await storage.db.get_user_by_email(email)
     except Exception as e:
         print(f"Error getting user by email: {e}")
         return None
 
-def create_user(username, email, password):
-    """Create a new user in Supabase"""
+async def create_user(username, email, password):
+    """Create a new user (and their initial stats row)"""
     try:
         # Check if user already exists
-        if get_user_by_username(username):
+        if await get_user_by_username(username):
             return {"success": False, "message": "Username already exists"}
         
         # Check if email already exists
-        if get_user_by_email(email):
+        if await get_user_by_email(email):
             return {"success": False, "message": "Email already exists"}
         
-        # Create new user
-        user_data = {
-            "username": username,
-            "email": email,
-            "password": hash_password(password),
-            "created_at": datetime.now().isoformat(),
-        }
+        # Create new user with initialized stats
+        password_hash = await asyncio.to_thread(hash_password, password)
+        user = await storage.db.create_user(username, email, password_hash)
+        invalidate_user(username)
         
-        response = supabase.table('users').insert(user_data).execute()
-        
-        if response.data:
-            # Initialize user stats
-            user_id = response.data[0]['id']
-            stats_data = {
-                "user_id": user_id,
-                "total_messages": 0,
-                "words_learned": 0,
-                "grammar_checks": 0,
-                "vocab_lookups": 0,
-                "current_streak": 0,
-                "longest_streak": 0,
-                "last_activity": None,
-                "total_points": 0,
-                "level": 1,
-            }
-            supabase.table('user_stats').insert(stats_data).execute()
-            
+        if user:
             return {"success": True, "message": "Account created successfully!"}
         else:
             return {"success": False, "message": "Failed to create account"}
@@ -88,25 +88,29 @@ def create_user(username, email, password):
         print(f"Error creating user: {e}")
         return {"success": False, "message": f"Error: {str(e)}"}
 
-def login_user(username, password):
+async def login_user(username, password):
     """Login user"""
     try:
-        user = get_user_by_username(username)
+        user = await get_user_by_username(username)
         
         if not user:
             return {"success": False, "message": "Username not found"}
         
-        if user['password'] != hash_password(password):
+        # The KDF is deliberately slow, so keep it off the event loop. It runs once
+        # per session: later requests present the signed token instead.
+        if not await asyncio.to_thread(verify_password, password, user['password']):
             return {"success": False, "message": "Incorrect password"}
+
+        if needs_rehash(user['password']):
+            new_hash = await asyncio.to_thread(hash_password, password)
+            await storage.db.update_password(user['id'], new_hash)
+            invalidate_user(username)
         
         # Update last activity
-        supabase.table('user_stats').update({
-            "last_activity": datetime.now().isoformat()
-        }).eq('user_id', user['id']).execute()
+        await storage.db.set_last_activity(user['id'], datetime.now().isoformat())
         
         # Get user stats
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        stats = stats_response.data[0] if stats_response.data else {}
+        stats = await storage.db.get_stats(user['id']) or {}
         
         return {
             "success": True, 
@@ -115,213 +119,152 @@ def login_user(username, password):
                 "username": username,
                 "email": user['email'],
                 "stats": stats
-            }
+            },
+            **tokens.signer.issue_pair(user)
         }
     except Exception as e:
         print(f"Login error: {e}")
         return {"success": False, "message": f"Login failed: {str(e)}"}
 
-def get_user(username):
+async def get_user(username):
     """Get user data"""
-    return get_user_by_username(username)
+    return await get_user_by_username(username)
+
+async def revoke_token(claims):
+    """
+    Revoke a verified token in this process and in shared storage, so every
+    worker rejects it. Returns False if it had already been revoked.
+    """
+    tokens.signer.revoke(claims)
+    expires_at = datetime.fromtimestamp(claims['exp'], timezone.utc)
+    return await storage.db.revoke_token(claims['jti'], expires_at)
+
+async def refresh_session(refresh_token):
+    """Exchange a refresh token for a new token pair; the old refresh token is revoked"""
+    claims = tokens.signer.verify(refresh_token, 'refresh')
+    # Revoking is the check: a token another worker already rotated is refused
+    if not await revoke_token(claims):
+        raise tokens.TokenError("Token revoked")
+    return tokens.signer.issue_pair({"id": claims['sub'], "username": claims['usr']})
 
-def save_chat_history(username, message, reply):
-    """Save chat to user history"""
+async def logout_session(access_claims, refresh_token=None):
+    """Revoke the caller's access token and, if given, their refresh token"""
+    await revoke_token(access_claims)
+    if refresh_token:
+        try:
+            await revoke_token(tokens.signer.verify(refresh_token, 'refresh'))
+        except tokens.TokenError:
+            pass
+
+def invalidate_user(username):
+    """Drop a user from the identity cache (after signup or profile changes)"""
+    _user_cache.invalidate(username)
+
+def user_cache_stats():
+    """Hit/miss counters for the identity cache"""
+    return _user_cache.stats()
+
+async def save_chat_history_batch(rows):
+    """
+    Insert many chat_history rows in one statement (write-behind queue).
+    rows: dicts with user_id, message, reply, timestamp. Raises on failure.
+    """
+    await storage.db.insert_chat_history(rows)
+
+def encode_history_cursor(row):
+    """Opaque keyset cursor for the (timestamp, id) of the last row on a page"""
+    raw = json.dumps([row['timestamp'], row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_history_cursor(cursor):
+    """Inverse of encode_history_cursor; raises ValueError on bad input"""
     try:
-        user = get_user_by_username(username)
-        if user:
-            chat_data = {
-                "user_id": user['id'],
-                "message": message,
-                "reply": reply,
-                "timestamp": datetime.now().isoformat()
-            }
-            supabase.table('chat_history').insert(chat_data).execute()
-    except Exception as e:
-        print(f"Error saving chat history: {e}")
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        # Validate both parts; Supabase embeds them in a PostgREST filter
+        datetime.fromisoformat(timestamp)
+        return timestamp, str(uuid.UUID(row_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
 
-def get_chat_history(username):
-    """Get user's chat history"""
+async def get_chat_history(user, limit=50, cursor=None, fields='full'):
+    """
+    Get one page of a user's chat history, newest first.
+    user: users row (or token identity) already resolved by the caller
+    Keyset pagination on (timestamp, id): pass the returned next_cursor to
+    get the following page. Returns (rows, next_cursor).
+    fields: 'full' or 'preview' (replies truncated for list views)
+    """
     try:
-        user = get_user_by_username(username)
-        if user:
-            response = supabase.table('chat_history').select('*').eq('user_id', user['id']).order('timestamp', desc=True).limit(50).execute()
-            return response.data if response.data else []
-        return []
+        before = decode_history_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether another page exists
+        rows = await storage.db.get_chat_history(user['id'], limit + 1, before, fields)
+        next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+    except ValueError:
+        raise
     except Exception as e:
         print(f"Error getting chat history: {e}")
-        return []
+        return [], None
 
 # ============ 🆕 NEW: PROGRESS TRACKING FUNCTIONS ============
 
-def update_stats(username, action_type, points=0):
+async def apply_activity_batch(deltas):
     """
-    Update user statistics based on actions
-    action_type: 'message', 'grammar', 'vocab', 'achievement'
+    Apply aggregated stats deltas for many users in one database call,
+    then award achievements for all of them in one more.
+    deltas: [{"user_id", "username", "messages", "grammar_checks", "vocab_lookups"}, ...]
+    Raises on failure.
     """
-    try:
-        user = get_user_by_username(username)
-        if not user:
-            print(f"Warning: User {username} not found in update_stats")
-            return False
-        
-        # Get current stats
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        if not stats_response.data:
-            return False
-        
-        stats = stats_response.data[0]
-        
-        # Update based on action type
-        updates = {}
-        if action_type == 'message':
-            updates['total_messages'] = stats['total_messages'] + 1
-            updates['total_points'] = stats['total_points'] + 10
-        elif action_type == 'grammar':
-            updates['grammar_checks'] = stats['grammar_checks'] + 1
-            updates['total_points'] = stats['total_points'] + 15
-        elif action_type == 'vocab':
-            updates['vocab_lookups'] = stats['vocab_lookups'] + 1
-            updates['words_learned'] = stats['words_learned'] + 1
-            updates['total_points'] = stats['total_points'] + 20
-        
-        # Update level (every 100 points = 1 level)
-        if 'total_points' in updates:
-            updates['level'] = (updates['total_points'] // 100) + 1
-        
-        # Apply updates
-        if updates:
-            supabase.table('user_stats').update(updates).eq('user_id', user['id']).execute()
-        
-        # Update streak
-        try:
-            update_streak(username)
-        except Exception as streak_error:
-            print(f"Error updating streak: {streak_error}")
-        
-        # Check for achievements
-        try:
-            check_achievements(username)
-        except Exception as achievement_error:
-            print(f"Error checking achievements: {achievement_error}")
-        
-        return True
-    except Exception as e:
-        print(f"Error in update_stats: {str(e)}")
-        return False
+    updated = await storage.db.apply_activity_batch(deltas)
 
-def update_streak(username):
-    """Update daily streak"""
-    try:
-        user = get_user_by_username(username)
-        if not user:
-            return
-        
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        if not stats_response.data:
-            return
-        
-        stats = stats_response.data[0]
-        now = datetime.now()
-        
-        updates = {}
-        
-        if stats['last_activity']:
-            last_activity = datetime.fromisoformat(stats['last_activity'])
-            days_diff = (now.date() - last_activity.date()).days
-            
-            if days_diff == 0:
-                # Same day, no change
-                pass
-            elif days_diff == 1:
-                # Consecutive day, increase streak
-                new_streak = stats['current_streak'] + 1
-                updates['current_streak'] = new_streak
-                if new_streak > stats['longest_streak']:
-                    updates['longest_streak'] = new_streak
-            else:
-                # Streak broken
-                updates['current_streak'] = 1
-        else:
-            updates['current_streak'] = 1
-        
-        updates['last_activity'] = now.isoformat()
-        
-        if updates:
-            supabase.table('user_stats').update(updates).eq('user_id', user['id']).execute()
-    except Exception as e:
-        print(f"Error updating streak: {e}")
+    deltas_by_user = {d['user_id']: d for d in deltas}
+    changes = {
+        user_id: (stats, achievements.counters_for(deltas_by_user[user_id]))
+        for user_id, stats in updated.items()
+    }
 
-def check_achievements(username):
-    """Check and award achievements"""
-    try:
-        user = get_user_by_username(username)
-        if not user:
-            return
-        
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        if not stats_response.data:
-            return
-        
-        stats = stats_response.data[0]
-        
-        # Get existing achievements
-        existing_achievements = supabase.table('user_achievements').select('achievement_id').eq('user_id', user['id']).execute()
-        achievement_ids = [a['achievement_id'] for a in existing_achievements.data] if existing_achievements.data else []
-        
-        # List of achievements
-        possible_achievements = [
-            {"id": "first_message", "name": "First Steps", "condition": stats['total_messages'] >= 1, "points": 50},
-            {"id": "10_messages", "name": "Chatty Learner", "condition": stats['total_messages'] >= 10, "points": 100},
-            {"id": "50_messages", "name": "Conversation Master", "condition": stats['total_messages'] >= 50, "points": 200},
-            {"id": "grammar_5", "name": "Grammar Guru", "condition": stats['grammar_checks'] >= 5, "points": 75},
-            {"id": "vocab_10", "name": "Word Collector", "condition": stats['words_learned'] >= 10, "points": 150},
-            {"id": "streak_7", "name": "Week Warrior", "condition": stats['current_streak'] >= 7, "points": 300},
-            {"id": "level_5", "name": "Level 5 Hero", "condition": stats['level'] >= 5, "points": 500},
-        ]
-        
-        # Check and award new achievements
-        points_to_add = 0
-        for achievement in possible_achievements:
-            if achievement['condition'] and achievement['id'] not in achievement_ids:
-                # Award achievement
-                supabase.table('user_achievements').insert({
-                    "user_id": user['id'],
-                    "achievement_id": achievement['id'],
-                    "achievement_name": achievement['name'],
-                    "earned_at": datetime.now().isoformat()
-                }).execute()
-                points_to_add += achievement['points']
-        
-        # Update total points if any achievements were earned
-        if points_to_add > 0:
-            supabase.table('user_stats').update({
-                "total_points": stats['total_points'] + points_to_add
-            }).eq('user_id', user['id']).execute()
-            
-    except Exception as e:
-        print(f"Error checking achievements: {e}")
+    results = await achievements.engine.process(changes)
+    for user_id, result in results.items():
+        username = deltas_by_user[user_id].get('username')
+        if username:
+            leaderboard.board.record(user_id, username, result['stats'])
+    return results
 
-def get_progress(username):
-    """Get user's progress data"""
+async def get_daily_activity(user, days):
+    """
+    Per-day activity rollup rows for the last `days` days (oldest first).
+    Reads user_daily_activity, maintained alongside user_stats.
+    """
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    return await storage.db.get_daily_activity(user['id'], since)
+
+def join_date(user, stats):
+    """
+    When the account was created. A token identity carries no created_at,
+    so fall back to the user_stats row, which is created with the account.
+    """
+    return user.get('created_at') or stats.get('created_at')
+
+async def get_progress(user):
+    """
+    Get user's progress data
+    user: users row (or token identity) already resolved by the caller
+    """
     try:
-        user = get_user_by_username(username)
-        if not user:
-            return None
-        
         # Get stats
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        stats = stats_response.data[0] if stats_response.data else {}
+        stats = await storage.db.get_stats(user['id']) or {}
         
         # Get recent activity
-        history_response = supabase.table('chat_history').select('*').eq('user_id', user['id']).order('timestamp', desc=True).limit(10).execute()
-        recent_activity = history_response.data if history_response.data else []
+        recent_activity = await storage.db.get_chat_history(user['id'], 10)
         
+        created_at = join_date(user, stats)
         return {
             "stats": stats,
             "recent_activity": recent_activity,
-            "join_date": user.get('created_at'),
-            "total_days": calculate_total_days(user.get('created_at'))
+            "daily_activity": await get_daily_activity(user, 30),
+            "join_date": created_at,
+            "total_days": calculate_total_days(created_at)
         }
     except Exception as e:
         print(f"Error getting progress: {e}")
@@ -335,46 +278,92 @@ def calculate_total_days(created_at):
     now = datetime.now()
     return (now.date() - created.date()).days + 1
 
-def get_weekly_insights(username):
-    """Generate weekly AI insights"""
+async def get_weekly_insights(user):
+    """
+    Generate weekly AI insights
+    user: users row (or token identity) already resolved by the caller
+    """
     try:
-        user = get_user_by_username(username)
-        if not user:
-            return None
-        
         # Get stats
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        stats = stats_response.data[0] if stats_response.data else {}
-        
-        # Calculate this week's activity
-        now = datetime.now()
-        week_ago = now - timedelta(days=7)
-        
-        history_response = supabase.table('chat_history').select('*').eq('user_id', user['id']).gte('timestamp', week_ago.isoformat()).execute()
-        weekly_messages = len(history_response.data) if history_response.data else 0
+        stats = await storage.db.get_stats(user['id']) or {}
         
-        # Get achievements count
-        achievements_response = supabase.table('user_achievements').select('*').eq('user_id', user['id']).execute()
-        achievements_count = len(achievements_response.data) if achievements_response.data else 0
+        # This week's activity from the daily rollup (at most 7 rows)
+        daily = await get_daily_activity(user, 7)
         
-        # Generate insights
-        insights = {
-            "week_summary": {
-                "messages_sent": weekly_messages,
-                "points_earned": stats.get('total_points', 0) % 100,  # Points this level
-                "current_streak": stats.get('current_streak', 0),
-                "level": stats.get('level', 1)
-            },
-            "achievements_unlocked": achievements_count,
-            "total_words_learned": stats.get('words_learned', 0),
-            "motivation": generate_motivation_message(stats)
-        }
+        # Get achievements count (count only, no rows)
+        achievements_count = await storage.db.count_achievements(user['id'])
         
-        return insights
+        return weekly_insights(stats, daily, achievements_count)
     except Exception as e:
         print(f"Error getting weekly insights: {e}")
         return None
 
+def weekly_insights(stats, daily, achievements_count):
+    """Weekly summary from stats and this week's daily rollup rows"""
+    return {
+        "week_summary": {
+            "messages_sent": sum(d['messages'] for d in daily),
+            "grammar_checks": sum(d['grammar_checks'] for d in daily),
+            "vocab_lookups": sum(d['vocab_lookups'] for d in daily),
+            "points_earned": sum(d['points_earned'] for d in daily),
+            "active_days": len(daily),
+            "current_streak": stats.get('current_streak', 0),
+            "level": stats.get('level', 1)
+        },
+        "daily_activity": daily,
+        "achievements_unlocked": achievements_count,
+        "total_words_learned": stats.get('words_learned', 0),
+        "motivation": generate_motivation_message(stats)
+    }
+
+# ============ DASHBOARD ============
+
+def dashboard_etag(stats):
+    """
+    Weak ETag for a user's dashboard, from their user_stats row plus the date
+    (the daily windows and total_days move at midnight UTC).
+    Every write the dashboard shows also updates user_stats: chats count as
+    messages, and achievements add points. So the row is a version that all
+    worker processes read from the same place.
+    """
+    row = json.dumps(stats or {}, sort_keys=True, default=str)
+    digest = hashlib.sha256(row.encode()).hexdigest()[:16]
+    today = datetime.now(timezone.utc).date().isoformat()
+    return f'W/"{digest}-{today}"'
+
+async def get_dashboard(user, stats):
+    """
+    Everything the progress dashboard shows, in one pass: recent activity,
+    30 days of rollups and achievements are fetched concurrently, and the
+    weekly insights are derived from them.
+    user: users row (or token identity) already resolved by the caller
+    stats: the user_stats row already read for the ETag
+    """
+    try:
+        recent_activity, daily, earned = await asyncio.gather(
+            storage.db.get_chat_history(user['id'], 10),
+            get_daily_activity(user, 30),
+            storage.db.get_achievements(user['id']),
+        )
+        stats = stats or {}
+        week_start = (datetime.now(timezone.utc).date() - timedelta(days=6)).isoformat()
+        this_week = [d for d in daily if str(d['day']) >= week_start]
+        created_at = join_date(user, stats)
+
+        return {
+            "username": user['username'],
+            "stats": stats,
+            "recent_activity": recent_activity,
+            "daily_activity": daily,
+            "achievements": earned,
+            "weekly_insights": weekly_insights(stats, this_week, len(earned)),
+            "join_date": created_at,
+            "total_days": calculate_total_days(created_at)
+        }
+    except Exception as e:
+        print(f"Error getting dashboard: {e}")
+        return None
+
 def generate_motivation_message(stats):
     """Generate personalized motivation message"""
     messages = stats.get('total_messages', 0)
@@ -390,28 +379,24 @@ def generate_motivation_message(stats):
     else:
         return "💪 Keep learning! Every message brings you closer to fluency!"
 
-def get_user_achievements(username):
+async def get_user_achievements(user):
     """Get all achievements earned by user"""
     try:
-        user = get_user_by_username(username)
         if not user:
             return []
         
-        achievements_response = supabase.table('user_achievements').select('*').eq('user_id', user['id']).order('earned_at', desc=True).execute()
-        return achievements_response.data if achievements_response.data else []
+        return await storage.db.get_achievements(user['id'])
     except Exception as e:
         print(f"Error getting user achievements: {e}")
         return []
 
-def get_user_stats_only(username):
+async def get_user_stats_only(user):
     """Get only user statistics without other data"""
     try:
-        user = get_user_by_username(username)
         if not user:
             return None
         
-        stats_response = supabase.table('user_stats').select('*').eq('user_id', user['id']).execute()
-        return stats_response.data[0] if stats_response.data else None
+        return await storage.db.get_stats(user['id'])
     except Exception as e:
         print(f"Error getting user stats: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,258 @@
+"""
+Offline load test for the LinguaSpark API.
+
+Runs the FastAPI app in-process through httpx's ASGI transport, with Groq and
+Supabase replaced by the stand-ins in fakes.py, so it needs no network and no
+API keys. Each scenario drives one endpoint at the given concurrency and
+reports throughput, p50/p95/p99 latency and database round trips per request.
+Results are printed as JSON (and optionally written to a file) so runs can be
+diffed across commits.
+
+    python benchmark.py
+    python benchmark.py --requests 1000 --concurrency 100 --groq-latency 0.3
+    python benchmark.py --scenarios chat,progress --output bench.json
+    python benchmark.py --storage sqlite
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+VOCAB_WORDS = [
+    "casa", "perro", "gato", "libro", "agua", "comida", "amigo", "trabajo",
+    "escuela", "ciudad", "tiempo", "familia", "mañana", "noche", "feliz", "rápido",
+]
+
+def _chat_body(i, username):
+    return {"username": username, "text": f"How do I say sentence number {i}?", "user_lang": "English", "target_lang": "Spanish"}
+
+# name -> build(i, username) -> (method, path, json body)
+SCENARIOS = {
+    "chat": lambda i, u: ("POST", "/chat", _chat_body(i, u)),
+    "chat_stream": lambda i, u: ("POST", "/chat/stream", _chat_body(i, u)),
+    "grammar_check": lambda i, u: ("POST", "/grammar-check", {"username": u, "text": f"She go to school {i} times", "language": "English"}),
+    "vocabulary": lambda i, u: ("POST", "/vocabulary", {"username": u, "word": VOCAB_WORDS[i % len(VOCAB_WORDS)], "language": "Spanish"}),
+    "vocabulary_batch": lambda i, u: ("POST", "/vocabulary/batch", {"username": u, "words": [VOCAB_WORDS[(i + k) % len(VOCAB_WORDS)] for k in range(8)], "language": "Spanish"}),
+    "progress": lambda i, u: ("GET", f"/progress/{u}", None),
+    "leaderboard": lambda i, u: ("GET", "/leaderboard?limit=10", None),
+    # Pages of the history written by the chat scenarios (run those first)
+    "history": lambda i, u: ("GET", f"/history/{u}?limit=50", None),
+    "dashboard": lambda i, u: ("GET", f"/dashboard/{u}", None),
+    # Same request, revalidated with If-None-Match like a browser polling it
+    "dashboard_poll": lambda i, u: ("GET", f"/dashboard/{u}", None),
+}
+
+# Scenarios that send back the last ETag each user got for the path
+REVALIDATED = {"dashboard_poll"}
+
+DEFAULT_SCENARIOS = "chat,grammar_check,vocabulary,progress,leaderboard"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline LinguaSpark API benchmark")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS,
+                        help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=50, help="distinct users sending requests")
+    parser.add_argument("--auth", choices=["token", "username"], default="token",
+                        help="identify callers by bearer token or by username lookup")
+    parser.add_argument("--storage", choices=["supabase", "sqlite"], default="supabase",
+                        help="fake Supabase, or a temporary SQLite file")
+    parser.add_argument("--groq-latency", type=float, default=0.05, help="seconds to first token")
+    parser.add_argument("--groq-token-latency", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds per fake Supabase round trip")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args()
+
+def configure_environment(args, workdir):
+    """Settings read at import time by the app modules"""
+    os.environ["STORAGE_BACKEND"] = args.storage
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["VOCAB_CACHE_PATH"] = os.path.join(workdir, "vocab_cache.db")
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+    os.environ.setdefault("SUPABASE_KEY", "benchmark")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ.setdefault("TOKEN_SECRET", "benchmark")
+    # Measure throughput, not the per-user rate limit
+    os.environ.setdefault("USER_RATE_LIMIT", "0")
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def count_calls(db, counter):
+    """Count storage method calls (stand-in for round trips with SQLite)"""
+    for name in dir(db):
+        method = getattr(db, name)
+        if name.startswith('_') or not asyncio.iscoroutinefunction(method):
+            continue
+
+        def wrap(name=name, method=method):
+            async def counted(*args, **kwargs):
+                counter[("storage", name)] += 1
+                return await method(*args, **kwargs)
+            return counted
+
+        setattr(db, name, wrap())
+
+def is_error(response):
+    if response.status_code >= 400:
+        return True
+    if response.status_code == 304:
+        return False
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        return "event: error" in response.text
+    body = response.json()
+    return isinstance(body, dict) and ("error" in body or str(body.get("reply", "")).startswith("❌"))
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+async def run(args):
+    import httpx
+    import fakes
+    import main
+    import persistence
+    import storage
+    import tokens
+
+    groq = fakes.FakeGroq(latency=args.groq_latency, token_latency=args.groq_token_latency)
+    supabase = fakes.FakeSupabase(latency=args.db_latency)
+    fakes.install(groq=groq, supabase=supabase)
+
+    db_calls = supabase.calls
+    if args.storage == "sqlite":
+        db_calls = Counter()
+        count_calls(storage.db, db_calls)
+
+    async def drain_writes():
+        # Flush the write-behind queue so deferred writes count for the scenario
+        await persistence.write_queue.stop()
+        persistence.write_queue.start()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "scenarios": {},
+    }
+
+    async with main.lifespan(main.app):
+        users = []
+        for n in range(args.users):
+            user = await storage.db.create_user(f"bench_user_{n}", f"bench_user_{n}@example.com", "unused")
+            headers = {}
+            if args.auth == "token":
+                headers["Authorization"] = f"Bearer {tokens.signer.issue(user)}"
+            users.append({"username": user["username"], "headers": headers, "etags": {}})
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def send(build, i, revalidate=False):
+                user = users[i % len(users)]
+                method, path, body = build(i, user["username"])
+                headers = user["headers"]
+                if revalidate and path in user["etags"]:
+                    headers = {**headers, "If-None-Match": user["etags"][path]}
+                started = time.perf_counter()
+                response = await client.request(method, path, json=body, headers=headers)
+                if revalidate and "etag" in response.headers:
+                    user["etags"][path] = response.headers["etag"]
+                return (time.perf_counter() - started) * 1000, is_error(response), response.num_bytes_downloaded
+
+            for name in args.scenarios.split(","):
+                build = SCENARIOS[name.strip()]
+                revalidate = name.strip() in REVALIDATED
+
+                for i in range(args.warmup):
+                    await send(build, i, revalidate)
+                await drain_writes()
+
+                calls_before = Counter(db_calls)
+                groq_before = groq.calls
+                latencies = []
+                errors = 0
+                response_bytes = 0
+                counter = itertools.count()
+
+                async def worker():
+                    nonlocal errors, response_bytes
+                    while (i := next(counter)) < args.requests:
+                        elapsed_ms, failed, size = await send(build, args.warmup + i, revalidate)
+                        latencies.append(elapsed_ms)
+                        errors += failed
+                        response_bytes += size
+
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+                wall = time.perf_counter() - started
+                await drain_writes()
+
+                calls = Counter(db_calls)
+                calls.subtract(calls_before)
+                round_trips = sum(calls.values())
+                latencies.sort()
+                report["scenarios"][name] = {
+                    "requests": args.requests,
+                    "errors": errors,
+                    "seconds": round(wall, 3),
+                    "throughput_rps": round(args.requests / wall, 1),
+                    "latency_ms": {
+                        "mean": round(sum(latencies) / len(latencies), 2),
+                        "p50": round(percentile(latencies, 50), 2),
+                        "p95": round(percentile(latencies, 95), 2),
+                        "p99": round(percentile(latencies, 99), 2),
+                        "max": round(latencies[-1], 2),
+                    },
+                    "db_round_trips": round_trips,
+                    "db_round_trips_per_request": round(round_trips / args.requests, 3),
+                    "response_bytes_per_request": round(response_bytes / args.requests),
+                    "db_calls": {f"{table}.{op}": n for (table, op), n in sorted(calls.items()) if n},
+                    "groq_calls_per_request": round((groq.calls - groq_before) / args.requests, 3),
+                }
+                print(f"{name}: {report['scenarios'][name]['throughput_rps']} req/s, "
+                      f"p95 {report['scenarios'][name]['latency_ms']['p95']} ms", file=sys.stderr)
+
+    return report
+
+def main():
+    args = parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir)
+        report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
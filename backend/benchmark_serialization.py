@@ -0,0 +1,131 @@
+"""
+Serialization and compression micro-benchmark for API payloads.
+
+Builds a GET /history page of 50 messages with full-length tutor replies and
+compares FastAPI's default path (jsonable_encoder + stdlib json, as
+JSONResponse renders it) with serialization.FastJSONResponse, then measures
+how many bytes gzip and brotli save and what they cost in CPU. Results are
+printed as JSON, like benchmark.py.
+
+    python benchmark_serialization.py
+    python benchmark_serialization.py --messages 100 --iterations 2000
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+import compression
+import serialization
+
+WORDS = (
+    "hola casa perro gato libro agua comida amigo trabajo escuela ciudad tiempo familia mañana noche "
+    "feliz rápido hablar comer vivir aprender escribir leer viajar cocinar jugar hello house dog cat "
+    "book water food friend work school city time family morning night happy fast speak eat live learn "
+    "write read travel cook play the a is to of and in that you for it with as on"
+).split()
+
+def tutor_reply(rng):
+    """A /chat-style reply (about 700 characters) with varied wording"""
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+    return (
+        f"📝 Translation: {sentence(10)}\n"
+        f"✅ Grammar: {sentence(14)}\n"
+        f"💡 Explanation: {sentence(25)} {sentence(20)}\n"
+        f"📚 Key Vocabulary: {', '.join(f'{rng.choice(WORDS)} ({rng.choice(WORDS)})' for _ in range(4))}\n"
+        f"🗣️ Pronunciation: {sentence(12)}"
+    )
+
+def history_payload(messages):
+    """A /history response body shaped like the real one"""
+    rng = random.Random(42)
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(messages):
+        rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "message": f"How do I say '{' '.join(rng.choice(WORDS) for _ in range(6))}' in Spanish?",
+            "reply": tutor_reply(rng),
+            "timestamp": (started + timedelta(minutes=i)).isoformat(),
+        })
+    return {"history": rows, "next_cursor": "eyJ0cyI6IjIwMjUtMDEtMDFUMDA6MDA6MDArMDA6MDAiLCJpZCI6IjEifQ"}
+
+def default_render(payload):
+    """What FastAPI does for a returned dict: jsonable_encoder, then JSONResponse.render"""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+def per_call_us(fn, iterations):
+    fn()    # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - started) / iterations * 1e6, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization / compression benchmark")
+    parser.add_argument("--messages", type=int, default=50, help="history rows in the payload")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    payload = history_payload(args.messages)
+    body = serialization.dumps(payload)
+    assert json.loads(body) == json.loads(default_render(payload))
+
+    default_us = per_call_us(lambda: default_render(payload), args.iterations)
+    fast_us = per_call_us(lambda: serialization.dumps(payload), args.iterations)
+    stdlib_us = per_call_us(
+        lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), args.iterations
+    )
+
+    encodings = {"identity": {"bytes": len(body), "cpu_us": 0.0}}
+    encodings["gzip"] = {
+        "level": compression.GZIP_LEVEL,
+        "bytes": len(compression.compress(body, "gzip")),
+        "cpu_us": per_call_us(lambda: compression.compress(body, "gzip"), args.iterations // 10 or 1),
+    }
+    if compression.BROTLI:
+        encodings["br"] = {
+            "quality": compression.BROTLI_QUALITY,
+            "bytes": len(compression.compress(body, "br")),
+            "cpu_us": per_call_us(lambda: compression.compress(body, "br"), args.iterations // 10 or 1),
+        }
+    for stats in encodings.values():
+        stats["saved_pct"] = round(100 * (1 - stats["bytes"] / len(body)), 1)
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "orjson": serialization.ORJSON,
+            "brotli": compression.BROTLI,
+            "messages": args.messages,
+            "iterations": args.iterations,
+        },
+        "serialization_us": {
+            "jsonable_encoder+json": default_us,
+            "FastJSONResponse": fast_us,
+            "FastJSONResponse without orjson": stdlib_us,
+            "speedup": round(default_us / fast_us, 1),
+        },
+        "encodings": encodings,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(f"serialization {report['serialization_us']['speedup']}x faster, "
+          f"gzip saves {encodings['gzip']['saved_pct']}%", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+In-process caches for LinguaSpark.
+
+TTLCache is a small LRU cache with per-entry expiry. VocabularyCache puts a
+TTLCache in front of a local SQLite file so vocabulary explanations survive
+restarts and are shared by every worker on the same machine.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class TTLCache:
+    """Least-recently-used cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+def normalize(text):
+    """Case- and whitespace-insensitive cache key component"""
+    return " ".join(text.split()).casefold()
+
+class VocabularyCache:
+    """
+    Two-tier cache for vocabulary explanations keyed by (word, language).
+    Tier 1: in-process LRU with TTL. Tier 2: SQLite file on local disk.
+    """
+
+    def __init__(self, path, maxsize=2048, ttl=3600, persistent_ttl=30 * 24 * 3600):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        self.persistent_ttl = persistent_ttl
+        self.persistent_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vocabulary_cache (
+                word TEXT NOT NULL,
+                language TEXT NOT NULL,
+                explanation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (word, language)
+            )
+        """)
+        self._conn.commit()
+
+    def _load(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT explanation, created_at FROM vocabulary_cache WHERE word = ? AND language = ?",
+                key,
+            ).fetchone()
+        if row and row[1] + self.persistent_ttl > time.time():
+            return row[0]
+        return None
+
+    def _store(self, key, explanation):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vocabulary_cache (word, language, explanation, created_at) VALUES (?, ?, ?, ?)",
+                (*key, explanation, time.time()),
+            )
+            self._conn.commit()
+
+    async def get(self, word, language):
+        """Return the cached explanation or None"""
+        key = (normalize(word), normalize(language))
+        explanation = self.memory.get(key)
+        if explanation is not None:
+            return explanation
+
+        try:
+            explanation = await asyncio.to_thread(self._load, key)
+        except Exception as e:
+            print(f"Error reading vocabulary cache: {e}")
+            explanation = None
+        if explanation is not None:
+            self.persistent_hits += 1
+            self.memory.set(key, explanation)
+            return explanation
+
+        self.misses += 1
+        return None
+
+    async def set(self, word, language, explanation):
+        key = (normalize(word), normalize(language))
+        self.memory.set(key, explanation)
+        try:
+            await asyncio.to_thread(self._store, key, explanation)
+        except Exception as e:
+            print(f"Error persisting vocabulary cache entry: {e}")
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hits": self.memory.hits + self.persistent_hits,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+vocabulary_cache = VocabularyCache(
+    path=os.getenv("VOCAB_CACHE_PATH", os.path.join(os.path.dirname(__file__), "vocab_cache.db")),
+    maxsize=int(os.getenv("VOCAB_CACHE_SIZE", "2048")),
+    ttl=int(os.getenv("VOCAB_CACHE_TTL", "3600")),
+)
@@ -0,0 +1,52 @@
+"""
+Single-flight request coalescing.
+
+When several requests ask for exactly the same LLM completion at the same
+time, only the first one calls upstream; the others wait for and share its
+result (or its error).
+"""
+
+import asyncio
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """
+        Run fn() once per key at a time and return its result to every caller.
+        The upstream call runs as its own task, so a disconnecting caller does
+        not cancel the work the other waiters depend on.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.calls,
+            "shared_results": self.shared,
+        }
+
+def prompt_key(endpoint, model, system, prompt, max_tokens, temperature):
+    """Coalescing key for an LLM call; whitespace differences are ignored"""
+    normalized = " ".join(f"{system}\n{prompt}".split())
+    return (endpoint, model, normalized, max_tokens, temperature)
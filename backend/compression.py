@@ -0,0 +1,123 @@
+"""
+Negotiated response compression.
+
+CompressionMiddleware compresses complete (non-streamed) JSON and text
+responses of at least COMPRESS_MIN_BYTES with brotli (if the brotli package
+is installed and the client accepts br) or gzip. Streamed responses such as
+Server-Sent Events pass through untouched, so tokens are never held back.
+"""
+
+import gzip
+import importlib.util
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+BROTLI = importlib.util.find_spec("brotli") is not None
+if BROTLI:
+    import brotli
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html")
+
+def accepted_encodings(header):
+    """Encodings a client accepts (q > 0), from an Accept-Encoding header"""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def choose_encoding(header):
+    """Best supported encoding for an Accept-Encoding header, or None"""
+    accepted = accepted_encodings(header or "")
+    if BROTLI and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: buffers only the first body message to decide"""
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body message shows the size
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if start is not None:
+                response_start, start = start, None
+                response_headers = dict(response_start.get("headers", []))
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                body = message.get("body", b"")
+                eligible = (
+                    not message.get("more_body", False)
+                    and len(body) >= self.minimum_size
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                    and b"content-encoding" not in response_headers
+                )
+                if not eligible:
+                    passthrough = True
+                    await send(response_start)
+                    await send(message)
+                    return
+
+                compressed = compress(body, encoding)
+                new_headers = [
+                    (k, v) for k, v in response_start.get("headers", [])
+                    if k not in (b"content-length", b"vary")
+                ]
+                vary = response_headers.get(b"vary")
+                new_headers += [
+                    (b"content-encoding", encoding.encode("latin-1")),
+                    (b"content-length", str(len(compressed)).encode("latin-1")),
+                    (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+                ]
+                await send({**response_start, "headers": new_headers})
+                await send({**message, "body": compressed})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,240 @@
+"""
+Conversation memory for /chat.
+
+Each user has an in-process session: a rolling window of recent turns plus
+a running summary of everything older, kept together under
+MEMORY_TOKEN_BUDGET (estimated) tokens. The session is loaded from
+chat_history once, then updated in place by every turn, so consecutive
+messages get context without re-reading or re-sending the whole history.
+
+With several workers a user's turns land on different processes. Before
+each use the session reads the newest few chat_history rows (previews, one
+indexed query) and checks that they are its own turns. When another worker
+has written a turn since, the window is reloaded from chat_history and the
+session's own turns still in the write-behind queue are kept on top.
+
+Turns pushed out of the window are folded into the summary by a background
+LLM call on the small model (at most one per user at a time), so it never
+adds latency to a reply. If that call fails, the summary falls back to a
+truncated list of the learner's messages.
+"""
+
+import asyncio
+import math
+import os
+from collections import deque
+from dotenv import load_dotenv
+import admission
+import prompts
+import routing
+import storage
+from cache import TTLCache
+from coalesce import SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for Llama tokenizers)"""
+    return math.ceil(len(text) / 4)
+
+def clip(text, limit):
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+class Session:
+    __slots__ = ('summary', 'turns', 'pending', 'summarizing', 'head', 'unsynced')
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = deque()     # (message, reply), oldest first
+        self.pending = []        # turns evicted from the window, not yet summarized
+        self.summarizing = False
+        self.head = None         # id of the newest chat_history row the window reflects
+        self.unsynced = []       # turns recorded here and not yet seen in chat_history
+
+class ConversationMemory:
+    """Per-user rolling window + running summary within a token budget"""
+
+    def __init__(self, token_budget=1200, max_turns=8, reply_chars=400, summary_words=120,
+                 maxsize=5000, ttl=1800):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.reply_chars = reply_chars
+        self.summary_words = summary_words
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._loads = SingleFlight()
+        self._tasks = set()
+        self.loads = 0
+        self.reloads = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def _turn_tokens(self, message, reply):
+        return estimate_tokens(message) + estimate_tokens(reply) + 4
+
+    def _fit(self, session):
+        """
+        Once the window exceeds the turn limit or token budget, evict the
+        oldest turns down to half the turns and three quarters of the budget,
+        so the summary is updated every few turns rather than on every turn.
+        """
+        budget = self.token_budget - estimate_tokens(session.summary)
+        used = sum(self._turn_tokens(m, r) for m, r in session.turns)
+        if len(session.turns) <= self.max_turns and used <= budget:
+            return
+        while session.turns and (len(session.turns) > max(1, self.max_turns // 2) or used > 0.75 * budget):
+            message, reply = session.turns.popleft()
+            used -= self._turn_tokens(message, reply)
+            session.pending.append((message, reply))
+
+    async def _session(self, user_id):
+        session = self._sessions.get(user_id)
+        if session is None:
+            return await self._loads.do(user_id, lambda: self._load(user_id))
+        if not await self._in_sync(user_id, session):
+            await self._loads.do(user_id, lambda: self._reload(user_id, session))
+        return session
+
+    async def _in_sync(self, user_id, session):
+        """
+        Whether chat_history holds nothing newer than the window except this
+        session's own turns. Those are marked as synced on the way.
+        """
+        try:
+            rows = await storage.db.get_chat_history(user_id, len(session.unsynced) + 1, fields='preview')
+        except Exception as e:
+            # Carry on with what this process has
+            print(f"Error checking conversation memory: {e}")
+            return True
+
+        unsynced = list(session.unsynced)
+        for row in rows:
+            if row['id'] == session.head:
+                break
+            turn = next((t for t in unsynced if t[0] == row['message']), None)
+            if turn is None:
+                return False    # a turn handled by another worker
+            unsynced.remove(turn)
+        else:
+            if session.head is not None and rows:
+                return False
+
+        if rows:
+            session.head = rows[0]['id']
+            session.unsynced = unsynced
+        return True
+
+    async def _fetch(self, user_id, session):
+        """Fill the window from the newest chat_history rows, oldest first"""
+        try:
+            rows = await storage.db.get_chat_history(user_id, self.max_turns)
+        except Exception as e:
+            print(f"Error loading conversation memory: {e}")
+            rows = []
+        session.turns.clear()
+        for row in reversed(rows):
+            session.turns.append((row['message'], clip(row['reply'], self.reply_chars)))
+        if rows:
+            session.head = rows[0]['id']
+        return rows
+
+    async def _load(self, user_id):
+        session = Session()
+        await self._fetch(user_id, session)
+        self._fit(session)
+        self.loads += 1
+        self._sessions.set(user_id, session)
+        return session
+
+    async def _reload(self, user_id, session):
+        """Another worker added turns: rebuild the window in chat_history order"""
+        rows = await self._fetch(user_id, session)
+        stored = [row['message'] for row in rows]
+        unsynced = []
+        for message, reply in session.unsynced:
+            if message in stored:
+                stored.remove(message)
+            else:
+                unsynced.append((message, reply))
+        # Still in some worker's write-behind queue: newest, so they go last
+        session.unsynced = unsynced
+        session.turns.extend(unsynced)
+        # Turns pushed out here are already in the summary or belong to
+        # another worker's; only trim the window
+        evicted = len(session.pending)
+        self._fit(session)
+        del session.pending[evicted:]
+        self.reloads += 1
+
+    async def context(self, user):
+        """Summary and recent turns formatted for prompts.chat() ('' for a new conversation)"""
+        session = await self._session(user['id'])
+        parts = []
+        if session.summary:
+            parts.append(f"Summary of earlier lessons: {session.summary}")
+        for message, reply in session.turns:
+            parts.append(f"Learner: {message}\nTutor: {reply}")
+        return "\n".join(parts)
+
+    async def record(self, user, message, reply):
+        """Add a finished turn; older turns beyond the budget go to the summary"""
+        # context() has just synced the session
+        session = self._sessions.get(user['id']) or await self._session(user['id'])
+        turn = (message, clip(reply, self.reply_chars))
+        session.turns.append(turn)
+        session.unsynced.append(turn)
+        # Bound the check in case some writes never land
+        del session.unsynced[:-self.max_turns]
+        self._fit(session)
+        # Refresh the TTL: active conversations stay in memory
+        self._sessions.set(user['id'], session)
+        if session.pending and not session.summarizing:
+            session.summarizing = True
+            task = asyncio.create_task(self._summarize(session))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session):
+        try:
+            while session.pending:
+                turns, session.pending = session.pending, []
+                try:
+                    summary = await routing.router.complete(
+                        prompts.summary(session.summary, turns, self.summary_words),
+                        priority=admission.BACKGROUND,
+                    )
+                    self.summaries += 1
+                except Exception as e:
+                    print(f"Error summarizing conversation: {e}")
+                    self.summary_failures += 1
+                    earlier = [session.summary] if session.summary else []
+                    summary = "; ".join(earlier + [message for message, _ in turns])
+                # Cap the summary at about half the budget so it can't crowd out recent turns
+                session.summary = clip(" ".join(summary.split()), self.token_budget * 2)
+                self._fit(session)
+        finally:
+            session.summarizing = False
+
+    async def stop(self):
+        """Cancel summaries still running (application shutdown)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "sessions": self._sessions.stats(),
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+        }
+
+memory = ConversationMemory(
+    token_budget=int(os.getenv("MEMORY_TOKEN_BUDGET", "1200")),
+    max_turns=int(os.getenv("MEMORY_MAX_TURNS", "8")),
+    reply_chars=int(os.getenv("MEMORY_REPLY_CHARS", "400")),
+    summary_words=int(os.getenv("MEMORY_SUMMARY_WORDS", "120")),
+    maxsize=int(os.getenv("MEMORY_SESSIONS", "5000")),
+    ttl=float(os.getenv("MEMORY_TTL", "1800")),
+)
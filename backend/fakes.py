@@ -0,0 +1,335 @@
+"""
+In-process stand-ins for Groq and Supabase, used by benchmark.py.
+
+FakeGroq answers chat completions (regular and streamed) with canned text
+after a configurable delay. FakeSupabase implements the slice of the
+PostgREST query builder and the RPC functions that storage_supabase.py uses,
+over in-memory tables, and counts every round trip by table and operation.
+Install them with install(), before the first request.
+"""
+
+import asyncio
+import copy
+import re
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import gateway
+from storage_base import apply_activity, level_for
+
+CANNED_REPLY = (
+    "📝 Translation: Hola, ¿cómo estás?\n"
+    "✅ Grammar: Perfect!\n"
+    "💡 Explanation: A friendly everyday greeting.\n"
+    "📚 Key Vocabulary: hola (hello), estar (to be)\n"
+    "🗣️ Pronunciation: OH-lah, KOH-moh ehs-TAHS"
+)
+
+# ============ GROQ ============
+
+class FakeGroq:
+    """
+    Mimics AsyncGroq().chat.completions.create().
+    latency: seconds before the first token; token_latency: seconds between
+    streamed tokens.
+    """
+
+    def __init__(self, reply=CANNED_REPLY, latency=0.05, token_latency=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+        self.open_streams = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, max_tokens, temperature, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if stream:
+            return _FakeStream(self, self._stream())
+
+        prompt_tokens = sum(len(m['content'].split()) for m in messages)
+        completion_tokens = len(self.reply.split())
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+    async def _stream(self):
+        for token in re.findall(r'\S+\s*', self.reply):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        pass
+
+class _FakeStream:
+    """Like groq.AsyncStream: async-iterable chunks, closed via close() or `async with`"""
+
+    def __init__(self, groq, chunks):
+        self.groq = groq
+        self.chunks = chunks
+        groq.open_streams += 1
+
+    def __aiter__(self):
+        return self.chunks
+
+    async def close(self):
+        if self.chunks is not None:
+            await self.chunks.aclose()
+            self.chunks = None
+            self.groq.open_streams -= 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+# ============ SUPABASE ============
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+# Keyset filter built by SupabaseStorage.get_chat_history
+_KEYSET = re.compile(r'timestamp\.lt\."(?P<ts>[^"]+)",and\(timestamp\.eq\."[^"]+",id\.lt\.(?P<id>[^)]+)\)')
+
+class _Query:
+    """One PostgREST request: table + operation + filters"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.start = 0
+        self.stop = None
+        self.count = None
+        self.head = False
+
+    def select(self, columns='*', count=None, head=False):
+        self.op, self.columns, self.count, self.head = 'select', columns, count, head
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = 'insert', payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = 'update', payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: (row.get(column) or '') >= value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, expression):
+        match = _KEYSET.fullmatch(expression)
+        if not match:
+            raise ValueError(f"FakeSupabase cannot evaluate or_={expression}")
+        position = (match['ts'], match['id'])
+        self.filters.append(lambda row: (row['timestamp'], row['id']) < position)
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.stop = self.start + n
+        return self
+
+    def range(self, start, end):
+        self.start, self.stop = start, end + 1
+        return self
+
+    def _project(self, row):
+        if self.columns.strip() == '*':
+            return copy.deepcopy(row)
+        out = {}
+        for column in (c.strip() for c in self.columns.split(',')):
+            if column == '*':
+                out.update(copy.deepcopy(row))
+            elif column == 'users(username)':
+                out['users'] = {"username": self.db.tables['users_by_id'][row['user_id']]['username']}
+            else:
+                out[column] = row.get(column)
+        return out
+
+    async def execute(self):
+        await self.db.round_trip(self.table, self.op)
+        rows = self.db.rows(self.table)
+
+        if self.op == 'insert':
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            inserted = [self.db.insert(self.table, dict(p)) for p in payload]
+            return SimpleNamespace(data=copy.deepcopy(inserted), count=None)
+
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.op == 'update':
+            for row in matched:
+                row.update(self.payload)
+            return SimpleNamespace(data=copy.deepcopy(matched), count=None)
+
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        count = len(matched) if self.count else None
+        if self.head:
+            return SimpleNamespace(data=[], count=count)
+        page = matched[self.start:self.stop]
+        return SimpleNamespace(data=[self._project(row) for row in page], count=count)
+
+class _Rpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    async def execute(self):
+        await self.db.round_trip('rpc', self.name)
+        return SimpleNamespace(data=getattr(self.db, f"_rpc_{self.name}")(**self.params), count=None)
+
+class FakeSupabase:
+    """
+    In-memory tables behind the PostgREST builder API. The RPC functions
+    follow supabase_gamification.sql through the helpers in storage_base.py.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.tables = {"users_by_id": {}}
+        self.calls = Counter()    # (table, operation) -> round trips
+        self.postgrest = SimpleNamespace(aclose=self._aclose)
+
+    async def _aclose(self):
+        pass
+
+    async def round_trip(self, table, op):
+        self.calls[(table, op)] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def rows(self, table):
+        if table == 'chat_history_preview':
+            return [
+                {**row, "reply_preview": row['reply'][:160]}
+                for row in self.tables.get('chat_history', [])
+            ]
+        return self.tables.setdefault(table, [])
+
+    def insert(self, table, row):
+        row.setdefault('id', str(uuid.uuid4()))
+        if table in ('users', 'user_stats'):
+            row.setdefault('created_at', _now())
+        if table == 'users':
+            self.tables['users_by_id'][row['id']] = row
+        elif table == 'chat_history':
+            row.setdefault('timestamp', _now())
+        self.tables.setdefault(table, []).append(row)
+        return row
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        return _Rpc(self, name, params)
+
+    def _stats_row(self, user_id):
+        for row in self.tables.get('user_stats', []):
+            if row['user_id'] == user_id:
+                return row
+        return None
+
+    def _rollup(self, user_id, **deltas):
+        day = datetime.now(timezone.utc).date().isoformat()
+        for row in self.tables.setdefault('user_daily_activity', []):
+            if row['user_id'] == user_id and row['day'] == day:
+                break
+        else:
+            row = {"user_id": user_id, "day": day, "messages": 0, "grammar_checks": 0, "vocab_lookups": 0, "points_earned": 0}
+            self.tables['user_daily_activity'].append(row)
+        for field, value in deltas.items():
+            row[field] += value
+
+    def _rpc_apply_user_activity(self, p_user_id, p_messages=0, p_grammar_checks=0, p_vocab_lookups=0):
+        row = self._stats_row(p_user_id)
+        if row is None:
+            return None
+        stats, points = apply_activity(row, p_messages, p_grammar_checks, p_vocab_lookups)
+        row.update(stats, updated_at=_now())    # like the update_user_stats_updated_at trigger
+        self._rollup(p_user_id, messages=p_messages, grammar_checks=p_grammar_checks,
+                     vocab_lookups=p_vocab_lookups, points_earned=points)
+        return {"stats": copy.deepcopy(row)}
+
+    def _rpc_apply_user_activity_batch(self, p_deltas):
+        return [
+            {"user_id": d['user_id'], "result": self._rpc_apply_user_activity(
+                d['user_id'], d.get('messages', 0), d.get('grammar_checks', 0), d.get('vocab_lookups', 0))}
+            for d in p_deltas
+        ]
+
+    def _rpc_award_achievements(self, p_awards):
+        held = {(r['user_id'], r['achievement_id']) for r in self.tables.setdefault('user_achievements', [])}
+        new = {}
+        for a in p_awards:
+            if (a['user_id'], a['achievement_id']) in held:
+                continue
+            held.add((a['user_id'], a['achievement_id']))
+            self.insert('user_achievements', {
+                "user_id": a['user_id'],
+                "achievement_id": a['achievement_id'],
+                "achievement_name": a['achievement_name'],
+                "earned_at": _now(),
+            })
+            new.setdefault(a['user_id'], []).append({
+                "achievement_id": a['achievement_id'],
+                "achievement_name": a['achievement_name'],
+                "points": a['points'],
+            })
+
+        results = []
+        for user_id, earned in new.items():
+            row = self._stats_row(user_id)
+            points = sum(a['points'] for a in earned)
+            row['total_points'] += points
+            row['level'] = level_for(row['total_points'])
+            row['updated_at'] = _now()
+            self._rollup(user_id, points_earned=points)
+            results.append({"user_id": user_id, "stats": copy.deepcopy(row), "new_achievements": earned})
+        return results
+
+    def _rpc_revoke_token(self, p_jti, p_expires_at):
+        now = _now()
+        revoked = self.tables.setdefault('revoked_tokens', [])
+        revoked[:] = [r for r in revoked if r['expires_at'] > now]
+        if any(r['jti'] == p_jti for r in revoked):
+            return False
+        revoked.append({"jti": p_jti, "expires_at": p_expires_at})
+        return True
+
+def install(groq=None, supabase=None):
+    """Make gateway hand out the fakes instead of real clients"""
+    if groq is not None:
+        gateway._groq_client = groq
+    if supabase is not None:
+        gateway._supabase_client = supabase
@@ -0,0 +1,216 @@
+"""
+Async gateway for the external services LinguaSpark talks to.
+
+All Groq (LLM) and Supabase (PostgREST) traffic goes through this module so
+that endpoints never block the event loop while waiting on the network.
+Both clients are created once per process on top of long-lived, pooled
+(HTTP/2 when available) httpx connections built by make_http_client().
+"""
+
+import asyncio
+import importlib.util
+import os
+import time
+import httpx
+from dotenv import load_dotenv
+from groq import AsyncGroq
+from supabase import acreate_client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
+import admission
+import metrics
+import resilience
+from coalesce import SingleFlight, prompt_key
+
+# Load environment variables
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+# Connection pool settings shared by the Groq and Supabase clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# HTTP/2 multiplexes concurrent requests over one connection (needs the h2 package)
+HTTP2 = os.getenv("HTTP2", "true").lower() == "true"
+if HTTP2 and importlib.util.find_spec("h2") is None:
+    print("⚠️ HTTP2 is on but the h2 package is missing - using HTTP/1.1 (pip install 'httpx[http2]')")
+    HTTP2 = False
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+# Open upstream connections during startup (the production launcher turns this on)
+PREWARM = os.getenv("PREWARM_CONNECTIONS", "false").lower() == "true"
+PREWARM_TIMEOUT = float(os.getenv("PREWARM_TIMEOUT", "5"))
+
+_groq_client = None
+_supabase_client = None
+_supabase_lock = asyncio.Lock()
+
+# Identical concurrent prompts share one upstream call
+llm_flights = SingleFlight()
+
+def make_http_client(timeout, **kwargs):
+    """Pooled keep-alive httpx client with the configured limits"""
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT),
+        **kwargs,
+    )
+
+def get_groq():
+    """Get the shared async Groq client"""
+    global _groq_client
+    if _groq_client is None:
+        _groq_client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=make_http_client(GROQ_TIMEOUT),
+            # Retries happen in resilience.py, with backoff, jitter and a circuit breaker
+            max_retries=0,
+        )
+    return _groq_client
+
+async def get_supabase() -> AsyncClient:
+    """Get the shared async Supabase client (created on first use)"""
+    global _supabase_client
+    if _supabase_client is None:
+        async with _supabase_lock:
+            if _supabase_client is None:
+                client = await acreate_client(
+                    SUPABASE_URL,
+                    SUPABASE_KEY,
+                    options=AsyncClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT),
+                )
+                # Swap PostgREST's default session for one with our pool limits
+                postgrest = client.postgrest
+                default_session = postgrest.session
+                postgrest.session = make_http_client(
+                    SUPABASE_TIMEOUT,
+                    base_url=default_session.base_url,
+                    headers=default_session.headers,
+                    follow_redirects=True,
+                )
+                await default_session.aclose()
+                _supabase_client = client
+    return _supabase_client
+
+async def startup():
+    """Create the shared clients up front (called on application startup)"""
+    get_groq()
+
+async def warm():
+    """
+    Open the pooled Groq and Supabase connections with one cheap request each,
+    so the first user requests don't pay for DNS, TCP and TLS set-up.
+    Call after storage.db.open(). Failures are logged, never fatal.
+    """
+    async def groq_models():
+        await get_groq().models.list()
+
+    async def supabase_select():
+        await _supabase_client.table('users').select('id').limit(1).execute()
+
+    calls = {"Groq": groq_models()}
+    if _supabase_client is not None:
+        calls["Supabase"] = supabase_select()
+    results = await asyncio.gather(
+        *(asyncio.wait_for(call, PREWARM_TIMEOUT) for call in calls.values()),
+        return_exceptions=True,
+    )
+    for name, result in zip(calls, results):
+        if isinstance(result, Exception):
+            print(f"Error pre-warming {name} connection: {result!r}")
+
+async def complete(system, prompt, max_tokens, temperature, model=DEFAULT_MODEL, endpoint="default",
+                   route="default", priority=admission.STANDARD):
+    """
+    Run a single chat completion and return the reply text.
+    Concurrent calls with the same (endpoint, model, prompt, temperature)
+    are coalesced into one upstream request. Each attempt (retries and
+    hedges included, see resilience.py) holds one admission slot.
+    """
+    async def attempt():
+        async with admission.controller.slot(priority):
+            started = time.perf_counter()
+            try:
+                response = await get_groq().chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+            except Exception:
+                metrics.groq_errors.labels(endpoint, route, model).inc()
+                raise
+            metrics.groq_latency.labels(endpoint, route, model, "complete").observe(time.perf_counter() - started)
+            metrics.observe_groq_usage(endpoint, route, model, getattr(response, 'usage', None))
+            return response.choices[0].message.content
+
+    key = prompt_key(endpoint, model, system, prompt, max_tokens, temperature)
+    return await llm_flights.do(key, lambda: resilience.llm.call(endpoint, model, attempt, fallback_key=key))
+
+async def stream(system, prompt, max_tokens, temperature, model=DEFAULT_MODEL, endpoint="default",
+                 route="default", priority=admission.STANDARD):
+    """
+    Run a chat completion and yield reply tokens as they arrive.
+    Opening the stream is retried like complete() (without hedging); once
+    tokens flow, a failure is final. The admission slot is held until the
+    stream finishes or is closed.
+    """
+    async with admission.controller.slot(priority):
+        started = time.perf_counter()
+        first_token = True
+        usage = None
+
+        async def attempt():
+            return await get_groq().chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+            )
+
+        try:
+            response = await resilience.llm.call(endpoint, model, attempt, hedge=False)
+            # Closes the HTTP response (and frees its pooled connection) even
+            # when the client disconnects mid-stream
+            async with response:
+                async for chunk in response:
+                    # Groq reports token usage on the final chunk
+                    x_groq = getattr(chunk, 'x_groq', None)
+                    if x_groq is not None and getattr(x_groq, 'usage', None) is not None:
+                        usage = x_groq.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            metrics.groq_first_token.labels(endpoint, route, model).observe(time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+        except Exception:
+            metrics.groq_errors.labels(endpoint, route, model).inc()
+            raise
+        metrics.groq_latency.labels(endpoint, route, model, "stream").observe(time.perf_counter() - started)
+        metrics.observe_groq_usage(endpoint, route, model, usage)
+
+async def close():
+    """Close shared clients (called on application shutdown)"""
+    global _groq_client, _supabase_client
+    if _groq_client is not None:
+        await _groq_client.close()
+        _groq_client = None
+    if _supabase_client is not None:
+        await _supabase_client.postgrest.aclose()
+        _supabase_client = None
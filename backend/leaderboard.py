@@ -0,0 +1,158 @@
+"""
+In-memory leaderboard.
+
+Keeps every user's ranking key in a SortedList (sortedcontainers) so the
+top-K and any user's rank are answered without touching the database, and an
+update moves one key in O(log n). Points are updated
+incrementally whenever stats change (see auth.apply_activity_batch) and the whole
+board is periodically reconciled against user_stats. Updates recorded while a
+reconcile is reading are replayed onto the rebuilt board before it is swapped
+in, so none are lost.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from sortedcontainers import SortedList
+import storage
+
+# Load environment variables
+load_dotenv()
+
+LEADERBOARD_FIELDS = ['level', 'total_points', 'total_messages', 'current_streak', 'words_learned']
+
+class Leaderboard:
+    """Sorted in-memory ranking of all users by total points"""
+
+    def __init__(self, reconcile_interval=300, page_size=1000):
+        self.reconcile_interval = reconcile_interval
+        self.page_size = page_size
+        self._entries = {}       # user_id -> entry
+        self._user_ids = {}      # username -> user_id
+        self._keys = SortedList()    # (-total_points, username, user_id)
+        self._load_lock = asyncio.Lock()
+        self._buffer = None      # [(user_id, username, stats)] recorded during a reconcile
+        self._task = None
+        self.loaded = False
+        self.last_reconciled = None
+
+    @staticmethod
+    def _key(entry):
+        return (-entry['total_points'], entry['username'], entry['user_id'])
+
+    def record(self, user_id, username, stats):
+        """Insert or move one user after their stats changed - O(log n)"""
+        if self._buffer is not None:
+            self._buffer.append((user_id, username, stats))
+        old = self._entries.get(user_id)
+        if old is not None:
+            self._keys.discard(self._key(old))
+
+        entry = {"user_id": user_id, "username": username}
+        for field in LEADERBOARD_FIELDS:
+            entry[field] = stats.get(field) or 0
+        entry['level'] = entry['level'] or 1
+
+        self._entries[user_id] = entry
+        self._user_ids[username] = user_id
+        self._keys.add(self._key(entry))
+
+    def _public(self, rank, entry):
+        return {"rank": rank, "username": entry['username'], **{f: entry[f] for f in LEADERBOARD_FIELDS}}
+
+    def top(self, limit=10):
+        """Top `limit` users with their ranks"""
+        return [
+            self._public(rank, self._entries[key[2]])
+            for rank, key in enumerate(self._keys.islice(0, limit), 1)
+        ]
+
+    def rank(self, username, neighbours=2):
+        """A user's rank plus the users just above and below, or None"""
+        user_id = self._user_ids.get(username)
+        if user_id is None:
+            return None
+
+        entry = self._entries[user_id]
+        index = self._keys.bisect_left(self._key(entry))
+        start = max(0, index - neighbours)
+        window = self._keys.islice(start, index + neighbours + 1)
+
+        return {
+            **self._public(index + 1, entry),
+            "total_users": len(self._keys),
+            "neighbours": [
+                self._public(start + offset + 1, self._entries[key[2]])
+                for offset, key in enumerate(window)
+            ]
+        }
+
+    async def reconcile(self):
+        """Rebuild the board from user_stats (paged) and swap it in"""
+        rows = []
+        offset = 0
+        self._buffer = []
+        try:
+            while True:
+                page = await storage.db.list_stats(offset, self.page_size)
+                rows.extend(page)
+                if len(page) < self.page_size:
+                    break
+                offset += self.page_size
+            recorded, self._buffer = self._buffer, None
+        except BaseException:
+            self._buffer = None
+            raise
+
+        fresh = Leaderboard(self.reconcile_interval, self.page_size)
+        for row in rows:
+            if row.get('username'):
+                fresh.record(row['user_id'], row['username'], row)
+        # A page read before an update misses it. Points only grow, so an
+        # update behind what the read saw is stale and is skipped
+        for user_id, username, stats in recorded:
+            entry = fresh._entries.get(user_id)
+            if entry is None or (stats.get('total_points') or 0) >= entry['total_points']:
+                fresh.record(user_id, username, stats)
+
+        self._entries, self._user_ids, self._keys = fresh._entries, fresh._user_ids, fresh._keys
+        self.loaded = True
+        self.last_reconciled = datetime.now().isoformat()
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with self._load_lock:
+                if not self.loaded:
+                    await self.reconcile()
+
+    async def _reconcile_forever(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"Error reconciling leaderboard: {e}")
+
+    def start(self):
+        """Start periodic reconciliation"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._reconcile_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "users": len(self._keys),
+            "loaded": self.loaded,
+            "last_reconciled": self.last_reconciled,
+        }
+
+board = Leaderboard(reconcile_interval=int(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "300")))
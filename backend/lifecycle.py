@@ -0,0 +1,49 @@
+"""
+Worker lifecycle for GET /ready.
+
+/health says the API is up. /ready says whether this worker process should
+get traffic: it turns ready once application startup (including connection
+pre-warming) has finished, and stops being ready as soon as the worker starts
+draining on SIGTERM, so a load balancer can route around it while in-flight
+requests finish and pending writes are flushed (see script.py).
+"""
+
+import os
+import time
+
+class WorkerLifecycle:
+    """starting -> ready -> draining, for the current worker process"""
+
+    def __init__(self):
+        self.state = "starting"
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.draining_at = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def mark_ready(self):
+        """Startup finished: accept traffic"""
+        if self.state == "starting":
+            self.state = "ready"
+            self.ready_at = time.monotonic()
+
+    def start_draining(self):
+        """Shutdown requested: finish in-flight work, take no new traffic"""
+        if self.state != "draining":
+            self.state = "draining"
+            self.draining_at = time.monotonic()
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "status": self.state,
+            "pid": os.getpid(),
+            "startup_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "uptime_seconds": round(now - self.started_at, 1),
+            "draining_seconds": round(now - self.draining_at, 1) if self.draining_at else None,
+        }
+
+worker = WorkerLifecycle()
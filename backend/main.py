@@ -1,15 +1,81 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+import asyncio
+import json
 import os
+from contextlib import aclosing, asynccontextmanager
+from typing import List, Literal, Optional
+import anyio
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from groq import Groq
+import achievements
+import admission
 import auth
+import cache
+import compression
+import conversation
+import gateway
+import leaderboard
+import lifecycle
+import metrics
+import persistence
+import prompts
+import resilience
+import routing
+import serialization
+import storage
+import tokens
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="LinguaSpark AI", version="3.0.0")
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+
+# Reject requests without a bearer token instead of falling back to a username lookup
+REQUIRE_AUTH_TOKEN = os.getenv("REQUIRE_AUTH_TOKEN", "false").lower() == "true"
+
+# Answer when Groq is down (circuit open / retries exhausted) and nothing is cached
+DEGRADED_MESSAGE = "Our AI tutor is temporarily unavailable. Please try again in a minute."
+
+# POST /vocabulary/batch: most words per request, and Groq calls in flight per request
+VOCAB_BATCH_MAX_WORDS = int(os.getenv("VOCAB_BATCH_MAX_WORDS", "50"))
+VOCAB_BATCH_CONCURRENCY = int(os.getenv("VOCAB_BATCH_CONCURRENCY", "4"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open pooled Groq / database connections before taking traffic
+    await gateway.startup()
+    await storage.db.open()
+    persistence.write_queue.start()
+    leaderboard.board.start()
+    if gateway.PREWARM:
+        # Production launcher: connections open and leaderboard loaded before the first request
+        await gateway.warm()
+        try:
+            await leaderboard.board.ensure_loaded()
+        except Exception as e:
+            print(f"Error loading leaderboard: {e}")
+    lifecycle.worker.mark_ready()
+    yield
+    # Requests have drained by now (uvicorn waits for them); /ready has been 503 since SIGTERM
+    lifecycle.worker.start_draining()
+    await leaderboard.board.stop()
+    await conversation.memory.stop()
+    # Flush pending chat history / stats writes before closing connections
+    await persistence.write_queue.stop()
+    # Release pooled Groq / Supabase connections
+    await gateway.close()
+    await storage.db.close()
+    cache.vocabulary_cache.close()
+
+app = FastAPI(title="LinguaSpark AI", version="3.0.0", lifespan=lifespan)
+
+# gzip/brotli for large non-streamed responses (innermost, so metrics include it)
+app.add_middleware(compression.CompressionMiddleware)
+
+# Request latency / status metrics (see GET /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Enable CORS
 app.add_middleware(
@@ -20,8 +86,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Groq AI client
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+@app.exception_handler(admission.Rejected)
+async def admission_rejected(request: Request, exc: admission.Rejected):
+    """Over capacity or over the user's rate limit: 429 with a retry hint"""
+    route = request.scope.get("route")
+    metrics.errors.labels(route.path if route is not None else "unmatched", exc.reason).inc()
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # ============ REQUEST MODELS ============
 
@@ -34,6 +108,12 @@ class LoginRequest(BaseModel):
     username: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class Message(BaseModel):
     username: str
     text: str
@@ -50,12 +130,44 @@ class VocabularyRequest(BaseModel):
     word: str
     language: str
 
+class VocabularyBatchRequest(BaseModel):
+    username: str
+    words: List[str] = Field(min_length=1, max_length=VOCAB_BATCH_MAX_WORDS)
+    language: str
+
+# ============ SESSION TOKENS ============
+
+def bearer_claims(authorization: Optional[str] = Header(None)):
+    """Verified claims of the request's bearer token, or None if it has none"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        raise HTTPException(status_code=401, detail="Expected a bearer token")
+    try:
+        return tokens.signer.verify(token)
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+async def resolve_user(username, claims):
+    """
+    Identify the caller. A verified token is trusted as-is (no users query);
+    without one, fall back to looking the username up.
+    """
+    if claims is not None:
+        if claims['usr'] != username:
+            raise HTTPException(status_code=403, detail="Token does not belong to this user")
+        return {"id": claims['sub'], "username": claims['usr']}
+    if REQUIRE_AUTH_TOKEN:
+        raise HTTPException(status_code=401, detail="Please login first")
+    return await auth.get_user(username)
+
 # ============ AUTH ENDPOINTS ============
 
 @app.post("/signup")
 async def signup(request: SignupRequest):
     """Register new user"""
-    result = auth.create_user(request.username, request.email, request.password)
+    result = await auth.create_user(request.username, request.email, request.password)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
     return result
@@ -63,228 +175,451 @@ async def signup(request: SignupRequest):
 @app.post("/login")
 async def login(request: LoginRequest):
     """Login user"""
-    result = auth.login_user(request.username, request.password)
+    result = await auth.login_user(request.username, request.password)
     if not result["success"]:
         raise HTTPException(status_code=401, detail=result["message"])
     return result
 
-@app.get("/history/{username}")
-async def get_history(username: str):
-    """Get user's chat history"""
-    history = auth.get_chat_history(username)
-    return {"history": history}
+@app.post("/token/refresh")
+async def refresh_token(request: RefreshRequest):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    try:
+        return await auth.refresh_session(request.refresh_token)
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    except Exception as e:
+        # Without the shared revocation check the old token could be replayed: refuse
+        print(f"Error refreshing session: {e}")
+        raise HTTPException(status_code=503, detail="Could not refresh the session, please try again")
+
+@app.post("/logout")
+async def logout(request: LogoutRequest, claims: Optional[dict] = Depends(bearer_claims)):
+    """Revoke the session's access token (and refresh token, if sent)"""
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Expected a bearer token")
+    try:
+        await auth.logout_session(claims, request.refresh_token)
+    except Exception as e:
+        print(f"Error logging out: {e}")
+        raise HTTPException(status_code=503, detail="Could not log out, please try again")
+    return {"success": True, "message": "Logged out"}
+
+@app.get("/history/{username}", response_class=serialization.FastJSONResponse)
+async def get_history(
+    username: str,
+    limit: int = Query(50, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Literal['full', 'preview'] = 'full',
+    claims: Optional[dict] = Depends(bearer_claims),
+):
+    """
+    Get user's chat history, newest first
+    Pass next_cursor back as ?cursor= to fetch older messages.
+    fields=preview returns truncated replies for list views.
+    """
+    user = await resolve_user(username, claims)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        history, next_cursor = await auth.get_chat_history(user, limit, cursor, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialization.FastJSONResponse({"history": history, "next_cursor": next_cursor})
 
 # ============ MAIN CHAT ENDPOINT ============
 
 @app.post("/chat")
-async def chat(message: Message):
+async def chat(message: Message, claims: Optional[dict] = Depends(bearer_claims)):
+    user = await resolve_user(message.username, claims)
+    if not user:
+        return {"reply": "⚠️ Please login first"}
+
+    admission.controller.admit(user['id'])
     try:
-        user = auth.get_user(message.username)
-        if not user:
-            return {"reply": "⚠️ Please login first"}
-        
-        prompt = f"""You are LinguaSpark, an expert language teacher AI. 
-
-User's message: "{message.text}"
-User's language: {message.user_lang}
-Target language to learn: {message.target_lang}
-
-Your task:
-1. **Translate** the message to {message.target_lang}
-2. **Check grammar** - if there are mistakes in the user's {message.user_lang}, gently correct them
-3. **Explain** the translation in a friendly way
-4. **Provide examples** (1-2 simple ones)
-5. **Teach vocabulary** - highlight key words and their meanings
-6. **Give pronunciation tips** if helpful
-7. **Encourage** the learner
-
-Format your response like this:
-📝 Translation: [translation here]
-✅ Grammar: [if mistakes, show correction, else say "Perfect!"]
-💡 Explanation: [explain the translation]
-📚 Key Vocabulary: [list 2-3 important words with meanings]
-🗣️ Pronunciation: [tips if needed]
-
-Keep it concise (3-4 paragraphs max) and engaging!"""
-
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are LinguaSpark, a friendly and expert language teacher who corrects mistakes gently."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=600,
-            temperature=0.7,
+        # Summary + recent turns of this user's conversation (in-process, one small history check)
+        context = await conversation.memory.context(user)
+        reply = await routing.router.complete(
+            prompts.chat(message.text, message.user_lang, message.target_lang, context),
+            priority=admission.INTERACTIVE,
         )
-
-        reply = response.choices[0].message.content
         
-        # Save to history
-        try:
-            auth.save_chat_history(message.username, message.text, reply)
-        except Exception as chat_error:
-            print(f"Error saving chat history: {chat_error}")
-        
-        # 🆕 NEW: Update stats and award points
-        try:
-            auth.update_stats(message.username, 'message')
-        except Exception as stats_error:
-            print(f"Error updating stats: {stats_error}")
+        # Save to history and award points (written in the background)
+        await conversation.memory.record(user, message.text, reply)
+        await persistence.write_queue.save_chat(user, message.text, reply)
+        await persistence.write_queue.record_activity(user, 'message')
         
         return {"reply": reply}
 
+    except admission.Rejected:
+        raise
+    except resilience.Unavailable:
+        return {"reply": f"⚠️ {DEGRADED_MESSAGE}", "degraded": True}
     except Exception as e:
         print(f"Chat error: {str(e)}")
+        metrics.errors.labels("/chat", "exception").inc()
         return {"reply": f"❌ Error: Unable to process your message. Please try again."}
 
 # ============ GRAMMAR CHECK ============
 
 @app.post("/grammar-check")
-async def grammar_check(request: GrammarCheckRequest):
-    try:
-        user = auth.get_user(request.username)
-        if not user:
-            return {"error": "Please login first"}
-        
-        prompt = f"""You are a {request.language} grammar expert.
-
-Analyze this sentence: "{request.text}"
-
-Provide:
-1. **Corrections** - List all grammar mistakes
-2. **Corrected Version** - Show the correct sentence
-3. **Explanation** - Explain why it was wrong (in simple terms)
-4. **Tips** - Give 1-2 tips to avoid this mistake
-
-If the sentence is perfect, say so and praise the user!
-
-Keep it short and encouraging."""
+async def grammar_check(request: GrammarCheckRequest, claims: Optional[dict] = Depends(bearer_claims)):
+    user = await resolve_user(request.username, claims)
+    if not user:
+        return {"error": "Please login first"}
 
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": f"You are a {request.language} grammar teacher."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=400,
-            temperature=0.5,
-        )
+    admission.controller.admit(user['id'])
+    try:
+        analysis = await routing.router.complete(prompts.grammar(request.text, request.language))
 
-        # 🆕 NEW: Update stats
-        try:
-            auth.update_stats(request.username, 'grammar')
-        except Exception as e:
-            print(f"Error updating grammar stats: {e}")
+        # 🆕 NEW: Update stats (written in the background)
+        await persistence.write_queue.record_activity(user, 'grammar')
 
         return {
             "original": request.text,
-            "analysis": response.choices[0].message.content,
+            "analysis": analysis,
             "language": request.language
         }
 
+    except admission.Rejected:
+        raise
+    except resilience.Unavailable:
+        return {"error": DEGRADED_MESSAGE, "degraded": True}
     except Exception as e:
+        metrics.errors.labels("/grammar-check", "exception").inc()
         return {"error": f"Error: {str(e)}"}
 
 # ============ VOCABULARY ============
 
 @app.post("/vocabulary")
-async def vocabulary_explain(request: VocabularyRequest):
+async def vocabulary_explain(request: VocabularyRequest, claims: Optional[dict] = Depends(bearer_claims)):
+    user = await resolve_user(request.username, claims)
+    if not user:
+        return {"error": "Please login first"}
+
     try:
-        user = auth.get_user(request.username)
-        if not user:
-            return {"error": "Please login first"}
-        
-        prompt = f"""You are a {request.language} vocabulary expert.
-
-Explain the word: "{request.word}"
-
-Provide:
-1. **Meaning** - Simple definition
-2. **Part of Speech** - (noun, verb, adjective, etc.)
-3. **Example Sentences** - Give 3 simple examples
-4. **Synonyms** - List 2-3 similar words
-5. **Common Phrases** - Show 2 common phrases using this word
-6. **Pronunciation** - How to pronounce it
-
-Make it simple and easy to understand!"""
-
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": f"You are a {request.language} vocabulary teacher."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.6,
-        )
+        # Explanations are nearly deterministic per (word, language), so serve them from cache
+        explanation = await cache.vocabulary_cache.get(request.word, request.language)
+        if explanation is None:
+            admission.controller.admit(user['id'])
+            explanation = await routing.router.complete(prompts.vocabulary(request.word, request.language))
+            await cache.vocabulary_cache.set(request.word, request.language, explanation)
 
-        # 🆕 NEW: Update stats
-        try:
-            auth.update_stats(request.username, 'vocab')
-        except Exception as e:
-            print(f"Error updating vocab stats: {e}")
+        # 🆕 NEW: Update stats (written in the background)
+        await persistence.write_queue.record_activity(user, 'vocab')
 
         return {
             "word": request.word,
             "language": request.language,
-            "explanation": response.choices[0].message.content
+            "explanation": explanation
         }
 
+    except admission.Rejected:
+        raise
+    except resilience.Unavailable:
+        return {"error": DEGRADED_MESSAGE, "degraded": True}
     except Exception as e:
+        metrics.errors.labels("/vocabulary", "exception").inc()
         return {"error": f"Error: {str(e)}"}
 
+# ============ STREAMING (SERVER-SENT EVENTS) ============
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+class EventStreamResponse(StreamingResponse):
+    """
+    SSE response that closes its event generator as soon as the response
+    ends, including when the client disconnects mid-stream. Starlette leaves
+    an abandoned generator to garbage collection, and with it the Groq stream,
+    its admission slot and its pooled connection.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content, **kwargs):
+        kwargs.setdefault("headers", {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        super().__init__(content, **kwargs)
+
+    async def stream_response(self, send):
+        try:
+            await super().stream_response(send)
+        finally:
+            # Shielded: on disconnect this runs inside a cancelled task group
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+def sse_response(route, completion_args, on_complete, priority=admission.STANDARD):
+    """
+    Relay Groq tokens to the client as SSE events as they arrive.
+    on_complete(text) runs once the full reply is known (persistence, stats).
+    route labels error metrics.
+    """
+    async def events():
+        parts = []
+        try:
+            # Closed with this generator, not left for garbage collection
+            async with aclosing(routing.router.stream(completion_args, priority)) as stream:
+                async for token in stream:
+                    parts.append(token)
+                    yield sse_event({"token": token})
+        except admission.Rejected as e:
+            # Admitted up front, but timed out waiting for a slot
+            metrics.errors.labels(route, e.reason).inc()
+            yield sse_event({"error": str(e), "retry_after": e.retry_after}, event="error")
+            return
+        except resilience.Unavailable:
+            metrics.errors.labels(route, "unavailable").inc()
+            yield sse_event({"error": DEGRADED_MESSAGE, "degraded": True}, event="error")
+            return
+        except Exception as e:
+            print(f"Streaming error: {e}")
+            metrics.errors.labels(route, "exception").inc()
+            yield sse_event({"error": "Unable to process your message. Please try again."}, event="error")
+            return
+
+        text = "".join(parts)
+        try:
+            await on_complete(text)
+        except Exception as e:
+            print(f"Error persisting streamed reply: {e}")
+            metrics.errors.labels(route, "persistence").inc()
+
+        yield sse_event({"text": text}, event="done")
+
+    return EventStreamResponse(events())
+
+@app.post("/chat/stream")
+async def chat_stream(message: Message, claims: Optional[dict] = Depends(bearer_claims)):
+    """Streaming variant of /chat"""
+    user = await resolve_user(message.username, claims)
+    if not user:
+        raise HTTPException(status_code=401, detail="Please login first")
+    admission.controller.admit(user['id'])
+
+    context = await conversation.memory.context(user)
+
+    async def on_complete(reply):
+        await conversation.memory.record(user, message.text, reply)
+        await persistence.write_queue.save_chat(user, message.text, reply)
+        await persistence.write_queue.record_activity(user, 'message')
+
+    return sse_response(
+        "/chat/stream",
+        prompts.chat(message.text, message.user_lang, message.target_lang, context),
+        on_complete,
+        priority=admission.INTERACTIVE,
+    )
+
+@app.post("/grammar-check/stream")
+async def grammar_check_stream(request: GrammarCheckRequest, claims: Optional[dict] = Depends(bearer_claims)):
+    """Streaming variant of /grammar-check"""
+    user = await resolve_user(request.username, claims)
+    if not user:
+        raise HTTPException(status_code=401, detail="Please login first")
+    admission.controller.admit(user['id'])
+
+    async def on_complete(analysis):
+        await persistence.write_queue.record_activity(user, 'grammar')
+
+    return sse_response("/grammar-check/stream", prompts.grammar(request.text, request.language), on_complete)
+
+@app.post("/vocabulary/stream")
+async def vocabulary_stream(request: VocabularyRequest, claims: Optional[dict] = Depends(bearer_claims)):
+    """Streaming variant of /vocabulary"""
+    user = await resolve_user(request.username, claims)
+    if not user:
+        raise HTTPException(status_code=401, detail="Please login first")
+
+    cached = await cache.vocabulary_cache.get(request.word, request.language)
+    if cached is not None:
+        await persistence.write_queue.record_activity(user, 'vocab')
+
+        async def cached_events():
+            yield sse_event({"token": cached})
+            yield sse_event({"text": cached}, event="done")
+
+        return EventStreamResponse(cached_events())
+
+    admission.controller.admit(user['id'])
+
+    async def on_complete(explanation):
+        await cache.vocabulary_cache.set(request.word, request.language, explanation)
+        await persistence.write_queue.record_activity(user, 'vocab')
+
+    return sse_response("/vocabulary/stream", prompts.vocabulary(request.word, request.language), on_complete)
+
+@app.post("/vocabulary/batch")
+async def vocabulary_batch(request: VocabularyBatchRequest, claims: Optional[dict] = Depends(bearer_claims)):
+    """
+    Explain a list of words, streamed back as Server-Sent Events.
+    Cached words are sent first; the rest are generated concurrently (at most
+    VOCAB_BATCH_CONCURRENCY Groq calls at a time) and each is sent as soon as
+    it completes. Stats for the whole batch are recorded with one write.
+    """
+    user = await resolve_user(request.username, claims)
+    if not user:
+        raise HTTPException(status_code=401, detail="Please login first")
+
+    # Drop blanks and duplicates (same cache key), keeping the first spelling
+    words = {}
+    for word in request.words:
+        if word.strip():
+            words.setdefault(cache.normalize(word), word.strip())
+    words = list(words.values())
+
+    cached = await asyncio.gather(*(cache.vocabulary_cache.get(w, request.language) for w in words))
+    misses = [w for w, explanation in zip(words, cached) if explanation is None]
+    if misses:
+        # Each Groq call costs one rate-limit token: 429 if not even one word
+        # fits, otherwise words beyond the user's remaining budget are refused
+        admission.controller.admit(user['id'])
+        granted = 1 + admission.controller.grant(user['id'], len(misses) - 1)
+        misses, limited = misses[:granted], misses[granted:]
+    else:
+        limited = []
+    semaphore = asyncio.Semaphore(VOCAB_BATCH_CONCURRENCY)
+
+    async def explain(word):
+        try:
+            async with semaphore:
+                explanation = await routing.router.complete(
+                    prompts.vocabulary(word, request.language), priority=admission.BULK
+                )
+            await cache.vocabulary_cache.set(word, request.language, explanation)
+            return word, explanation
+        except Exception as e:
+            print(f"Error explaining '{word}' in batch: {e}")
+            metrics.errors.labels("/vocabulary/batch", "exception").inc()
+            return word, None
+
+    async def events():
+        explained = 0
+        tasks = [asyncio.create_task(explain(w)) for w in misses]
+        try:
+            for word, explanation in zip(words, cached):
+                if explanation is not None:
+                    explained += 1
+                    yield sse_event({"word": word, "explanation": explanation, "cached": True}, event="word")
+
+            for word in limited:
+                yield sse_event({"word": word, "error": "Rate limit reached. Please try this word again in a minute."}, event="word")
+
+            for next_done in asyncio.as_completed(tasks):
+                word, explanation = await next_done
+                if explanation is None:
+                    yield sse_event({"word": word, "error": "Unable to explain this word. Please try again."}, event="word")
+                else:
+                    explained += 1
+                    yield sse_event({"word": word, "explanation": explanation, "cached": False}, event="word")
+        finally:
+            # Client went away: don't leave Groq calls running for nobody
+            for task in tasks:
+                task.cancel()
+
+        if explained:
+            await persistence.write_queue.record_activity(user, 'vocab', count=explained)
+        yield sse_event({
+            "language": request.language,
+            "explained": explained,
+            "cached": len(words) - len(misses) - len(limited),
+            "rate_limited": len(limited),
+            "failed": len(words) - explained,
+        }, event="done")
+
+    return EventStreamResponse(events())
+
 # ============ 🆕 NEW: PROGRESS TRACKING ENDPOINTS ============
 
-@app.get("/progress/{username}")
-async def get_progress(username: str):
+@app.get("/progress/{username}", response_class=serialization.FastJSONResponse)
+async def get_progress(username: str, claims: Optional[dict] = Depends(bearer_claims)):
     """
     Get user's progress dashboard data
     Shows stats, achievements, level, etc.
     """
-    progress = auth.get_progress(username)
+    user = await resolve_user(username, claims)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    progress = await auth.get_progress(user)
     if not progress:
         raise HTTPException(status_code=404, detail="User not found")
-    return progress
+    return serialization.FastJSONResponse(progress)
 
 @app.get("/weekly-insights/{username}")
-async def get_weekly_insights(username: str):
+async def get_weekly_insights(username: str, claims: Optional[dict] = Depends(bearer_claims)):
     """
     Get AI-generated weekly insights
     Shows weekly summary and motivation
     """
-    insights = auth.get_weekly_insights(username)
+    user = await resolve_user(username, claims)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    insights = await auth.get_weekly_insights(user)
     if not insights:
         raise HTTPException(status_code=404, detail="User not found")
     return insights
 
-@app.get("/achievements/{username}")
-async def get_achievements(username: str):
+def etag_matches(if_none_match, etag):
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+@app.get("/dashboard/{username}", response_class=serialization.FastJSONResponse)
+async def get_dashboard(
+    username: str,
+    if_none_match: Optional[str] = Header(None),
+    claims: Optional[dict] = Depends(bearer_claims),
+):
+    """
+    Progress, weekly insights and achievements in one response
+    Send the ETag back as If-None-Match: while nothing has changed the answer
+    is 304 Not Modified after a single user_stats read.
+    """
+    user = await resolve_user(username, claims)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Read before the other queries, so a write during them changes the next ETag
+    stats = await auth.get_user_stats_only(user)
+    headers = {"ETag": auth.dashboard_etag(stats), "Cache-Control": "private, no-cache"}
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    dashboard = await auth.get_dashboard(user, stats)
+    if not dashboard:
+        raise HTTPException(status_code=404, detail="User not found")
+    return serialization.FastJSONResponse(dashboard, headers=headers)
+
+@app.get("/achievements/{username}", response_class=serialization.FastJSONResponse)
+async def get_achievements(username: str, claims: Optional[dict] = Depends(bearer_claims)):
     """
     Get user's earned achievements
     """
-    user = auth.get_user(username)
+    user = await resolve_user(username, claims)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    achievements = auth.get_user_achievements(username)
+    achievements = await auth.get_user_achievements(user)
     
-    return {
+    return serialization.FastJSONResponse({
         "username": username,
         "achievements": achievements,
         "total": len(achievements)
-    }
+    })
 
 @app.get("/stats/{username}")
-async def get_user_stats(username: str):
+async def get_user_stats(username: str, claims: Optional[dict] = Depends(bearer_claims)):
     """
     Get user's statistics only
     Lightweight endpoint for quick stat checks
     """
-    user = auth.get_user(username)
+    user = await resolve_user(username, claims)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    stats = auth.get_user_stats_only(username)
+    stats = await auth.get_user_stats_only(user)
     
     if not stats:
         raise HTTPException(status_code=404, detail="Stats not found")
@@ -294,56 +629,94 @@ async def get_user_stats(username: str):
         "stats": stats
     }
 
-@app.get("/leaderboard")
-async def get_leaderboard(limit: int = 10):
+@app.get("/leaderboard", response_class=serialization.FastJSONResponse)
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100)):
     """
     Get top users by points
-    Returns leaderboard with rankings
+    Served from the in-memory leaderboard (no database query once loaded)
     """
     try:
-        from supabase import create_client
-        import os
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
-        
-        # Get users with their stats, ordered by points
-        query = """
-            SELECT 
-                u.username,
-                u.email,
-                s.total_points,
-                s.level,
-                s.total_messages,
-                s.current_streak,
-                s.words_learned
-            FROM users u
-            JOIN user_stats s ON u.id = s.user_id
-            ORDER BY s.total_points DESC
-            LIMIT {}
-        """.format(limit)
-        
-        # Alternative: Use table queries
-        stats_response = supabase.table('user_stats').select('*, users(username, email)').order('total_points', desc=True).limit(limit).execute()
-        
-        leaderboard = []
-        for idx, stat in enumerate(stats_response.data if stats_response.data else [], 1):
-            leaderboard.append({
-                "rank": idx,
-                "username": stat.get('users', {}).get('username', 'Unknown'),
-                "level": stat.get('level', 1),
-                "total_points": stat.get('total_points', 0),
-                "total_messages": stat.get('total_messages', 0),
-                "current_streak": stat.get('current_streak', 0),
-                "words_learned": stat.get('words_learned', 0)
-            })
-        
-        return {
-            "leaderboard": leaderboard,
-            "total": len(leaderboard)
-        }
+        await leaderboard.board.ensure_loaded()
+        top = leaderboard.board.top(limit)
+        return serialization.FastJSONResponse({
+            "leaderboard": top,
+            "total": len(top)
+        })
     except Exception as e:
         print(f"Error getting leaderboard: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/leaderboard/rank/{username}", response_class=serialization.FastJSONResponse)
+async def get_leaderboard_rank(username: str, neighbours: int = Query(2, ge=0, le=25)):
+    """
+    Get a user's leaderboard position and the users around them
+    """
+    try:
+        await leaderboard.board.ensure_loaded()
+    except Exception as e:
+        print(f"Error loading leaderboard: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    rank = leaderboard.board.rank(username, neighbours)
+    if not rank:
+        raise HTTPException(status_code=404, detail="User not ranked")
+    return serialization.FastJSONResponse(rank)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the vocabulary/identity/achievement caches and LLM request coalescing
+    """
+    return {
+        "vocabulary": cache.vocabulary_cache.stats(),
+        "identity": auth.user_cache_stats(),
+        "achievements": achievements.engine.stats(),
+        "llm_coalescing": gateway.llm_flights.stats(),
+        "conversation_memory": conversation.memory.stats()
+    }
+
+@app.get("/persistence/stats")
+async def persistence_stats():
+    """
+    Write-behind queue depth and flush latency
+    """
+    return persistence.write_queue.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """
+    LLM concurrency slots in use, queued calls and rejections by reason
+    """
+    return admission.controller.stats()
+
+@app.get("/resilience/stats")
+async def resilience_stats():
+    """
+    Circuit breaker state per model and the last-good-reply cache size
+    """
+    return resilience.llm.stats()
+
+# In-process state sampled on each scrape
+metrics.Gauge("linguaspark_write_queue_depth", "Writes waiting in the write-behind queue",
+              lambda: persistence.write_queue.stats()["queue_depth"])
+metrics.Gauge("linguaspark_llm_in_flight", "Distinct LLM requests currently in flight",
+              lambda: gateway.llm_flights.stats()["in_flight"])
+metrics.Gauge("linguaspark_llm_slots_in_use", "LLM concurrency slots held (admission control)",
+              lambda: admission.controller.active)
+metrics.Gauge("linguaspark_llm_queued", "LLM calls waiting for a concurrency slot",
+              lambda: admission.controller.queued)
+metrics.Gauge("linguaspark_llm_open_circuits", "Models whose circuit breaker is open",
+              lambda: sum(b["state"] == "open" for b in resilience.llm.stats()["breakers"].values()))
+metrics.Gauge("linguaspark_leaderboard_users", "Users in the in-memory leaderboard",
+              lambda: leaderboard.board.stats()["users"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Request, Groq and database latency histograms in Prometheus text format
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ============ ROOT & HEALTH ============
 
 @app.get("/")
@@ -352,26 +725,42 @@ async def root():
         "message": "🌟 LinguaSpark AI v3.0 - Gamified Learning!",
         "version": "3.0.0",
         "status": "active",
-        "database": "Supabase PostgreSQL",
+        "database": storage.db.name,
         "endpoints": {
             "auth": {
                 "POST /signup": "Register new user",
-                "POST /login": "Login user"
+                "POST /login": "Login user (returns access and refresh tokens)",
+                "POST /token/refresh": "Exchange a refresh token for new tokens",
+                "POST /logout": "Revoke the session's tokens"
             },
             "learning": {
                 "POST /chat": "Smart language learning chat",
                 "POST /grammar-check": "Grammar correction",
-                "POST /vocabulary": "Word explanations"
+                "POST /vocabulary": "Word explanations",
+                "POST /chat/stream": "Chat reply streamed as Server-Sent Events",
+                "POST /grammar-check/stream": "Grammar analysis streamed as Server-Sent Events",
+                "POST /vocabulary/stream": "Word explanation streamed as Server-Sent Events",
+                "POST /vocabulary/batch": "Explain a list of words (streamed per word)"
             },
             "progress": {
+                "GET /dashboard/{username}": "Progress, weekly insights and achievements (ETag / 304)",
                 "GET /progress/{username}": "User progress dashboard",
                 "GET /stats/{username}": "User statistics only",
                 "GET /achievements/{username}": "User achievements",
                 "GET /weekly-insights/{username}": "Weekly AI insights",
-                "GET /history/{username}": "Chat history"
+                "GET /history/{username}": "Chat history (?limit=, ?cursor=, ?fields=preview)"
             },
             "community": {
-                "GET /leaderboard": "Top users by points"
+                "GET /leaderboard": "Top users by points",
+                "GET /leaderboard/rank/{username}": "User's rank and neighbours"
+            },
+            "system": {
+                "GET /cache/stats": "Cache and request coalescing counters",
+                "GET /persistence/stats": "Write-behind queue depth and flush latency",
+                "GET /admission/stats": "LLM concurrency slots, queue and rejections",
+                "GET /resilience/stats": "Groq circuit breakers and fallback cache",
+                "GET /metrics": "Prometheus metrics (latency histograms, error counters)",
+                "GET /ready": "Worker readiness (503 while starting or draining)"
             }
         },
         "features": [
@@ -383,10 +772,23 @@ async def root():
             "✅ Daily streak tracking",
             "✅ Weekly AI insights",
             "✅ User leaderboard",
-            "✅ Supabase database integration"
+            f"✅ {storage.db.name} database integration"
         ]
     }
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "version": "3.0.0"}
\ No newline at end of file
+    # Still 200 when Groq is failing: the API itself is up and serving degraded answers
+    breakers = resilience.llm.stats()["breakers"]
+    llm_down = any(b["state"] == "open" for b in breakers.values())
+    return {"status": "degraded" if llm_down else "healthy", "version": "3.0.0"}
+
+@app.get("/ready")
+async def ready():
+    """
+    Whether this worker process should receive traffic: 503 while starting up
+    and once it has begun draining for shutdown (see script.py)
+    """
+    stats = lifecycle.worker.stats()
+    stats["pending_writes"] = persistence.write_queue.stats()["queue_depth"]
+    return JSONResponse(status_code=200 if lifecycle.worker.ready else 503, content=stats)
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Prometheus metrics for LinguaSpark.
+
+A deliberately small counter/histogram implementation: recording a value is a
+dict lookup plus a bisect, so instrumenting a request costs a few
+microseconds. Everything runs on the event loop, so no locking is needed.
+GET /metrics serves render() in the Prometheus text exposition format.
+"""
+
+import time
+from bisect import bisect_left
+
+# Seconds; covers fast cache hits up to slow LLM completions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _registry.append(self)
+
+    def labels(self, *values):
+        """The time series for these label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)    # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            yield f"{self.name}_bucket{_labels(self.labelnames, values, [('le', le)])} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, values)} {_number(child.sum)}"
+        yield f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}"
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time (queue depths, cache sizes)"""
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        super().__init__(name, help)
+        self.read = read
+        self._children = {(): None}
+
+    def _render_child(self, values, child):
+        try:
+            value = self.read()
+        except Exception:
+            return
+        yield f"{self.name} {_number(value)}"
+
+def render():
+    """All metrics in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ============ METRICS ============
+
+http_requests = Counter(
+    "linguaspark_http_requests_total", "HTTP requests by route and status code",
+    ("method", "endpoint", "status"))
+http_latency = Histogram(
+    "linguaspark_http_request_duration_seconds", "Time to the last byte of the response",
+    ("method", "endpoint"))
+errors = Counter(
+    "linguaspark_errors_total", "Failed requests by endpoint (5xx responses and handled exceptions)",
+    ("endpoint", "reason"))
+
+groq_latency = Histogram(
+    "linguaspark_groq_request_duration_seconds", "Groq chat completion latency (full response)",
+    ("endpoint", "route", "model", "mode"))
+groq_first_token = Histogram(
+    "linguaspark_groq_time_to_first_token_seconds", "Time until a streamed completion yields its first token",
+    ("endpoint", "route", "model"))
+groq_tokens = Histogram(
+    "linguaspark_groq_tokens", "Tokens per Groq completion",
+    ("endpoint", "route", "model", "kind"), buckets=TOKEN_BUCKETS)
+groq_errors = Counter(
+    "linguaspark_groq_errors_total", "Groq calls that raised",
+    ("endpoint", "route", "model"))
+llm_routes = Counter(
+    "linguaspark_llm_routes_total", "Model router decisions: ok, invalid/error (escalated to the fallback route), failed, streamed",
+    ("endpoint", "route", "outcome"))
+llm_retries = Counter(
+    "linguaspark_llm_retries_total", "Groq attempts retried after a transient error",
+    ("endpoint", "error"))
+llm_hedges = Counter(
+    "linguaspark_llm_hedges_total", "Hedged Groq attempts launched, and how often the hedge won",
+    ("endpoint", "outcome"))
+llm_degraded = Counter(
+    "linguaspark_llm_degraded_total", "Groq calls that failed or were short-circuited, by how they were answered",
+    ("endpoint", "reason", "outcome"))
+admission_wait = Histogram(
+    "linguaspark_admission_wait_seconds", "Time LLM calls waited for a concurrency slot",
+    ("priority",))
+
+db_latency = Histogram(
+    "linguaspark_db_request_duration_seconds", "Supabase round trips by table (or RPC function) and operation",
+    ("table", "operation"))
+db_errors = Counter(
+    "linguaspark_db_errors_total", "Supabase round trips that raised",
+    ("table", "operation"))
+
+def observe_groq_usage(endpoint, route, model, usage):
+    """Record prompt/completion token counts from a Groq usage object"""
+    if usage is None:
+        return
+    groq_tokens.labels(endpoint, route, model, "prompt").observe(usage.prompt_tokens)
+    groq_tokens.labels(endpoint, route, model, "completion").observe(usage.completion_tokens)
+
+# ============ ASGI MIDDLEWARE ============
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request until its last body chunk (so streamed responses
+    count in full) and labels it with the route template, not the raw path,
+    to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_latency.labels(method, endpoint).observe(time.perf_counter() - started)
+            http_requests.labels(method, endpoint, str(status)).inc()
+            if status >= 500:
+                errors.labels(endpoint, "http_5xx").inc()
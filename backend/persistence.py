@@ -0,0 +1,186 @@
+"""
+Write-behind persistence for chat history and stats.
+
+Endpoints enqueue writes and return immediately; a background worker drains
+the queue in batches, bulk-inserting chat_history rows and applying the
+aggregated stats deltas with a single database call per flush.
+
+A failed write is retried with exponential backoff (WRITE_RETRIES times),
+chat rows and stats deltas separately, before the items are dropped. A
+retry after a lost response can apply a write twice; that is preferred to
+losing it.
+"""
+
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+import auth
+
+# Load environment variables
+load_dotenv()
+
+# Stats delta field for each action type
+ACTIVITY_FIELDS = {
+    'message': 'messages',
+    'grammar': 'grammar_checks',
+    'vocab': 'vocab_lookups',
+}
+
+class WriteBehindQueue:
+    """Bounded in-process queue drained by a batching background worker"""
+
+    def __init__(self, maxsize=10000, batch_size=200, flush_interval=0.2, retries=3, retry_delay=0.5):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = None
+        self._worker = None
+
+        # Metrics
+        self.enqueued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retried = 0
+        self.flushes = 0
+        self.backpressure_waits = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        """Start the background worker (idempotent)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the worker (shutdown hook)"""
+        if self._worker is not None and not self._worker.done():
+            # Sentinel: the worker flushes what it holds, drains the rest and exits
+            await self._queue.put(None)
+            await self._worker
+        self._worker = None
+        self._queue = None
+
+    async def _put(self, item):
+        self.start()
+        if self._queue.full():
+            # Backpressure: the producer waits until the worker frees a slot
+            self.backpressure_waits += 1
+        await self._queue.put(item)
+        self.enqueued += 1
+
+    async def save_chat(self, user, message, reply):
+        """Queue a chat_history row"""
+        await self._put(("chat", {
+            "user_id": user['id'],
+            "message": message,
+            "reply": reply,
+            "timestamp": datetime.now().isoformat()
+        }))
+
+    async def record_activity(self, user, action_type, count=1):
+        """Queue a stats update for one action"""
+        await self._put(("activity", (user['id'], user['username'], ACTIVITY_FIELDS[action_type], count)))
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            # Block for the first item, then keep collecting until the batch
+            # is full or flush_interval has passed
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                elif time.monotonic() < deadline:
+                    await asyncio.sleep(0.01)
+                else:
+                    break
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            await self._flush(batch)
+
+        # Anything enqueued while shutting down
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, items):
+        if not items:
+            return
+
+        chat_rows = []
+        deltas = {}
+        for kind, payload in items:
+            if kind == "chat":
+                chat_rows.append(payload)
+            else:
+                user_id, username, field, count = payload
+                delta = deltas.setdefault(user_id, {"user_id": user_id, "username": username})
+                delta[field] = delta.get(field, 0) + count
+
+        started = time.perf_counter()
+        activity_items = len(items) - len(chat_rows)
+        try:
+            if chat_rows:
+                await self._write("chat history", auth.save_chat_history_batch, chat_rows, len(chat_rows))
+            if deltas:
+                # Sorted so concurrent workers lock user_stats rows in the same order
+                await self._write("stats", auth.apply_activity_batch, [deltas[k] for k in sorted(deltas)], activity_items)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.total_flush_ms += elapsed_ms
+
+    async def _write(self, what, write, payload, items):
+        """Run one batch write, retrying with jittered exponential backoff"""
+        for attempt in range(self.retries + 1):
+            try:
+                await write(payload)
+                self.flushed += items
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    self.failed += items
+                    print(f"Error flushing {what} ({items} items, dropped after {attempt + 1} attempts): {e}")
+                    return
+                self.retried += 1
+                print(f"Error flushing {what} ({items} items), retrying: {e}")
+                await asyncio.sleep(random.uniform(0.5, 1.0) * self.retry_delay * 2 ** attempt)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.maxsize,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flushes": self.flushes,
+            "backpressure_waits": self.backpressure_waits,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+write_queue = WriteBehindQueue(
+    maxsize=int(os.getenv("WRITE_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("WRITE_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("WRITE_FLUSH_INTERVAL", "0.2")),
+    retries=int(os.getenv("WRITE_RETRIES", "3")),
+    retry_delay=float(os.getenv("WRITE_RETRY_DELAY", "0.5")),
+)
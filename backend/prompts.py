@@ -0,0 +1,126 @@
+"""
+Prompt templates for the LLM endpoints.
+
+Each function returns the completion arguments for routing.router.complete() /
+routing.router.stream() so the regular and streaming endpoints share one
+prompt. 'input' is the user's raw text, which the router sizes its route by;
+max_tokens is the budget for routes that don't set their own.
+"""
+
+def chat(text, user_lang, target_lang, context=""):
+    """
+    Completion arguments for the main chat endpoint.
+    context: earlier conversation from conversation.py (summary + recent turns)
+    """
+    history = f"""
+Conversation so far (use it for continuity; don't repeat earlier answers):
+{context}
+""" if context else ""
+    prompt = f"""You are LinguaSpark, an expert language teacher AI.
+{history}
+User's message: "{text}"
+User's language: {user_lang}
+Target language to learn: {target_lang}
+
+Your task:
+1. **Translate** the message to {target_lang}
+2. **Check grammar** - if there are mistakes in the user's {user_lang}, gently correct them
+3. **Explain** the translation in a friendly way
+4. **Provide examples** (1-2 simple ones)
+5. **Teach vocabulary** - highlight key words and their meanings
+6. **Give pronunciation tips** if helpful
+7. **Encourage** the learner
+
+Format your response like this:
+📝 Translation: [translation here]
+✅ Grammar: [if mistakes, show correction, else say "Perfect!"]
+💡 Explanation: [explain the translation]
+📚 Key Vocabulary: [list 2-3 important words with meanings]
+🗣️ Pronunciation: [tips if needed]
+
+Keep it concise (3-4 paragraphs max) and engaging!"""
+
+    return {
+        "endpoint": "chat",
+        "input": text,
+        "system": "You are LinguaSpark, a friendly and expert language teacher who corrects mistakes gently.",
+        "prompt": prompt,
+        "max_tokens": 600,
+        "temperature": 0.7,
+    }
+
+def grammar(text, language):
+    """Completion arguments for the grammar check endpoint"""
+    prompt = f"""You are a {language} grammar expert.
+
+Analyze this sentence: "{text}"
+
+Provide:
+1. **Corrections** - List all grammar mistakes
+2. **Corrected Version** - Show the correct sentence
+3. **Explanation** - Explain why it was wrong (in simple terms)
+4. **Tips** - Give 1-2 tips to avoid this mistake
+
+If the sentence is perfect, say so and praise the user!
+
+Keep it short and encouraging."""
+
+    return {
+        "endpoint": "grammar",
+        "input": text,
+        "system": f"You are a {language} grammar teacher.",
+        "prompt": prompt,
+        "max_tokens": 400,
+        "temperature": 0.5,
+    }
+
+def vocabulary(word, language):
+    """Completion arguments for the vocabulary endpoint"""
+    prompt = f"""You are a {language} vocabulary expert.
+
+Explain the word: "{word}"
+
+Provide:
+1. **Meaning** - Simple definition
+2. **Part of Speech** - (noun, verb, adjective, etc.)
+3. **Example Sentences** - Give 3 simple examples
+4. **Synonyms** - List 2-3 similar words
+5. **Common Phrases** - Show 2 common phrases using this word
+6. **Pronunciation** - How to pronounce it
+
+Make it simple and easy to understand!"""
+
+    return {
+        "endpoint": "vocabulary",
+        "input": word,
+        "system": f"You are a {language} vocabulary teacher.",
+        "prompt": prompt,
+        "max_tokens": 500,
+        "temperature": 0.6,
+    }
+
+def summary(previous, turns, max_words):
+    """
+    Completion arguments for folding turns that left the conversation window
+    into the running summary. turns: [(message, reply), ...], oldest first.
+    """
+    transcript = "\n".join(f"Learner: {message}\nTutor: {reply}" for message, reply in turns)
+    prompt = f"""Update the running summary of a language lesson.
+
+Current summary: {previous or "(none yet)"}
+
+New turns:
+{transcript}
+
+Write the updated summary in at most {max_words} words. Keep what helps the
+tutor continue: languages practised, topics, words taught, recurring mistakes
+and the learner's level. Reply with the summary only."""
+
+    return {
+        "endpoint": "summary",
+        "input": transcript,
+        "system": "You summarize language lessons concisely.",
+        "prompt": prompt,
+        "max_tokens": max_words * 2,
+        "temperature": 0.2,
+    }
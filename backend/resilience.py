@@ -0,0 +1,255 @@
+"""
+Resilience policy for Groq calls.
+
+gateway.complete() and gateway.stream() run every upstream call through
+LLMResilience.call(), which adds:
+
+- a timeout per attempt (LLM_ATTEMPT_TIMEOUT) and a deadline for the whole
+  call, retries included (LLM_DEADLINE);
+- retries of transient failures (timeouts, connection errors, 429 and 5xx)
+  with exponential backoff and full jitter, honouring Retry-After;
+- optional hedging (LLM_HEDGING): if an attempt is still running after the
+  model's recent p95 latency, a second one is started and the first reply
+  wins;
+- a circuit breaker per model: after LLM_BREAKER_FAILURES failed calls in a
+  row the model is skipped for LLM_BREAKER_RESET seconds (then one probe is
+  let through). While it is open, or once retries run out, the last good
+  reply for the same prompt is served if there is one; otherwise the call
+  raises Unavailable and the endpoint answers with a degraded message.
+
+The Groq SDK's own retries are turned off (see gateway.get_groq) so this is
+the only retry layer.
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+import groq
+from dotenv import load_dotenv
+import admission
+import metrics
+from cache import TTLCache
+
+# Load environment variables
+load_dotenv()
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class Unavailable(Exception):
+    """The model is failing (circuit open or retries exhausted) and nothing is cached"""
+
+def is_retryable(error):
+    """Transient provider failures worth another attempt"""
+    if isinstance(error, (asyncio.TimeoutError, groq.APIConnectionError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (Retry-After header), if any"""
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half-open after `reset_timeout`"""
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Whether a call may go upstream now (half-open lets one probe through)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_neutral(self):
+        """The call ended without saying anything about the provider's health"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+class LatencyWindow:
+    """Recent successful call latencies, for the hedging delay"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def p95(self):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+class LLMResilience:
+    """Deadline, retries, hedging, circuit breaking and last-good-reply fallback"""
+
+    def __init__(self, deadline=30.0, attempt_timeout=20.0, max_attempts=3, base_delay=0.25, max_delay=4.0,
+                 hedging=False, hedge_min_delay=0.5, breaker_threshold=5, breaker_reset=30.0,
+                 fallback_size=1000, fallback_ttl=24 * 3600):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self._breakers = {}     # model -> CircuitBreaker
+        self._latency = {}      # (endpoint, model) -> LatencyWindow
+        self.last_good = TTLCache(maxsize=fallback_size, ttl=fallback_ttl)
+
+    def breaker(self, model):
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return breaker
+
+    def _fallback(self, endpoint, model, fallback_key, reason):
+        cached = self.last_good.get(fallback_key) if fallback_key is not None else None
+        if cached is None:
+            metrics.llm_degraded.labels(endpoint, reason, "unavailable").inc()
+            raise Unavailable(f"{model} is unavailable ({reason})")
+        metrics.llm_degraded.labels(endpoint, reason, "cached").inc()
+        return cached
+
+    async def call(self, endpoint, model, attempt, fallback_key=None, hedge=True):
+        """
+        Run attempt() (one upstream call) under the policy above.
+        fallback_key: cache key for the last good reply; None disables it
+        (streams, whose result is an iterator).
+        """
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            return self._fallback(endpoint, model, fallback_key, "circuit_open")
+
+        try:
+            result = await asyncio.wait_for(
+                self._retrying(endpoint, model, attempt, hedge and self.hedging), self.deadline
+            )
+        except admission.Rejected:
+            # Our own overload, not the provider's: no breaker or fallback
+            breaker.record_neutral()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                # e.g. 400 Bad Request: the provider is up, the request is wrong
+                breaker.record_neutral()
+                raise
+            breaker.record_failure()
+            print(f"Groq {model} failed for {endpoint}: {e!r}")
+            return self._fallback(endpoint, model, fallback_key, "timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+        except BaseException:
+            # Cancelled (e.g. a streaming client went away): release a half-open
+            # probe, or the breaker would wait for its result forever
+            breaker.record_neutral()
+            raise
+
+        breaker.record_success()
+        if fallback_key is not None:
+            self.last_good.set(fallback_key, result)
+        return result
+
+    async def _retrying(self, endpoint, model, attempt, hedge):
+        for number in range(1, self.max_attempts + 1):
+            try:
+                if hedge:
+                    return await self._hedged(endpoint, model, attempt)
+                return await self._timed(endpoint, model, attempt)
+            except Exception as e:
+                if number == self.max_attempts or not is_retryable(e):
+                    raise
+                # Full jitter: uniform in [0, base * 2^n], capped
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (number - 1)))
+                delay = max(delay, min(retry_after(e) or 0, self.max_delay))
+                metrics.llm_retries.labels(endpoint, type(e).__name__).inc()
+                await asyncio.sleep(delay)
+
+    async def _timed(self, endpoint, model, attempt):
+        started = time.perf_counter()
+        result = await asyncio.wait_for(attempt(), self.attempt_timeout)
+        self._latency.setdefault((endpoint, model), LatencyWindow()).add(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, endpoint, model, attempt):
+        """Start a second attempt if the first outlives the recent p95; first success wins"""
+        p95 = self._latency.setdefault((endpoint, model), LatencyWindow()).p95()
+        if p95 is None:
+            return await self._timed(endpoint, model, attempt)
+
+        tasks = [asyncio.create_task(self._timed(endpoint, model, attempt))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=max(p95, self.hedge_min_delay))
+            if not done:
+                metrics.llm_hedges.labels(endpoint, "launched").inc()
+                tasks.append(asyncio.create_task(self._timed(endpoint, model, attempt)))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            metrics.llm_hedges.labels(endpoint, "won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "breakers": {
+                model: {"state": b.state, "consecutive_failures": b.failures}
+                for model, b in self._breakers.items()
+            },
+            "hedging": self.hedging,
+            "last_good_replies": len(self.last_good),
+        }
+
+llm = LLMResilience(
+    deadline=float(os.getenv("LLM_DEADLINE", "30")),
+    attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "20")),
+    max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25")),
+    max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "4")),
+    hedging=os.getenv("LLM_HEDGING", "false").lower() == "true",
+    hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5")),
+    breaker_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+)
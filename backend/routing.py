@@ -0,0 +1,132 @@
+"""
+Model routing for LLM calls.
+
+Instead of sending every request to the 70B model with a fixed token budget,
+each endpoint has an ordered list of routes (model_routes.json): the first
+route whose max_input_chars fits the user's input is used, so a one-word
+vocabulary lookup or a short grammar check goes to the small instant model.
+Completions from a cheap route are validated; a reply that fails validation
+(or a call that errors) is retried once on the endpoint's fallback route.
+
+Every Groq call is labelled with its route, so latency and token usage per
+route show up in GET /metrics (linguaspark_groq_*{route=...}), together with
+linguaspark_llm_routes_total counting how often each route held or escalated.
+"""
+
+import json
+import os
+from dotenv import load_dotenv
+import admission
+import gateway
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+def load_policy(path):
+    """Load routing policy (model aliases and per-endpoint routes) from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+class ModelRouter:
+    """Picks a model and token budget per request and escalates bad replies"""
+
+    def __init__(self, policy, enabled=True):
+        self.models = policy.get('models', {})
+        self.endpoints = policy.get('endpoints', {})
+        self.enabled = enabled
+
+    def _resolve(self, route, default_max_tokens):
+        return {
+            "name": route['name'],
+            "model": self.models.get(route['model'], route['model']),
+            "max_tokens": route.get('max_tokens', default_max_tokens),
+        }
+
+    def fallback(self, endpoint, default_max_tokens):
+        """The endpoint's most capable route (also used when routing is disabled)"""
+        policy = self.endpoints.get(endpoint)
+        if policy is None or 'fallback' not in policy:
+            return {"name": "default", "model": gateway.DEFAULT_MODEL, "max_tokens": default_max_tokens}
+        return self._resolve(policy['fallback'], default_max_tokens)
+
+    def select(self, endpoint, input_text, default_max_tokens):
+        """First route whose input length limit fits, else the fallback"""
+        policy = self.endpoints.get(endpoint)
+        if self.enabled and policy is not None:
+            length = len(input_text or '')
+            for route in policy.get('routes', []):
+                if length <= route.get('max_input_chars', float('inf')):
+                    return self._resolve(route, default_max_tokens)
+        return self.fallback(endpoint, default_max_tokens)
+
+    def validate(self, endpoint, text):
+        """Whether a reply meets the endpoint's minimum length and required phrases"""
+        rules = self.endpoints.get(endpoint, {}).get('validate', {})
+        text = (text or '').strip()
+        if len(text) < rules.get('min_chars', 1):
+            return False
+        lowered = text.lower()
+        return all(phrase.lower() in lowered for phrase in rules.get('must_contain', []))
+
+    async def complete(self, args, priority=admission.STANDARD):
+        """
+        Run a completion for prompt arguments from prompts.py (which carry the
+        user's raw text as 'input') and return the reply text.
+        """
+        args = dict(args)
+        endpoint = args.get('endpoint', 'default')
+        input_text = args.pop('input', '')
+        route = self.select(endpoint, input_text, args['max_tokens'])
+        fallback = self.fallback(endpoint, args['max_tokens'])
+        can_escalate = (route['model'], route['max_tokens']) != (fallback['model'], fallback['max_tokens'])
+
+        try:
+            reply = await self._call(args, route, priority)
+        except admission.Rejected:
+            raise
+        except Exception as e:
+            if not can_escalate:
+                metrics.llm_routes.labels(endpoint, route['name'], "failed").inc()
+                raise
+            print(f"Route '{route['name']}' for {endpoint} failed, using {fallback['name']}: {e}")
+            metrics.llm_routes.labels(endpoint, route['name'], "error").inc()
+            return await self._call(args, fallback, priority)
+
+        if can_escalate and not self.validate(endpoint, reply):
+            metrics.llm_routes.labels(endpoint, route['name'], "invalid").inc()
+            return await self._call(args, fallback, priority)
+
+        metrics.llm_routes.labels(endpoint, route['name'], "ok").inc()
+        return reply
+
+    async def _call(self, args, route, priority):
+        return await gateway.complete(**{
+            **args,
+            "model": route['model'],
+            "max_tokens": route['max_tokens'],
+            "route": route['name'],
+            "priority": priority,
+        })
+
+    def stream(self, args, priority=admission.STANDARD):
+        """
+        Streaming counterpart of complete(). Tokens are relayed as they arrive,
+        so there is no validation or fallback once the route is chosen.
+        """
+        args = dict(args)
+        endpoint = args.get('endpoint', 'default')
+        route = self.select(endpoint, args.pop('input', ''), args['max_tokens'])
+        metrics.llm_routes.labels(endpoint, route['name'], "streamed").inc()
+        return gateway.stream(**{
+            **args,
+            "model": route['model'],
+            "max_tokens": route['max_tokens'],
+            "route": route['name'],
+            "priority": priority,
+        })
+
+router = ModelRouter(
+    load_policy(os.getenv("MODEL_ROUTES_PATH", os.path.join(os.path.dirname(__file__), "model_routes.json"))),
+    enabled=os.getenv("MODEL_ROUTING", "true").lower() == "true",
+)
@@ -1,12 +1,110 @@
+"""
+LinguaSpark API server.
+
+    python script.py            # production: WEB_CONCURRENCY workers on 0.0.0.0:$PORT
+    python script.py --dev      # one auto-reloading process on 127.0.0.1:8000
+
+Production mode runs one uvicorn worker per CPU core (WEB_CONCURRENCY),
+with uvloop and httptools when they are installed (see
+requirements-optional.txt). Each worker opens its Groq / Supabase
+connections and loads the leaderboard before it accepts requests, then
+reports ready on GET /ready.
+
+On SIGTERM a worker drains: /ready answers 503 straight away, the worker keeps
+serving for DRAIN_DELAY seconds so the load balancer can stop sending it
+traffic, then it stops accepting connections, waits up to
+GRACEFUL_SHUTDOWN_TIMEOUT seconds for in-flight requests, and flushes the
+write-behind queue before exiting. A second signal skips the delay.
+"""
+
+import argparse
+import importlib.util
+import os
+import secrets
+import signal
+import time
 import uvicorn
+from uvicorn.supervisors import Multiprocess
 from dotenv import load_dotenv
-import os
+import lifecycle
 
 # Load environment variables
 load_dotenv()
 
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+DRAIN_DELAY = float(os.getenv("DRAIN_DELAY", "5"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "5"))
+ACCESS_LOG = os.getenv("ACCESS_LOG", "false").lower() == "true"
+
+# Fast event loop and HTTP parser, when installed
+LOOP = "uvloop" if importlib.util.find_spec("uvloop") is not None else "asyncio"
+HTTP = "httptools" if importlib.util.find_spec("httptools") is not None else "h11"
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that marks the worker as draining before it shuts down"""
+
+    drain_deadline = None
+
+    def handle_exit(self, sig, frame):
+        lifecycle.worker.start_draining()
+        if sig == signal.SIGTERM and DRAIN_DELAY > 0 and self.drain_deadline is None:
+            # Keep serving (with /ready at 503) until on_tick() ends the delay
+            self.drain_deadline = time.monotonic() + DRAIN_DELAY
+            return
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter):
+        if self.drain_deadline is not None and time.monotonic() >= self.drain_deadline:
+            return True
+        return await super().on_tick(counter)
+
+def serve(workers):
+    # Settings read by the app when each worker imports main
+    os.environ.setdefault("PREWARM_CONNECTIONS", "true")
+    if workers > 1 and not os.getenv("TOKEN_SECRET"):
+        # Every worker must verify tokens issued by the others
+        print("⚠️ TOKEN_SECRET is not set - generating one shared by all workers (sessions end on restart)")
+        os.environ["TOKEN_SECRET"] = secrets.token_urlsafe(32)
+
+    config = uvicorn.Config(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=LOOP,
+        http=HTTP,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        access_log=ACCESS_LOG,
+    )
+    server = DrainingServer(config)
+    print(f"🌟 Starting LinguaSpark AI Server ({workers} worker{'s' if workers > 1 else ''}, {LOOP} + {HTTP})...")
+    print(f"Server running at: http://{HOST}:{PORT}  (readiness: /ready)")
+
+    if workers == 1:
+        server.run()
+        return
+    # The supervisor binds the socket once and forwards SIGTERM to every worker
+    sock = config.bind_socket()
+    Multiprocess(config, target=server.run, sockets=[sock]).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="LinguaSpark API server")
+    parser.add_argument("--dev", action="store_true", help="one auto-reloading process on 127.0.0.1:8000")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: WEB_CONCURRENCY or CPU count)")
+    args = parser.parse_args()
+
+    if args.dev:
+        print("🌟 Starting LinguaSpark AI Server...")
+        print("Server running at: http://127.0.0.1:8000")
+        print("API Documentation: http://127.0.0.1:8000/docs")
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+        return
+
+    serve(max(1, args.workers))
+
 if __name__ == "__main__":
-    print("🌟 Starting LinguaSpark AI Server...")
-    print(f"Server running at: http://127.0.0.1:8000")
-    print(f"API Documentation: http://127.0.0.1:8000/docs")
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    main()
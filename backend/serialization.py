@@ -0,0 +1,29 @@
+"""
+Fast JSON responses for read-heavy endpoints.
+
+FastAPI runs every returned dict through jsonable_encoder (a recursive copy)
+and then stdlib json.dumps. Endpoints that return large lists of plain
+dicts (chat history, progress, leaderboard) can return FastJSONResponse
+directly instead: it skips jsonable_encoder and serializes with orjson when
+it is installed (pip install orjson), or compact stdlib JSON otherwise.
+"""
+
+import importlib.util
+import json
+from fastapi.responses import JSONResponse
+
+ORJSON = importlib.util.find_spec("orjson") is not None
+if ORJSON:
+    import orjson
+
+def dumps(content):
+    """JSON bytes for plain Python data (dates and other objects become strings)"""
+    if ORJSON:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse without jsonable_encoder, serialized by dumps()"""
+
+    def render(self, content):
+        return dumps(content)
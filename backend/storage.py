@@ -0,0 +1,32 @@
+"""
+Storage backends for LinguaSpark.
+
+auth.py, achievements.py and leaderboard.py talk to the database only
+through the Storage interface (storage_base.py), via the `db` instance
+built here. Two implementations ship:
+
+- SupabaseStorage (storage_supabase.py): the hosted PostgreSQL database,
+  using the functions from supabase_gamification.sql.
+- SQLiteStorage (storage_sqlite.py): a local SQLite file in WAL mode with
+  the same schema, for single-node deployments, load tests and CI.
+
+Pick one with STORAGE_BACKEND=supabase|sqlite.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def create_storage(backend):
+    """Storage implementation for a STORAGE_BACKEND value"""
+    if backend == 'supabase':
+        from storage_supabase import SupabaseStorage
+        return SupabaseStorage()
+    if backend == 'sqlite':
+        from storage_sqlite import SQLiteStorage
+        return SQLiteStorage(os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(__file__), "linguaspark.db")))
+    raise ValueError(f"⚠️ Unknown STORAGE_BACKEND '{backend}' (expected 'supabase' or 'sqlite')")
+
+db = create_storage(os.getenv("STORAGE_BACKEND", "supabase"))
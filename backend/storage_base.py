@@ -0,0 +1,196 @@
+"""
+Storage interface and the stats rules shared by every backend.
+
+Kept apart from storage.py, which picks and builds the configured backend
+at import time, so the backend modules can be imported on their own.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+# Points per unit of each activity counter (see apply_user_activity())
+ACTIVITY_POINTS = {
+    'messages': 10,
+    'grammar_checks': 15,
+    'vocab_lookups': 20,
+}
+
+def level_for(points):
+    """Level reached with the given total points"""
+    return points // 100 + 1
+
+def default_stats(user_id):
+    """A new user's user_stats row"""
+    return {
+        "user_id": user_id,
+        "total_messages": 0,
+        "words_learned": 0,
+        "grammar_checks": 0,
+        "vocab_lookups": 0,
+        "current_streak": 0,
+        "longest_streak": 0,
+        "last_activity": None,
+        "total_points": 0,
+        "level": 1,
+    }
+
+def _as_utc(timestamp):
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+def apply_activity(stats, messages=0, grammar_checks=0, vocab_lookups=0, now=None):
+    """
+    Apply an activity delta to a user_stats row: counters, points, level and
+    daily streak. Same rules as apply_user_activity() in
+    supabase_gamification.sql. Returns (updated stats, points earned).
+    """
+    now = now or datetime.now(timezone.utc)
+    stats = dict(stats)
+    stats['total_messages'] += messages
+    stats['grammar_checks'] += grammar_checks
+    stats['vocab_lookups'] += vocab_lookups
+    stats['words_learned'] += vocab_lookups
+    points = (ACTIVITY_POINTS['messages'] * messages
+              + ACTIVITY_POINTS['grammar_checks'] * grammar_checks
+              + ACTIVITY_POINTS['vocab_lookups'] * vocab_lookups)
+    stats['total_points'] += points
+    stats['level'] = level_for(stats['total_points'])
+
+    if not stats.get('last_activity'):
+        stats['current_streak'] = 1
+    else:
+        days = (now.date() - _as_utc(stats['last_activity']).date()).days
+        if days == 0:
+            stats['current_streak'] = max(stats['current_streak'], 1)
+        elif days == 1:
+            stats['current_streak'] += 1
+        else:
+            stats['current_streak'] = 1
+    stats['longest_streak'] = max(stats['longest_streak'], stats['current_streak'])
+    stats['last_activity'] = now.isoformat()
+    return stats, points
+
+class Storage(ABC):
+    """
+    Interface every storage backend implements. All methods are coroutines
+    and rows are plain dicts keyed by the column names in supabase_setup.sql.
+    A backend missing any of them fails when it is instantiated.
+    """
+
+    name = "storage"
+
+    # ---- users ----
+
+    @abstractmethod
+    async def get_user_by_username(self, username):
+        """users row or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_user_by_email(self, email):
+        """users row or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_user(self, username, email, password_hash):
+        """Insert a user plus their initial user_stats row; return the users row"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_password(self, user_id, password_hash):
+        raise NotImplementedError
+
+    # ---- stats ----
+
+    @abstractmethod
+    async def get_stats(self, user_id):
+        """user_stats row or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_last_activity(self, user_id, timestamp):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def apply_activity_batch(self, deltas):
+        """
+        Atomically apply activity deltas (stats, streak, daily rollup), one
+        per user. deltas: [{"user_id", "messages", "grammar_checks",
+        "vocab_lookups"}, ...]
+        Returns {user_id: updated user_stats row}; unknown users are left out.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_daily_activity(self, user_id, since):
+        """user_daily_activity rows from date `since` on, oldest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def list_stats(self, offset, limit):
+        """One page of user_stats rows ordered by user_id, each with the user's username"""
+        raise NotImplementedError
+
+    # ---- chat history ----
+
+    @abstractmethod
+    async def insert_chat_history(self, rows):
+        """Insert chat_history rows (user_id, message, reply, timestamp) in one statement"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_chat_history(self, user_id, limit, before=None, fields='full'):
+        """
+        Up to `limit` chat_history rows, newest first, strictly older than the
+        (timestamp, id) keyset position `before`. fields='full' returns
+        id, message, reply, timestamp; fields='preview' returns reply_preview
+        (the first 160 characters) instead of reply.
+        """
+        raise NotImplementedError
+
+    # ---- achievements ----
+
+    @abstractmethod
+    async def get_achievements(self, user_id):
+        """user_achievements rows, most recent first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def count_achievements(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_earned_achievements(self, user_ids):
+        """{user_id: set of achievement_id} for every given user"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def award_achievements(self, awards):
+        """
+        Insert achievements and add their bonus points; awards a user already
+        holds are skipped. awards: [{"user_id", "achievement_id",
+        "achievement_name", "points"}, ...]
+        Returns [{"user_id", "stats", "new_achievements"}] for users who
+        actually earned something.
+        """
+        raise NotImplementedError
+
+    # ---- session tokens ----
+
+    @abstractmethod
+    async def revoke_token(self, jti, expires_at):
+        """
+        Record a revoked token (id `jti`, expiring at the datetime `expires_at`)
+        and forget revoked tokens that have expired since. Returns False if the
+        token was already revoked, so only one of several concurrent refreshes
+        with the same token succeeds.
+        """
+        raise NotImplementedError
+
+    async def open(self):
+        """Open connections (application startup)"""
+
+    async def close(self):
+        """Release connections (application shutdown)"""
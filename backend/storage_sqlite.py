@@ -0,0 +1,363 @@
+"""
+SQLite storage backend.
+
+Keeps the schema of supabase_setup.sql (plus the user_daily_activity rollup
+from supabase_gamification.sql) in a local database file in WAL mode. UUIDs
+and timestamps are stored as ISO-8601 text. The stats rules that run as SQL
+functions on Supabase run here through the shared helpers in storage_base.py.
+
+Calls run in a worker thread (asyncio.to_thread) on one connection guarded by
+a lock, like the vocabulary cache. Writes run in BEGIN IMMEDIATE transactions,
+so read-modify-write updates of user_stats stay atomic when several worker
+processes share the file.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from storage_base import Storage, apply_activity, default_stats, level_for
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    id TEXT PRIMARY KEY,
+    user_id TEXT UNIQUE NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    total_messages INTEGER DEFAULT 0,
+    words_learned INTEGER DEFAULT 0,
+    grammar_checks INTEGER DEFAULT 0,
+    vocab_lookups INTEGER DEFAULT 0,
+    current_streak INTEGER DEFAULT 0,
+    longest_streak INTEGER DEFAULT 0,
+    last_activity TEXT,
+    total_points INTEGER DEFAULT 0,
+    level INTEGER DEFAULT 1,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id);
+
+CREATE TABLE IF NOT EXISTS chat_history (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    message TEXT NOT NULL,
+    reply TEXT NOT NULL,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_timestamp_id ON chat_history(user_id, timestamp DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS user_achievements (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    achievement_id TEXT NOT NULL,
+    achievement_name TEXT NOT NULL,
+    earned_at TEXT,
+    UNIQUE(user_id, achievement_id)
+);
+CREATE INDEX IF NOT EXISTS idx_user_achievements_user_id ON user_achievements(user_id);
+
+CREATE TABLE IF NOT EXISTS user_daily_activity (
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    messages INTEGER DEFAULT 0,
+    grammar_checks INTEGER DEFAULT 0,
+    vocab_lookups INTEGER DEFAULT 0,
+    points_earned INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at TEXT NOT NULL
+);
+"""
+
+STATS_COLUMNS = (
+    'total_messages', 'words_learned', 'grammar_checks', 'vocab_lookups',
+    'current_streak', 'longest_streak', 'last_activity', 'total_points', 'level',
+)
+
+HISTORY_COLUMNS = {
+    'full': 'id, message, reply, timestamp',
+    'preview': 'id, message, substr(reply, 1, 160) AS reply_preview, timestamp',
+}
+
+# How long a writer waits for another process's write lock before failing
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def _new_id():
+    return str(uuid.uuid4())
+
+class SQLiteStorage(Storage):
+    """Storage in a local SQLite database file"""
+
+    name = "SQLite"
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly in _transaction()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, fn, *args):
+        with self._lock:
+            # Take the write lock before reading, so no other connection can
+            # change a row between our SELECT and UPDATE
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn, *args)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, fn, *args):
+        with self._lock:
+            return fn(self._conn, *args)
+
+    async def _run(self, fn, *args):
+        """Run fn(conn, *args) in one write transaction on a worker thread"""
+        return await asyncio.to_thread(self._transaction, fn, *args)
+
+    async def _read(self, fn, *args):
+        """Run a read-only fn(conn, *args) on a worker thread (WAL readers never block)"""
+        return await asyncio.to_thread(self._query, fn, *args)
+
+    @staticmethod
+    def _one(conn, sql, params):
+        row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _all(conn, sql, params):
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    # ---- users ----
+
+    async def get_user_by_username(self, username):
+        return await self._read(self._one, "SELECT * FROM users WHERE username = ?", (username,))
+
+    async def get_user_by_email(self, email):
+        return await self._read(self._one, "SELECT * FROM users WHERE email = ?", (email,))
+
+    async def create_user(self, username, email, password_hash):
+        def insert(conn):
+            now = _now()
+            user = {
+                "id": _new_id(),
+                "username": username,
+                "email": email,
+                "password": password_hash,
+                "created_at": now,
+                "updated_at": now,
+            }
+            conn.execute(
+                "INSERT INTO users (id, username, email, password, created_at, updated_at) VALUES (:id, :username, :email, :password, :created_at, :updated_at)",
+                user,
+            )
+            stats = {**default_stats(user['id']), "id": _new_id(), "created_at": now, "updated_at": now}
+            columns = ', '.join(stats)
+            conn.execute(
+                f"INSERT INTO user_stats ({columns}) VALUES ({', '.join(':' + c for c in stats)})",
+                stats,
+            )
+            return user
+
+        return await self._run(insert)
+
+    async def update_password(self, user_id, password_hash):
+        def update(conn):
+            conn.execute("UPDATE users SET password = ?, updated_at = ? WHERE id = ?", (password_hash, _now(), user_id))
+
+        await self._run(update)
+
+    # ---- stats ----
+
+    async def get_stats(self, user_id):
+        return await self._read(self._one, "SELECT * FROM user_stats WHERE user_id = ?", (user_id,))
+
+    async def set_last_activity(self, user_id, timestamp):
+        def update(conn):
+            conn.execute("UPDATE user_stats SET last_activity = ?, updated_at = ? WHERE user_id = ?", (timestamp, _now(), user_id))
+
+        await self._run(update)
+
+    @classmethod
+    def _apply_activity(cls, conn, user_id, messages, grammar_checks, vocab_lookups):
+        stats = cls._one(conn, "SELECT * FROM user_stats WHERE user_id = ?", (user_id,))
+        if stats is None:
+            return None
+
+        now = datetime.now(timezone.utc)
+        stats, points = apply_activity(stats, messages, grammar_checks, vocab_lookups, now)
+        stats['updated_at'] = now.isoformat()
+        assignments = ', '.join(f"{c} = :{c}" for c in STATS_COLUMNS + ('updated_at',))
+        conn.execute(f"UPDATE user_stats SET {assignments} WHERE user_id = :user_id", stats)
+
+        conn.execute("""
+            INSERT INTO user_daily_activity (user_id, day, messages, grammar_checks, vocab_lookups, points_earned)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                messages = messages + excluded.messages,
+                grammar_checks = grammar_checks + excluded.grammar_checks,
+                vocab_lookups = vocab_lookups + excluded.vocab_lookups,
+                points_earned = points_earned + excluded.points_earned
+        """, (user_id, now.date().isoformat(), messages, grammar_checks, vocab_lookups, points))
+        return stats
+
+    async def apply_activity_batch(self, deltas):
+        def apply_all(conn):
+            results = {}
+            for delta in deltas:
+                stats = self._apply_activity(
+                    conn,
+                    delta['user_id'],
+                    delta.get('messages', 0),
+                    delta.get('grammar_checks', 0),
+                    delta.get('vocab_lookups', 0),
+                )
+                if stats is not None:
+                    results[delta['user_id']] = stats
+            return results
+
+        return await self._run(apply_all)
+
+    async def get_daily_activity(self, user_id, since):
+        return await self._read(
+            self._all,
+            "SELECT day, messages, grammar_checks, vocab_lookups, points_earned FROM user_daily_activity WHERE user_id = ? AND day >= ? ORDER BY day",
+            (user_id, since.isoformat()),
+        )
+
+    async def list_stats(self, offset, limit):
+        return await self._read(
+            self._all,
+            "SELECT s.*, u.username FROM user_stats s JOIN users u ON u.id = s.user_id ORDER BY s.user_id LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+
+    # ---- chat history ----
+
+    async def insert_chat_history(self, rows):
+        def insert(conn):
+            conn.executemany(
+                "INSERT INTO chat_history (id, user_id, message, reply, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(_new_id(), r['user_id'], r['message'], r['reply'], r.get('timestamp') or _now()) for r in rows],
+            )
+
+        await self._run(insert)
+
+    async def get_chat_history(self, user_id, limit, before=None, fields='full'):
+        sql = f"SELECT {HISTORY_COLUMNS[fields]} FROM chat_history WHERE user_id = ?"
+        params = [user_id]
+        if before:
+            timestamp, row_id = before
+            sql += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+            params += [timestamp, timestamp, row_id]
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return await self._read(self._all, sql, params)
+
+    # ---- achievements ----
+
+    async def get_achievements(self, user_id):
+        return await self._read(
+            self._all,
+            "SELECT * FROM user_achievements WHERE user_id = ? ORDER BY earned_at DESC",
+            (user_id,),
+        )
+
+    async def count_achievements(self, user_id):
+        row = await self._read(self._one, "SELECT COUNT(*) AS n FROM user_achievements WHERE user_id = ?", (user_id,))
+        return row['n']
+
+    async def get_earned_achievements(self, user_ids):
+        user_ids = list(user_ids)
+        placeholders = ', '.join('?' * len(user_ids))
+        rows = await self._read(
+            self._all,
+            f"SELECT user_id, achievement_id FROM user_achievements WHERE user_id IN ({placeholders})",
+            user_ids,
+        )
+        earned = {user_id: set() for user_id in user_ids}
+        for row in rows:
+            earned[row['user_id']].add(row['achievement_id'])
+        return earned
+
+    async def award_achievements(self, awards):
+        def award(conn):
+            now = _now()
+            new = {}
+            for a in awards:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO user_achievements (id, user_id, achievement_id, achievement_name, earned_at) VALUES (?, ?, ?, ?, ?)",
+                    (_new_id(), a['user_id'], a['achievement_id'], a['achievement_name'], now),
+                )
+                if cursor.rowcount:
+                    new.setdefault(a['user_id'], []).append({
+                        "achievement_id": a['achievement_id'],
+                        "achievement_name": a['achievement_name'],
+                        "points": a['points'],
+                    })
+
+            results = []
+            today = datetime.now(timezone.utc).date().isoformat()
+            for user_id, earned in new.items():
+                points = sum(a['points'] for a in earned)
+                stats = self._one(conn, "SELECT * FROM user_stats WHERE user_id = ?", (user_id,))
+                if stats is None:
+                    continue
+                stats['total_points'] += points
+                stats['level'] = level_for(stats['total_points'])
+                stats['updated_at'] = now
+                conn.execute(
+                    "UPDATE user_stats SET total_points = ?, level = ?, updated_at = ? WHERE user_id = ?",
+                    (stats['total_points'], stats['level'], now, user_id),
+                )
+                conn.execute("""
+                    INSERT INTO user_daily_activity (user_id, day, points_earned) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, day) DO UPDATE SET points_earned = points_earned + excluded.points_earned
+                """, (user_id, today, points))
+                results.append({"user_id": user_id, "stats": stats, "new_achievements": earned})
+            return results
+
+        return await self._run(award)
+
+    # ---- session tokens ----
+
+    async def revoke_token(self, jti, expires_at):
+        def revoke(conn):
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (_now(),))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+                (jti, expires_at.astimezone(timezone.utc).isoformat()),
+            )
+            return cursor.rowcount == 1
+
+        return await self._run(revoke)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
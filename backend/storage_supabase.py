@@ -0,0 +1,157 @@
+"""
+Supabase (hosted PostgreSQL) storage backend.
+
+Queries go through the shared async PostgREST client in gateway.py. Stats and
+achievement writes call the functions in supabase_gamification.sql so each is
+a single round trip.
+"""
+
+import time
+import gateway
+import metrics
+from storage_base import Storage, default_stats
+
+# Table (or view) and columns read by get_chat_history for each field mode
+HISTORY_FIELDS = {
+    # Full rows, including the complete LLM reply
+    'full': ('chat_history', 'id, message, reply, timestamp'),
+    # List view: replies truncated server-side by the chat_history_preview view
+    'preview': ('chat_history_preview', 'id, message, reply_preview, timestamp'),
+}
+
+async def _execute(table, operation, query):
+    """Run one PostgREST request, timed by table (or RPC function) and operation"""
+    started = time.perf_counter()
+    try:
+        return await query.execute()
+    except Exception:
+        metrics.db_errors.labels(table, operation).inc()
+        raise
+    finally:
+        metrics.db_latency.labels(table, operation).observe(time.perf_counter() - started)
+
+class SupabaseStorage(Storage):
+    """Storage backed by Supabase PostgREST"""
+
+    name = "Supabase PostgreSQL"
+
+    def __init__(self):
+        if not gateway.SUPABASE_URL or not gateway.SUPABASE_KEY:
+            raise ValueError("⚠️ SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+
+    async def open(self):
+        await gateway.get_supabase()
+
+    async def _first(self, table, column, value):
+        supabase = await gateway.get_supabase()
+        response = await _execute(table, 'select', supabase.table(table).select('*').eq(column, value))
+        return response.data[0] if response.data else None
+
+    # ---- users ----
+
+    async def get_user_by_username(self, username):
+        return await self._first('users', 'username', username)
+
+    async def get_user_by_email(self, email):
+        return await self._first('users', 'email', email)
+
+    async def create_user(self, username, email, password_hash):
+        supabase = await gateway.get_supabase()
+        response = await _execute('users', 'insert', supabase.table('users').insert({
+            "username": username,
+            "email": email,
+            "password": password_hash,
+        }))
+        if not response.data:
+            return None
+        user = response.data[0]
+        await _execute('user_stats', 'insert', supabase.table('user_stats').insert(default_stats(user['id'])))
+        return user
+
+    async def update_password(self, user_id, password_hash):
+        supabase = await gateway.get_supabase()
+        await _execute('users', 'update', supabase.table('users').update({"password": password_hash}).eq('id', user_id))
+
+    # ---- stats ----
+
+    async def get_stats(self, user_id):
+        return await self._first('user_stats', 'user_id', user_id)
+
+    async def set_last_activity(self, user_id, timestamp):
+        supabase = await gateway.get_supabase()
+        await _execute('user_stats', 'update', supabase.table('user_stats').update({"last_activity": timestamp}).eq('user_id', user_id))
+
+    async def apply_activity_batch(self, deltas):
+        supabase = await gateway.get_supabase()
+        response = await _execute('apply_user_activity_batch', 'rpc', supabase.rpc('apply_user_activity_batch', {"p_deltas": deltas}))
+        return {
+            item['user_id']: item['result']['stats']
+            for item in response.data or []
+            if item.get('result')
+        }
+
+    async def get_daily_activity(self, user_id, since):
+        supabase = await gateway.get_supabase()
+        response = await _execute('user_daily_activity', 'select', supabase.table('user_daily_activity').select('day, messages, grammar_checks, vocab_lookups, points_earned').eq('user_id', user_id).gte('day', since.isoformat()).order('day'))
+        return response.data or []
+
+    async def list_stats(self, offset, limit):
+        supabase = await gateway.get_supabase()
+        response = await _execute('user_stats', 'select', supabase.table('user_stats').select('*, users(username)').order('user_id').range(offset, offset + limit - 1))
+        rows = []
+        for row in response.data or []:
+            user = row.pop('users', None) or {}
+            rows.append({**row, "username": user.get('username')})
+        return rows
+
+    # ---- chat history ----
+
+    async def insert_chat_history(self, rows):
+        supabase = await gateway.get_supabase()
+        await _execute('chat_history', 'insert', supabase.table('chat_history').insert(rows))
+
+    async def get_chat_history(self, user_id, limit, before=None, fields='full'):
+        table, columns = HISTORY_FIELDS[fields]
+        supabase = await gateway.get_supabase()
+        query = supabase.table(table).select(columns).eq('user_id', user_id)
+        if before:
+            timestamp, row_id = before
+            query = query.or_(f'timestamp.lt."{timestamp}",and(timestamp.eq."{timestamp}",id.lt.{row_id})')
+        response = await _execute(table, 'select', query.order('timestamp', desc=True).order('id', desc=True).limit(limit))
+        return response.data or []
+
+    # ---- achievements ----
+
+    async def get_achievements(self, user_id):
+        supabase = await gateway.get_supabase()
+        response = await _execute('user_achievements', 'select', supabase.table('user_achievements').select('*').eq('user_id', user_id).order('earned_at', desc=True))
+        return response.data or []
+
+    async def count_achievements(self, user_id):
+        supabase = await gateway.get_supabase()
+        # Count only, no rows
+        response = await _execute('user_achievements', 'select', supabase.table('user_achievements').select('achievement_id', count='exact', head=True).eq('user_id', user_id))
+        return response.count or 0
+
+    async def get_earned_achievements(self, user_ids):
+        supabase = await gateway.get_supabase()
+        response = await _execute('user_achievements', 'select', supabase.table('user_achievements').select('user_id, achievement_id').in_('user_id', list(user_ids)))
+        earned = {user_id: set() for user_id in user_ids}
+        for row in response.data or []:
+            earned[row['user_id']].add(row['achievement_id'])
+        return earned
+
+    async def award_achievements(self, awards):
+        supabase = await gateway.get_supabase()
+        response = await _execute('award_achievements', 'rpc', supabase.rpc('award_achievements', {"p_awards": awards}))
+        return response.data or []
+
+    # ---- session tokens ----
+
+    async def revoke_token(self, jti, expires_at):
+        supabase = await gateway.get_supabase()
+        response = await _execute('revoke_token', 'rpc', supabase.rpc('revoke_token', {
+            "p_jti": jti,
+            "p_expires_at": expires_at.isoformat(),
+        }))
+        return bool(response.data)
@@ -0,0 +1,221 @@
+-- ============================================================
+-- LinguaSpark AI - Gamification Functions
+-- ============================================================
+-- Run this script in your Supabase SQL Editor AFTER supabase_setup.sql
+-- The API calls these functions through supabase.rpc(...)
+-- ============================================================
+
+-- ============================================================
+-- 1. DAILY ACTIVITY ROLLUP TABLE
+-- ============================================================
+-- One small row per user per day, maintained by apply_user_activity().
+-- Weekly insights and progress dashboards read 7-30 of these rows
+-- instead of scanning chat_history.
+CREATE TABLE IF NOT EXISTS user_daily_activity (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    messages INTEGER DEFAULT 0,
+    grammar_checks INTEGER DEFAULT 0,
+    vocab_lookups INTEGER DEFAULT 0,
+    points_earned INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+ALTER TABLE user_daily_activity ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own daily activity" ON user_daily_activity;
+CREATE POLICY "Users can view own daily activity" ON user_daily_activity
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Users can insert own daily activity" ON user_daily_activity;
+CREATE POLICY "Users can insert own daily activity" ON user_daily_activity
+    FOR INSERT WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Users can update own daily activity" ON user_daily_activity;
+CREATE POLICY "Users can update own daily activity" ON user_daily_activity
+    FOR UPDATE USING (true);
+
+-- Backfill message counts from existing chat history (safe to re-run)
+INSERT INTO user_daily_activity (user_id, day, messages)
+SELECT user_id, timestamp::DATE, COUNT(*)
+FROM chat_history
+GROUP BY user_id, timestamp::DATE
+ON CONFLICT (user_id, day) DO NOTHING;
+
+-- ============================================================
+-- 2. APPLY USER ACTIVITY (stats + streak + rollup)
+-- ============================================================
+-- One round trip per action instead of ~10 reads and writes.
+-- The user_stats row is locked for the duration of the call, so
+-- concurrent messages from the same user can no longer lose increments.
+-- Achievements are evaluated by the API (achievements.py) and written
+-- with award_achievements() below.
+--
+-- Returns: { "stats": {...user_stats row...} }
+CREATE OR REPLACE FUNCTION apply_user_activity(
+    p_user_id UUID,
+    p_messages INTEGER DEFAULT 0,
+    p_grammar_checks INTEGER DEFAULT 0,
+    p_vocab_lookups INTEGER DEFAULT 0
+)
+RETURNS JSONB AS $$
+DECLARE
+    s user_stats%ROWTYPE;
+    v_now TIMESTAMPTZ := NOW();
+    v_days INTEGER;
+    v_points INTEGER;
+BEGIN
+    SELECT * INTO s FROM user_stats WHERE user_id = p_user_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    -- Counters and points (message = 10, grammar = 15, vocab = 20)
+    s.total_messages := s.total_messages + p_messages;
+    s.grammar_checks := s.grammar_checks + p_grammar_checks;
+    s.vocab_lookups := s.vocab_lookups + p_vocab_lookups;
+    s.words_learned := s.words_learned + p_vocab_lookups;
+    v_points := 10 * p_messages + 15 * p_grammar_checks + 20 * p_vocab_lookups;
+    s.total_points := s.total_points + v_points;
+    s.level := s.total_points / 100 + 1;
+
+    -- Daily streak
+    IF s.last_activity IS NULL THEN
+        s.current_streak := 1;
+    ELSE
+        v_days := v_now::DATE - s.last_activity::DATE;
+        IF v_days = 0 THEN
+            s.current_streak := GREATEST(s.current_streak, 1);
+        ELSIF v_days = 1 THEN
+            s.current_streak := s.current_streak + 1;
+        ELSE
+            s.current_streak := 1;
+        END IF;
+    END IF;
+    s.longest_streak := GREATEST(s.longest_streak, s.current_streak);
+    s.last_activity := v_now;
+
+    UPDATE user_stats SET
+        total_messages = s.total_messages,
+        grammar_checks = s.grammar_checks,
+        vocab_lookups = s.vocab_lookups,
+        words_learned = s.words_learned,
+        total_points = s.total_points,
+        level = s.level,
+        current_streak = s.current_streak,
+        longest_streak = s.longest_streak,
+        last_activity = s.last_activity
+    WHERE user_id = p_user_id;
+
+    -- Daily rollup
+    INSERT INTO user_daily_activity AS a
+        (user_id, day, messages, grammar_checks, vocab_lookups, points_earned)
+    VALUES
+        (p_user_id, v_now::DATE, p_messages, p_grammar_checks, p_vocab_lookups, v_points)
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        messages = a.messages + EXCLUDED.messages,
+        grammar_checks = a.grammar_checks + EXCLUDED.grammar_checks,
+        vocab_lookups = a.vocab_lookups + EXCLUDED.vocab_lookups,
+        points_earned = a.points_earned + EXCLUDED.points_earned;
+
+    RETURN jsonb_build_object('stats', to_jsonb(s));
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================
+-- 3. APPLY USER ACTIVITY IN BULK (write-behind queue)
+-- ============================================================
+-- p_deltas: [{"user_id": "...", "messages": 2, "grammar_checks": 0, "vocab_lookups": 1}, ...]
+-- Returns: [{"user_id": "...", "result": <apply_user_activity result>}, ...]
+CREATE OR REPLACE FUNCTION apply_user_activity_batch(p_deltas JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    d JSONB;
+    v_results JSONB := '[]'::JSONB;
+BEGIN
+    FOR d IN SELECT value FROM jsonb_array_elements(p_deltas) LOOP
+        v_results := v_results || jsonb_build_array(jsonb_build_object(
+            'user_id', d->>'user_id',
+            'result', apply_user_activity(
+                (d->>'user_id')::UUID,
+                COALESCE((d->>'messages')::INTEGER, 0),
+                COALESCE((d->>'grammar_checks')::INTEGER, 0),
+                COALESCE((d->>'vocab_lookups')::INTEGER, 0)
+            )
+        ));
+    END LOOP;
+    RETURN v_results;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================
+-- 4. AWARD ACHIEVEMENTS IN BULK
+-- ============================================================
+-- p_awards: [{"user_id": "...", "achievement_id": "...", "achievement_name": "...", "points": 50}, ...]
+-- Inserts every award in one statement; awards a user already holds are
+-- skipped and earn no points. Bonus points are added to user_stats and
+-- the daily rollup for the rows actually inserted.
+-- Returns: [{"user_id": "...", "stats": {...}, "new_achievements": [...]}, ...]
+CREATE OR REPLACE FUNCTION award_achievements(p_awards JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_result JSONB;
+BEGIN
+    WITH awards AS (
+        SELECT
+            (a->>'user_id')::UUID AS user_id,
+            a->>'achievement_id' AS achievement_id,
+            a->>'achievement_name' AS achievement_name,
+            (a->>'points')::INTEGER AS points
+        FROM jsonb_array_elements(p_awards) a
+    ),
+    inserted AS (
+        INSERT INTO user_achievements (user_id, achievement_id, achievement_name, earned_at)
+        SELECT user_id, achievement_id, achievement_name, NOW()
+        FROM awards
+        ON CONFLICT (user_id, achievement_id) DO NOTHING
+        RETURNING user_id, achievement_id
+    ),
+    bonus AS (
+        SELECT
+            i.user_id,
+            SUM(w.points)::INTEGER AS points,
+            jsonb_agg(jsonb_build_object(
+                'achievement_id', w.achievement_id,
+                'achievement_name', w.achievement_name,
+                'points', w.points
+            )) AS new_achievements
+        FROM inserted i
+        JOIN awards w ON w.user_id = i.user_id AND w.achievement_id = i.achievement_id
+        GROUP BY i.user_id
+    ),
+    updated AS (
+        UPDATE user_stats s SET
+            total_points = s.total_points + b.points,
+            level = (s.total_points + b.points) / 100 + 1
+        FROM bonus b
+        WHERE s.user_id = b.user_id
+        RETURNING s.*
+    ),
+    rollup AS (
+        INSERT INTO user_daily_activity AS d (user_id, day, points_earned)
+        SELECT user_id, CURRENT_DATE, points FROM bonus
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            points_earned = d.points_earned + EXCLUDED.points_earned
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'user_id', u.user_id,
+        'stats', to_jsonb(u),
+        'new_achievements', b.new_achievements
+    )), '[]'::JSONB)
+    INTO v_result
+    FROM updated u
+    JOIN bonus b ON b.user_id = u.user_id;
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================
+-- ✅ GAMIFICATION FUNCTIONS INSTALLED!
+-- ============================================================
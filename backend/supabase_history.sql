@@ -0,0 +1,30 @@
+-- ============================================================
+-- LinguaSpark AI - Chat History Pagination
+-- ============================================================
+-- Run this script in your Supabase SQL Editor AFTER supabase_setup.sql
+-- ============================================================
+
+-- ============================================================
+-- 1. KEYSET PAGINATION INDEX
+-- ============================================================
+-- GET /history pages through a user's messages ordered by (timestamp, id)
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_timestamp_id
+    ON chat_history(user_id, timestamp DESC, id DESC);
+
+-- ============================================================
+-- 2. PREVIEW VIEW
+-- ============================================================
+-- Used by GET /history?fields=preview so list views don't ship full replies
+CREATE OR REPLACE VIEW chat_history_preview
+WITH (security_invoker = true) AS
+SELECT
+    id,
+    user_id,
+    message,
+    LEFT(reply, 160) AS reply_preview,
+    timestamp
+FROM chat_history;
+
+-- ============================================================
+-- ✅ CHAT HISTORY PAGINATION INSTALLED!
+-- ============================================================
@@ -0,0 +1,50 @@
+-- ============================================================
+-- LinguaSpark AI - Session Token Revocation
+-- ============================================================
+-- Run this script in your Supabase SQL Editor AFTER supabase_setup.sql
+-- The API calls revoke_token() through supabase.rpc(...)
+-- ============================================================
+
+-- ============================================================
+-- 1. REVOKED TOKENS TABLE
+-- ============================================================
+-- Tokens revoked by logout or refresh-token rotation, shared by every
+-- API worker. Rows are dropped once the token would have expired anyway.
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
+
+ALTER TABLE revoked_tokens ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "API can manage revoked tokens" ON revoked_tokens;
+CREATE POLICY "API can manage revoked tokens" ON revoked_tokens
+    FOR ALL USING (true) WITH CHECK (true);
+
+-- ============================================================
+-- 2. REVOKE TOKEN
+-- ============================================================
+-- Returns TRUE if the token was not revoked before. Refresh only succeeds
+-- when it is the call that revokes the old refresh token, so a stolen or
+-- replayed refresh token is rejected by every worker.
+CREATE OR REPLACE FUNCTION revoke_token(p_jti TEXT, p_expires_at TIMESTAMPTZ)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_inserted INTEGER;
+BEGIN
+    DELETE FROM revoked_tokens WHERE expires_at <= NOW();
+
+    INSERT INTO revoked_tokens (jti, expires_at)
+    VALUES (p_jti, p_expires_at)
+    ON CONFLICT (jti) DO NOTHING;
+    GET DIAGNOSTICS v_inserted = ROW_COUNT;
+
+    RETURN v_inserted = 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================
+-- ✅ TOKEN REVOCATION INSTALLED!
+-- ============================================================
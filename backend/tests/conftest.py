@@ -0,0 +1,31 @@
+"""
+Shared setup for the unit tests.
+
+The backend modules read their settings at import time and import each other
+as top-level modules (`import auth`), so the environment is set and backend/
+put on sys.path before any test module imports them. Storage goes to
+fakes.FakeSupabase; nothing touches the network.
+"""
+
+import os
+import sys
+import pytest
+
+os.environ.update(
+    SUPABASE_URL="http://supabase.test",
+    SUPABASE_KEY="test-key",
+    STORAGE_BACKEND="supabase",
+    TOKEN_SECRET="test-secret",
+    REQUIRE_AUTH_TOKEN="false",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes    # noqa: E402
+import gateway    # noqa: E402
+
+@pytest.fixture
+def supabase(monkeypatch):
+    """A fresh in-memory FakeSupabase behind storage.db"""
+    db = fakes.FakeSupabase()
+    monkeypatch.setattr(gateway, "_supabase_client", db)
+    return db
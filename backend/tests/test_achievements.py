@@ -0,0 +1,82 @@
+import asyncio
+import achievements
+import storage
+from achievements import AchievementEngine, counters_for
+
+CATALOG = [
+    {"id": "first_message", "name": "First Steps", "counter": "total_messages", "threshold": 1, "points": 100},
+    {"id": "10_messages", "name": "Chatty Learner", "counter": "total_messages", "threshold": 10, "points": 100},
+    {"id": "grammar_5", "name": "Grammar Guru", "counter": "grammar_checks", "threshold": 5, "points": 75},
+    {"id": "level_2", "name": "Level 2", "counter": "level", "threshold": 2, "points": 10},
+]
+
+async def apply_message(user):
+    updated = await storage.db.apply_activity_batch([{"user_id": user["id"], "messages": 1}])
+    return updated[user["id"]]
+
+def test_counters_for_delta():
+    counters = counters_for({"messages": 1})
+    assert "total_messages" in counters
+    assert "grammar_checks" not in counters
+    assert set(achievements.ACTIVITY_COUNTERS) <= counters
+    assert {"vocab_lookups", "words_learned"} <= counters_for({"vocab_lookups": 2})
+
+def test_reached_only_evaluates_rules_on_changed_counters():
+    engine = AchievementEngine(CATALOG)
+    stats = {"total_messages": 10, "grammar_checks": 7, "level": 1}
+    found = engine.reached(stats, {"total_messages"})
+    assert [a["id"] for a in found] == ["first_message", "10_messages"]
+    assert engine.rules_evaluated == 2
+
+def test_reached_handles_missing_counters():
+    engine = AchievementEngine(CATALOG)
+    assert engine.reached({"total_messages": None}, {"total_messages", "unknown"}) == []
+
+def test_award_points_unlock_level_achievements(supabase):
+    engine = AchievementEngine(CATALOG)
+
+    async def scenario():
+        user = await storage.db.create_user("al", "al@example.com", "hash")
+        stats = await apply_message(user)
+        results = await engine.process({user["id"]: (stats, counters_for({"messages": 1}))})
+        return results[user["id"]]
+
+    result = asyncio.run(scenario())
+    # 10 for the message, 100 for first_message (-> level 2), 10 for level_2
+    assert [a["achievement_id"] for a in result["new_achievements"]] == ["first_message", "level_2"]
+    assert result["stats"]["total_points"] == 120
+    assert result["stats"]["level"] == 2
+
+def test_earned_achievements_are_not_reawarded_or_reloaded(supabase):
+    engine = AchievementEngine(CATALOG)
+
+    async def scenario():
+        user = await storage.db.create_user("al", "al@example.com", "hash")
+        stats = await apply_message(user)
+        changes = {user["id"]: (stats, counters_for({"messages": 1}))}
+        await engine.process(changes)
+        before = supabase.round_trips
+        results = await engine.process(changes)
+        return results[user["id"]], supabase.round_trips - before
+
+    result, round_trips = asyncio.run(scenario())
+    assert result["new_achievements"] == []
+    assert round_trips == 0
+    assert engine.awarded == 2
+
+def test_awards_for_many_users_use_one_storage_call(supabase):
+    engine = AchievementEngine([a for a in CATALOG if a["counter"] != "level"])
+
+    async def scenario():
+        changes = {}
+        for name in ("al", "bo", "cy"):
+            user = await storage.db.create_user(name, f"{name}@example.com", "hash")
+            stats = await apply_message(user)
+            changes[user["id"]] = (stats, counters_for({"messages": 1}))
+        supabase.calls.clear()
+        return await engine.process(changes)
+
+    results = asyncio.run(scenario())
+    assert all([a["achievement_id"] for a in r["new_achievements"]] == ["first_message"] for r in results.values())
+    assert supabase.calls[("rpc", "award_achievements")] == 1
+    assert supabase.calls[("user_achievements", "select")] == 1
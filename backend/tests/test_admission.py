@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from admission import BULK, INTERACTIVE, AdmissionController, Rejected
+
+def controller(**overrides):
+    settings = dict(max_concurrent=1, max_queue=10, queue_timeout=1.0, rate_per_minute=60, burst=3)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+# ---- per-user token buckets ----
+
+def test_rate_limit_allows_burst_then_rejects():
+    admission = controller()
+    for _ in range(3):
+        admission.check_rate("al")
+    with pytest.raises(Rejected) as rejected:
+        admission.check_rate("al")
+    assert rejected.value.reason == "rate_limited"
+    assert rejected.value.retry_after >= 1
+    assert admission.rejected["rate_limited"] == 1
+
+def test_buckets_are_per_user():
+    admission = controller()
+    for _ in range(3):
+        admission.check_rate("al")
+    admission.check_rate("bo")
+
+def test_zero_rate_disables_limiting():
+    admission = controller(rate_per_minute=0)
+    for _ in range(100):
+        admission.check_rate("al")
+    assert admission.grant("al", 50) == 50
+
+def test_grant_is_partial_and_counts_the_rest_as_rejected():
+    # Regression: /vocabulary/batch used to charge one token for any number of words
+    admission = controller(burst=10)
+    assert admission.grant("al", 25) == 10
+    assert admission.rejected["rate_limited"] == 15
+    assert admission.grant("al", 5) == 0
+    with pytest.raises(Rejected):
+        admission.check_rate("al")
+
+def test_capacity_rejection_keeps_tokens():
+    admission = controller(max_queue=0)
+    admission.active = admission.max_concurrent
+    with pytest.raises(Rejected) as rejected:
+        admission.admit("al")
+    assert rejected.value.reason == "queue_full"
+    admission.active = 0
+    assert admission.grant("al", 3) == 3
+
+def test_least_recently_used_buckets_are_evicted():
+    admission = controller(max_users=2)
+    for user in ("al", "bo", "cy"):
+        admission.check_rate(user)
+    assert list(admission._buckets) == ["bo", "cy"]
+
+# ---- concurrency slots ----
+
+def test_waiters_are_served_in_priority_order():
+    admission = controller()
+    order = []
+
+    async def worker(name, priority):
+        async with admission.slot(priority):
+            order.append(name)
+
+    async def scenario():
+        await admission.acquire()
+        tasks = [asyncio.create_task(worker("bulk", BULK))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("chat", INTERACTIVE)))
+        await asyncio.sleep(0)
+        assert admission.queued == 2
+        admission.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["chat", "bulk"]
+    assert admission.active == 0
+    assert admission.queued == 0
+
+def test_queue_timeout_rejects_and_leaves_no_waiter():
+    admission = controller(queue_timeout=0.01)
+
+    async def scenario():
+        await admission.acquire()
+        with pytest.raises(Rejected) as rejected:
+            await admission.acquire()
+        return rejected.value
+
+    assert asyncio.run(scenario()).reason == "queue_timeout"
+    assert admission.queued == 0
+    assert admission.active == 1
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    admission = controller()
+
+    async def scenario():
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        admission.release()
+
+    asyncio.run(scenario())
+    assert admission.active == 0
+    assert admission.queued == 0
@@ -0,0 +1,54 @@
+import asyncio
+import base64
+import json
+import uuid
+import pytest
+import auth
+import storage
+
+def test_cursor_round_trip():
+    row = {"timestamp": "2026-01-02T03:04:05.123456+00:00", "id": str(uuid.uuid4())}
+    cursor = auth.encode_history_cursor(row)
+    assert "=" not in cursor
+    assert auth.decode_history_cursor(cursor) == (row["timestamp"], row["id"])
+
+@pytest.mark.parametrize("parts", [
+    ["not a date", str(uuid.uuid4())],
+    ["2026-01-02T03:04:05+00:00", "1) or (id.gt.0"],
+    ["2026-01-02T03:04:05+00:00"],
+])
+def test_cursor_rejects_tampered_values(parts):
+    cursor = base64.urlsafe_b64encode(json.dumps(parts).encode()).decode()
+    with pytest.raises(ValueError):
+        auth.decode_history_cursor(cursor)
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        auth.decode_history_cursor("%%%")
+
+def test_pages_cover_history_once_in_order(supabase):
+    # Rows sharing a timestamp are ordered by id, so none is skipped or repeated at a page boundary
+    timestamps = ["2026-01-01T10:00:00+00:00"] * 4 + ["2026-01-01T09:00:00+00:00"] * 3 + ["2026-01-01T08:00:00+00:00"]
+
+    async def scenario():
+        user = await storage.db.create_user("al", "al@example.com", "hash")
+        for i, timestamp in enumerate(timestamps):
+            supabase.insert("chat_history", {
+                "user_id": user["id"], "message": f"m{i}", "reply": "r", "timestamp": timestamp,
+            })
+        pages, cursor = [], None
+        while True:
+            rows, cursor = await auth.get_chat_history(user, limit=3, cursor=cursor)
+            pages.append(rows)
+            if cursor is None:
+                return pages
+
+    pages = asyncio.run(scenario())
+    assert [len(page) for page in pages] == [3, 3, 2]
+    seen = [(row["timestamp"], row["id"]) for page in pages for row in page]
+    assert seen == sorted(seen, reverse=True)
+    assert len(set(seen)) == len(timestamps)
+
+def test_bad_cursor_raises_value_error(supabase):
+    with pytest.raises(ValueError):
+        asyncio.run(auth.get_chat_history({"id": str(uuid.uuid4())}, cursor="garbage"))
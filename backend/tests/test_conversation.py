@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+import conversation
+import routing
+import storage
+from conversation import ConversationMemory
+
+@pytest.fixture
+def user(supabase):
+    return asyncio.run(storage.db.create_user("al", "al@example.com", "hash"))
+
+@pytest.fixture(autouse=True)
+def summarizer(monkeypatch):
+    """Summaries without Groq: the summary lists the summarized messages"""
+    calls = []
+
+    async def complete(prompt, priority=None):
+        calls.append(prompt)
+        return f"summary {len(calls)}"
+
+    monkeypatch.setattr(routing.router, "complete", complete)
+    return calls
+
+def flush(supabase, user, *messages):
+    """What a worker's write-behind queue does with its turns"""
+    start = len(supabase.rows("chat_history"))
+    asyncio.run(storage.db.insert_chat_history([
+        {"user_id": user["id"], "message": m, "reply": f"re {m}", "timestamp": f"2026-01-01T10:00:{i:02d}"}
+        for i, m in enumerate(messages, start=start)
+    ]))
+
+def messages(memory, user):
+    context = asyncio.run(memory.context(user))
+    return [line.removeprefix("Learner: ") for line in context.splitlines() if line.startswith("Learner: ")]
+
+def test_own_turns_need_no_reload(user, supabase):
+    memory = ConversationMemory()
+    asyncio.run(memory.record(user, "m0", "re m0"))
+    flush(supabase, user, "m0")
+    asyncio.run(memory.record(user, "m1", "re m1"))
+    assert messages(memory, user) == ["m0", "m1"]
+    assert memory.reloads == 0
+
+def test_turns_from_another_worker_are_picked_up_in_order(user, supabase):
+    here, there = ConversationMemory(), ConversationMemory()
+    asyncio.run(here.record(user, "m0", "re m0"))
+    flush(supabase, user, "m0")
+    asyncio.run(there.record(user, "m1", "re m1"))
+    flush(supabase, user, "m1")
+    # Recorded here but still in the write-behind queue
+    asyncio.run(here.record(user, "m2", "re m2"))
+
+    assert messages(here, user) == ["m0", "m1", "m2"]
+    assert here.reloads == 1
+    assert messages(here, user) == ["m0", "m1", "m2"]
+    assert here.reloads == 1
+
+def test_sync_check_is_one_small_query(user, supabase):
+    memory = ConversationMemory()
+    asyncio.run(memory.context(user))
+    supabase.calls.clear()
+    asyncio.run(memory.context(user))
+    assert supabase.round_trips == 1
+    assert supabase.calls[("chat_history_preview", "select")] == 1
+
+def test_window_is_trimmed_to_half_the_turns_once_full(user, summarizer):
+    memory = ConversationMemory(token_budget=10000, max_turns=4)
+
+    async def scenario():
+        for i in range(5):
+            await memory.record(user, f"m{i}", "reply")
+        await asyncio.gather(*memory._tasks)
+
+    asyncio.run(scenario())
+    assert messages(memory, user) == ["m3", "m4"]
+    assert len(summarizer) == 1
+    assert "m2" in str(summarizer[0])
+    assert "m3" not in str(summarizer[0])
+
+def test_long_turns_are_evicted_to_stay_within_the_token_budget(user):
+    memory = ConversationMemory(token_budget=200, max_turns=8, reply_chars=400)
+
+    async def scenario():
+        for i in range(3):
+            await memory.record(user, f"m{i} " + "word " * 40, "reply " * 40)
+        await asyncio.gather(*memory._tasks)
+
+    asyncio.run(scenario())
+    session = memory._sessions.get(user["id"])
+    used = sum(memory._turn_tokens(m, r) for m, r in session.turns)
+    assert used <= 0.75 * (memory.token_budget - conversation.estimate_tokens(session.summary))
+    assert session.summary == "summary 1"
+
+def test_replies_are_clipped_in_memory(user):
+    memory = ConversationMemory(reply_chars=20)
+    asyncio.run(memory.record(user, "hola", "x" * 100))
+    _, reply = memory._sessions.get(user["id"]).turns[-1]
+    assert reply == "x" * 20 + "…"
+
+def test_failed_summary_falls_back_to_the_learner_messages(user, monkeypatch):
+    async def fail(prompt, priority=None):
+        raise ConnectionError("groq down")
+
+    monkeypatch.setattr(routing.router, "complete", fail)
+    memory = ConversationMemory(max_turns=2)
+
+    async def scenario():
+        for i in range(3):
+            await memory.record(user, f"m{i}", "reply")
+        await asyncio.gather(*memory._tasks)
+
+    asyncio.run(scenario())
+    assert memory._sessions.get(user["id"]).summary == "m0; m1"
+    assert memory.summary_failures == 1
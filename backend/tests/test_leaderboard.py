@@ -0,0 +1,87 @@
+import asyncio
+import storage
+from leaderboard import Leaderboard
+
+def stats(points, **extra):
+    return {"total_points": points, "level": points // 100 + 1, **extra}
+
+def board_with(*users):
+    board = Leaderboard()
+    for user_id, username, points in users:
+        board.record(user_id, username, stats(points))
+    return board
+
+def usernames(entries):
+    return [entry["username"] for entry in entries]
+
+def test_top_orders_by_points_then_username():
+    board = board_with(("1", "cy", 50), ("2", "al", 300), ("3", "bo", 50))
+    top = board.top(10)
+    assert usernames(top) == ["al", "bo", "cy"]
+    assert [entry["rank"] for entry in top] == [1, 2, 3]
+    assert usernames(board.top(1)) == ["al"]
+
+def test_record_moves_an_existing_user():
+    board = board_with(("1", "al", 100), ("2", "bo", 200))
+    board.record("1", "al", stats(500))
+    assert usernames(board.top(10)) == ["al", "bo"]
+    assert board.stats()["users"] == 2
+
+def test_missing_fields_default_to_zero_and_level_one():
+    board = Leaderboard()
+    board.record("1", "al", {"total_points": None})
+    entry = board.top(1)[0]
+    assert entry["total_points"] == 0
+    assert entry["level"] == 1
+
+def test_rank_with_neighbours():
+    board = board_with(*((str(i), f"user{i}", 1000 - i * 10) for i in range(10)))
+    rank = board.rank("user5", neighbours=2)
+    assert rank["rank"] == 6
+    assert rank["total_users"] == 10
+    assert usernames(rank["neighbours"]) == ["user3", "user4", "user5", "user6", "user7"]
+    assert [n["rank"] for n in rank["neighbours"]] == [4, 5, 6, 7, 8]
+
+def test_rank_at_the_edges():
+    board = board_with(("1", "al", 300), ("2", "bo", 200), ("3", "cy", 100))
+    assert usernames(board.rank("al", neighbours=1)["neighbours"]) == ["al", "bo"]
+    assert usernames(board.rank("cy", neighbours=0)["neighbours"]) == ["cy"]
+    assert board.rank("nobody") is None
+
+def test_reconcile_rebuilds_from_user_stats(supabase):
+    board = Leaderboard(page_size=2)
+
+    async def scenario():
+        for points, name in ((30, "al"), (10, "bo"), (20, "cy")):
+            user = await storage.db.create_user(name, f"{name}@example.com", "hash")
+            await storage.db.apply_activity_batch([{"user_id": user["id"], "messages": points // 10}])
+        board.record("stale", "ghost", stats(999))
+        await board.reconcile()
+
+    asyncio.run(scenario())
+    assert board.loaded
+    assert usernames(board.top(10)) == ["al", "cy", "bo"]
+    assert board.rank("ghost") is None
+
+def test_updates_during_reconcile_are_kept(supabase, monkeypatch):
+    board = Leaderboard(page_size=1)
+    list_stats = storage.db.list_stats
+    user_ids = {}
+
+    async def slow_list_stats(offset, limit):
+        page = await list_stats(offset, limit)
+        # Stats change while the reconcile is between pages
+        if offset == 0:
+            board.record(user_ids["bo"], "bo", stats(500))
+        return page
+
+    async def scenario():
+        for name in ("al", "bo"):
+            user = await storage.db.create_user(name, f"{name}@example.com", "hash")
+            user_ids[name] = user["id"]
+        await storage.db.apply_activity_batch([{"user_id": user_ids["al"], "messages": 1}])
+        monkeypatch.setattr(storage.db, "list_stats", slow_list_stats)
+        await board.reconcile()
+
+    asyncio.run(scenario())
+    assert [(e["username"], e["total_points"]) for e in board.top(10)] == [("bo", 500), ("al", 10)]
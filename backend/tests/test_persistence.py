@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+import auth
+from persistence import WriteBehindQueue
+
+USER = {"id": "u1", "username": "al"}
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Record the batches the queue writes; fail the first N of each kind"""
+    calls = {"chat": [], "stats": []}
+    failures = {"chat": 0, "stats": 0}
+
+    def writer(kind):
+        async def write(payload):
+            calls[kind].append(payload)
+            if len(calls[kind]) <= failures[kind]:
+                raise ConnectionError(f"{kind} write failed")
+        return write
+
+    monkeypatch.setattr(auth, "save_chat_history_batch", writer("chat"))
+    monkeypatch.setattr(auth, "apply_activity_batch", writer("stats"))
+    return calls, failures
+
+def queue(**overrides):
+    settings = dict(flush_interval=0, retries=2, retry_delay=0)
+    settings.update(overrides)
+    return WriteBehindQueue(**settings)
+
+def run(queue, *actions):
+    async def scenario():
+        for action in actions:
+            await action(queue)
+        await queue.stop()
+    asyncio.run(scenario())
+
+def chat(text):
+    return lambda q: q.save_chat(USER, text, "reply")
+
+def activity(action_type, count=1):
+    return lambda q: q.record_activity(USER, action_type, count)
+
+def test_deltas_are_aggregated_per_user(writes):
+    calls, _ = writes
+    run(queue(), activity("message"), activity("message"), activity("vocab", 3))
+    assert calls["stats"] == [[{"user_id": "u1", "username": "al", "messages": 2, "vocab_lookups": 3}]]
+
+def test_failed_write_is_retried(writes):
+    calls, failures = writes
+    failures["chat"] = 2
+    q = queue()
+    run(q, chat("hola"))
+    assert len(calls["chat"]) == 3
+    assert q.retried == 2
+    assert q.flushed == 1
+    assert q.failed == 0
+
+def test_write_is_dropped_after_retries(writes):
+    calls, failures = writes
+    failures["chat"] = 10
+    q = queue()
+    run(q, chat("hola"))
+    assert len(calls["chat"]) == 3
+    assert q.failed == 1
+    assert q.flushed == 0
+
+def test_chat_failure_does_not_block_stats(writes):
+    calls, failures = writes
+    failures["chat"] = 10
+    q = queue(retries=0)
+    run(q, chat("hola"), activity("message"))
+    assert len(calls["stats"]) == 1
+    assert q.failed == 1
+    assert q.flushed == 1
+
+def test_stop_flushes_everything_queued(writes):
+    calls, _ = writes
+    q = queue(batch_size=2, flush_interval=10)
+    run(q, *(chat(f"m{i}") for i in range(5)))
+    assert [row["message"] for batch in calls["chat"] for row in batch] == [f"m{i}" for i in range(5)]
+    assert q.flushed == 5
@@ -0,0 +1,135 @@
+import asyncio
+import time
+import pytest
+import admission
+from resilience import CircuitBreaker, LLMResilience, Unavailable
+
+def policy(**overrides):
+    settings = dict(deadline=5.0, attempt_timeout=1.0, max_attempts=3, base_delay=0, max_delay=0,
+                    breaker_threshold=2, breaker_reset=30.0)
+    settings.update(overrides)
+    return LLMResilience(**settings)
+
+def failing(error, times):
+    """attempt() that raises `error` for the first `times` calls, then replies"""
+    calls = []
+    async def attempt():
+        calls.append(1)
+        if len(calls) <= times:
+            raise error
+        return "reply"
+    return attempt, calls
+
+def expire(breaker):
+    """Skip the reset timeout: the breaker turns half-open"""
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+# ---- CircuitBreaker ----
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(threshold=5, reset_timeout=30)
+    breaker.opened_at = time.monotonic() - 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_neutral_result_releases_probe():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_neutral()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+# ---- LLMResilience.call ----
+
+def test_transient_errors_are_retried():
+    llm = policy()
+    attempt, calls = failing(asyncio.TimeoutError(), times=2)
+    assert asyncio.run(llm.call("chat", "m", attempt)) == "reply"
+    assert len(calls) == 3
+    assert llm.breaker("m").failures == 0
+
+def test_non_retryable_error_is_raised_without_tripping_breaker():
+    llm = policy()
+    attempt, calls = failing(ValueError("bad request"), times=1)
+    with pytest.raises(ValueError):
+        asyncio.run(llm.call("chat", "m", attempt))
+    assert len(calls) == 1
+    assert llm.breaker("m").failures == 0
+
+def test_admission_rejection_is_not_a_provider_failure():
+    llm = policy()
+    attempt, _ = failing(admission.Rejected("rate_limited", 1, "slow down"), times=1)
+    with pytest.raises(admission.Rejected):
+        asyncio.run(llm.call("chat", "m", attempt))
+    assert llm.breaker("m").failures == 0
+
+def test_exhausted_retries_serve_last_good_reply():
+    llm = policy(max_attempts=2)
+    ok, _ = failing(None, times=0)
+    assert asyncio.run(llm.call("chat", "m", ok, fallback_key="hola")) == "reply"
+
+    broken, calls = failing(asyncio.TimeoutError(), times=10)
+    assert asyncio.run(llm.call("chat", "m", broken, fallback_key="hola")) == "reply"
+    assert len(calls) == 2
+    assert llm.breaker("m").failures == 1
+
+def test_exhausted_retries_without_fallback_raise_unavailable():
+    llm = policy(max_attempts=1)
+    broken, _ = failing(asyncio.TimeoutError(), times=10)
+    with pytest.raises(Unavailable):
+        asyncio.run(llm.call("chat", "m", broken, fallback_key="hola"))
+
+def test_open_breaker_skips_upstream():
+    llm = policy(max_attempts=1, breaker_threshold=1)
+    broken, calls = failing(asyncio.TimeoutError(), times=10)
+    with pytest.raises(Unavailable):
+        asyncio.run(llm.call("chat", "m", broken))
+    with pytest.raises(Unavailable):
+        asyncio.run(llm.call("chat", "m", broken))
+    assert len(calls) == 1
+
+def test_cancelled_probe_releases_half_open_breaker():
+    # Regression: a probe cancelled mid-call (client went away) left the
+    # breaker waiting for its result, so the model stayed skipped forever
+    llm = policy(breaker_threshold=1)
+    breaker = llm.breaker("m")
+    breaker.record_failure()
+    expire(breaker)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        probe = asyncio.create_task(llm.call("chat", "m", hang))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        ok, _ = failing(None, times=0)
+        return await llm.call("chat", "m", ok)
+
+    assert asyncio.run(scenario()) == "reply"
+    assert breaker.state == "closed"
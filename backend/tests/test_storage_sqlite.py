@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from storage_sqlite import SQLiteStorage
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "linguaspark.db")
+
+@pytest.fixture
+def db(path):
+    db = SQLiteStorage(path)
+    yield db
+    asyncio.run(db.close())
+
+def test_create_user_adds_stats_row(db):
+    async def scenario():
+        user = await db.create_user("al", "al@example.com", "hash")
+        return user, await db.get_user_by_username("al"), await db.get_stats(user["id"])
+
+    user, found, stats = asyncio.run(scenario())
+    assert found["id"] == user["id"]
+    assert stats["total_points"] == 0
+    assert stats["level"] == 1
+
+def test_activity_batch_updates_stats_and_daily_rollup(db):
+    async def scenario():
+        user = await db.create_user("al", "al@example.com", "hash")
+        updated = await db.apply_activity_batch([
+            {"user_id": user["id"], "messages": 2, "vocab_lookups": 1},
+            {"user_id": "unknown", "messages": 1},
+        ])
+        daily = await db.get_daily_activity(user["id"], datetime.now(timezone.utc).date())
+        return user, updated, daily
+
+    user, updated, daily = asyncio.run(scenario())
+    assert list(updated) == [user["id"]]
+    assert updated[user["id"]]["total_points"] == 40
+    assert updated[user["id"]]["words_learned"] == 1
+    assert daily[0]["messages"] == 2
+    assert daily[0]["points_earned"] == 40
+
+def test_chat_history_keyset_pages(db):
+    async def scenario():
+        user = await db.create_user("al", "al@example.com", "hash")
+        await db.insert_chat_history([
+            {"user_id": user["id"], "message": f"m{i}", "reply": "r" * 200, "timestamp": "2026-01-01T10:00:00"}
+            for i in range(5)
+        ])
+        first = await db.get_chat_history(user["id"], 3, fields="preview")
+        last = first[-1]
+        rest = await db.get_chat_history(user["id"], 3, (last["timestamp"], last["id"]))
+        return first, rest
+
+    first, rest = asyncio.run(scenario())
+    assert len(first) == 3
+    assert len(first[0]["reply_preview"]) == 160
+    assert len(rest) == 2
+    assert {r["id"] for r in first}.isdisjoint(r["id"] for r in rest)
+
+def test_award_achievements_skips_held_ones(db):
+    async def scenario():
+        user = await db.create_user("al", "al@example.com", "hash")
+        award = {"user_id": user["id"], "achievement_id": "first_message", "achievement_name": "First Steps", "points": 150}
+        first = await db.award_achievements([award])
+        again = await db.award_achievements([award])
+        return first, again, await db.get_earned_achievements([user["id"]])
+
+    first, again, earned = asyncio.run(scenario())
+    assert first[0]["stats"]["total_points"] == 150
+    assert first[0]["stats"]["level"] == 2
+    assert again == []
+    assert list(earned.values()) == [{"first_message"}]
+
+def test_revoke_token_once(db):
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    async def scenario():
+        return await db.revoke_token("jti", expires), await db.revoke_token("jti", expires)
+
+    assert asyncio.run(scenario()) == (True, False)
+
+def test_concurrent_writers_lose_no_increments(path, db):
+    # Regression: two connections (as two worker processes have) used to read
+    # the same stats row and overwrite each other's update
+    other = SQLiteStorage(path)
+
+    async def scenario():
+        user = await db.create_user("al", "al@example.com", "hash")
+        delta = [{"user_id": user["id"], "messages": 1}]
+        await asyncio.gather(*(
+            storage.apply_activity_batch(delta)
+            for _ in range(50)
+            for storage in (db, other)
+        ))
+        return await db.get_stats(user["id"])
+
+    try:
+        assert asyncio.run(scenario())["total_messages"] == 100
+    finally:
+        asyncio.run(other.close())
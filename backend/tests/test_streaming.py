@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from starlette.requests import ClientDisconnect
+import admission
+import fakes
+import main
+import prompts
+
+@pytest.fixture
+def groq(monkeypatch):
+    groq = fakes.FakeGroq(reply="uno dos tres cuatro cinco", latency=0, token_latency=0.001)
+    monkeypatch.setattr(main.gateway, "_groq_client", groq)
+    return groq
+
+def disconnecting_send(after):
+    """ASGI send that fails like a closed socket after `after` body chunks"""
+    sent = []
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            if len(sent) == after:
+                raise OSError("client went away")
+            sent.append(message["body"])
+
+    return send, sent
+
+async def receive():
+    await asyncio.sleep(3600)
+
+SCOPE = {"type": "http", "asgi": {"spec_version": "2.4"}}
+
+def test_disconnect_closes_the_groq_stream_and_frees_the_slot(groq):
+    completed = []
+
+    async def on_complete(text):
+        completed.append(text)
+
+    async def scenario():
+        response = main.sse_response("/chat/stream", prompts.chat("hello", "en", "es", ""), on_complete)
+        send, sent = disconnecting_send(after=2)
+        with pytest.raises(ClientDisconnect):
+            await response(SCOPE, receive, send)
+        # Checked straight away: nothing is left to garbage collection
+        return sent, groq.open_streams, admission.controller.active
+
+    sent, open_streams, active = asyncio.run(scenario())
+    assert len(sent) == 2
+    assert open_streams == 0
+    assert active == 0
+    assert completed == []
+
+def test_finished_stream_sends_done_and_persists(groq):
+    completed = []
+
+    async def on_complete(text):
+        completed.append(text)
+
+    async def scenario():
+        response = main.sse_response("/chat/stream", prompts.chat("hello", "en", "es", ""), on_complete)
+        send, sent = disconnecting_send(after=1000)
+        await response(SCOPE, receive, send)
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert sent[-2].startswith(b"event: done")
+    assert completed == [groq.reply]
+    assert groq.open_streams == 0
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+import auth
+import storage
+import tokens
+
+USER = {"id": "6f1c7a52-0d8e-4b7e-9a51-2b1d3f0c9e11", "username": "al"}
+
+def other_worker():
+    """Forget this process's revocations, as a second worker would not have them"""
+    tokens.signer._revoked.clear()
+
+def test_refresh_rotates_and_rejects_replay_on_every_worker(supabase):
+    pair = tokens.signer.issue_pair(USER)
+
+    async def scenario():
+        rotated = await auth.refresh_session(pair["refresh_token"])
+        other_worker()
+        with pytest.raises(tokens.TokenError, match="revoked"):
+            await auth.refresh_session(pair["refresh_token"])
+        return rotated
+
+    rotated = asyncio.run(scenario())
+    assert tokens.signer.verify(rotated["refresh_token"], "refresh")["sub"] == USER["id"]
+
+def test_logout_revokes_refresh_token_on_every_worker(supabase):
+    pair = tokens.signer.issue_pair(USER)
+
+    async def scenario():
+        await auth.logout_session(tokens.signer.verify(pair["access_token"]), pair["refresh_token"])
+        # The worker that handled the logout also rejects the access token
+        with pytest.raises(tokens.TokenError, match="revoked"):
+            tokens.signer.verify(pair["access_token"])
+        other_worker()
+        with pytest.raises(tokens.TokenError, match="revoked"):
+            await auth.refresh_session(pair["refresh_token"])
+
+    asyncio.run(scenario())
+
+def test_only_one_concurrent_refresh_wins(supabase):
+    pair = tokens.signer.issue_pair(USER)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(auth.refresh_session(pair["refresh_token"]) for _ in range(5)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert sum(isinstance(r, dict) for r in results) == 1
+    assert all(isinstance(r, tokens.TokenError) for r in results if not isinstance(r, dict))
+
+def test_expired_revocations_are_purged(supabase):
+    async def scenario():
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        await storage.db.revoke_token("old", past)
+        await storage.db.revoke_token("new", past + timedelta(days=1))
+
+    asyncio.run(scenario())
+    assert [r["jti"] for r in supabase.rows("revoked_tokens")] == ["new"]
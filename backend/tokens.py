@@ -0,0 +1,133 @@
+"""
+Signed session tokens.
+
+Login issues a short-lived access token and a longer-lived refresh token.
+Both are HMAC-SHA256 signed (JWT HS256 layout) and carry the user's id and
+username, so endpoints identify the caller by checking a signature in memory
+instead of querying the users table.
+
+Revoked tokens (logout, refresh-token rotation) are recorded in the shared
+revoked_tokens table (see auth.revoke_token), which every worker consults
+before accepting a refresh token. Access tokens are checked against this
+process's in-memory copy of the list only, to keep requests free of queries,
+so an access token revoked on another worker stays usable until it expires
+(ACCESS_TOKEN_TTL, 15 minutes by default).
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+import uuid
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class TokenError(Exception):
+    """A token that is malformed, forged, expired, revoked or of the wrong type"""
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _encode_json(data):
+    return _b64encode(json.dumps(data, separators=(',', ':')).encode())
+
+# Only HS256 is accepted, so the header is fixed
+_HEADER = _encode_json({"alg": "HS256", "typ": "JWT"})
+
+class TokenSigner:
+    """Issues and verifies access/refresh tokens with one secret key"""
+
+    def __init__(self, secret, access_ttl=900, refresh_ttl=14 * 86400):
+        self._key = secret.encode()
+        self.ttl = {"access": access_ttl, "refresh": refresh_ttl}
+        self._revoked = {}  # jti -> exp, for tokens revoked through this process
+
+    def _sign(self, signing_input):
+        digest = hmac.new(self._key, signing_input.encode(), hashlib.sha256).digest()
+        return _b64encode(digest)
+
+    def issue(self, user, kind='access'):
+        """Signed token of the given kind for a users row (needs id and username)"""
+        now = int(time.time())
+        claims = {
+            "sub": user['id'],
+            "usr": user['username'],
+            "typ": kind,
+            "iat": now,
+            "exp": now + self.ttl[kind],
+            "jti": uuid.uuid4().hex,
+        }
+        signing_input = f"{_HEADER}.{_encode_json(claims)}"
+        return f"{signing_input}.{self._sign(signing_input)}"
+
+    def issue_pair(self, user):
+        """Access + refresh tokens, in the shape returned to the client"""
+        return {
+            "access_token": self.issue(user, 'access'),
+            "refresh_token": self.issue(user, 'refresh'),
+            "token_type": "bearer",
+            "expires_in": self.ttl['access'],
+        }
+
+    def verify(self, token, kind='access'):
+        """Return the token's claims, or raise TokenError"""
+        try:
+            header, payload, signature = token.split('.')
+        except ValueError:
+            raise TokenError("Malformed token")
+        if header != _HEADER:
+            raise TokenError("Unsupported token header")
+        if not hmac.compare_digest(signature, self._sign(f"{header}.{payload}")):
+            raise TokenError("Invalid token signature")
+
+        try:
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, binascii.Error):
+            raise TokenError("Malformed token")
+
+        if claims.get('typ') != kind:
+            raise TokenError(f"Wrong token type (expected {kind})")
+        if claims.get('exp', 0) <= time.time():
+            raise TokenError("Token expired")
+        if claims.get('jti') in self._revoked:
+            raise TokenError("Token revoked")
+        return claims
+
+    def revoke(self, claims):
+        """Reject this token from now on (until it expires)"""
+        now = time.time()
+        # Expired tokens fail verification anyway, so they can leave the list
+        for jti in [j for j, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[jti]
+        self._revoked[claims['jti']] = claims['exp']
+
+    def stats(self):
+        return {"revoked": len(self._revoked)}
+
+# The value shipped in older .env.example files: public, so never a real key
+PLACEHOLDER_SECRETS = {"change_me_to_a_long_random_string"}
+
+_secret = os.getenv("TOKEN_SECRET")
+if os.getenv("REQUIRE_AUTH_TOKEN", "false").lower() == "true" and (not _secret or _secret in PLACEHOLDER_SECRETS):
+    raise ValueError("⚠️ REQUIRE_AUTH_TOKEN is on: set TOKEN_SECRET to a long random string (not the example value)")
+if _secret in PLACEHOLDER_SECRETS:
+    print("⚠️ TOKEN_SECRET is the public example value - anyone can forge tokens; set your own")
+if not _secret:
+    # Tokens then only survive until restart and are not shared between workers
+    print("⚠️ TOKEN_SECRET is not set - using a random per-process signing key")
+    _secret = secrets.token_urlsafe(32)
+
+signer = TokenSigner(
+    _secret,
+    access_ttl=int(os.getenv("ACCESS_TOKEN_TTL", "900")),
+    refresh_ttl=int(os.getenv("REFRESH_TOKEN_TTL", str(14 * 86400))),
+)
@@ -1,6 +1,64 @@
 const API_URL = 'http://127.0.0.1:8000';
 let currentUser = null;
 let userStats = null;
+let accessToken = localStorage.getItem('linguaspark_access_token');
+let refreshToken = localStorage.getItem('linguaspark_refresh_token');
+
+// ============ SESSION TOKENS ============
+
+function saveTokens(data) {
+    accessToken = data.access_token;
+    refreshToken = data.refresh_token;
+    localStorage.setItem('linguaspark_access_token', accessToken);
+    localStorage.setItem('linguaspark_refresh_token', refreshToken);
+}
+
+function clearTokens() {
+    accessToken = null;
+    refreshToken = null;
+    localStorage.removeItem('linguaspark_access_token');
+    localStorage.removeItem('linguaspark_refresh_token');
+}
+
+async function refreshSession() {
+    /**
+     * Trade the refresh token for a new token pair
+     * Returns false if the session can't be renewed
+     */
+    if (!refreshToken) return false;
+    const response = await fetch(`${API_URL}/token/refresh`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken })
+    });
+    if (!response.ok) {
+        clearTokens();
+        return false;
+    }
+    saveTokens(await response.json());
+    return true;
+}
+
+async function authFetch(path, options = {}) {
+    /**
+     * fetch() with the access token attached
+     * Renews the token once if it has expired
+     */
+    const send = () => fetch(`${API_URL}${path}`, {
+        ...options,
+        headers: {
+            'Content-Type': 'application/json',
+            ...(accessToken ? { 'Authorization': `Bearer ${accessToken}` } : {}),
+            ...(options.headers || {})
+        }
+    });
+
+    let response = await send();
+    if (response.status === 401 && await refreshSession()) {
+        response = await send();
+    }
+    return response;
+}
 
 // ============ AUTH FUNCTIONS ============
 
@@ -72,6 +130,7 @@ async function login() {
         if (response.ok) {
             currentUser = data.user.username;
             userStats = data.user.stats;
+            saveTokens(data);
             localStorage.setItem('linguaspark_user', currentUser);
             showChatScreen();
             updateProgressBar(); // 🆕 NEW: Update progress display
@@ -85,6 +144,15 @@ async function login() {
 }
 
 function logout() {
+    if (accessToken) {
+        // Best effort: the local session is cleared either way
+        fetch(`${API_URL}/logout`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${accessToken}` },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).catch(() => {});
+    }
+    clearTokens();
     currentUser = null;
     userStats = null;
     localStorage.removeItem('linguaspark_user');
@@ -120,7 +188,7 @@ async function loadUserProgress() {
      * Updates XP bar, streak, achievements
      */
     try {
-        const response = await fetch(`${API_URL}/progress/${currentUser}`);
+        const response = await authFetch(`/progress/${currentUser}`);
         const data = await response.json();
         
         if (response.ok && data.stats) {
@@ -293,9 +361,8 @@ async function sendMessage() {
     const typingId = addTypingIndicator();
 
     try {
-        const response = await fetch(`${API_URL}/chat`, {
+        const response = await authFetch('/chat/stream', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 username: currentUser,
                 text: message,
@@ -304,20 +371,42 @@ async function sendMessage() {
             })
         });
 
-        const data = await response.json();
-        
-        removeTypingIndicator(typingId);
+        if (!response.ok) {
+            const data = await response.json();
+            removeTypingIndicator(typingId);
+            addMessage('error', `❌ ${data.detail || 'Error occurred'}`);
+            return;
+        }
 
-        if (response.ok) {
-            addMessage('bot', data.reply);
-            
+        // Render tokens as they arrive instead of waiting for the full reply
+        let reply = '';
+        let botMessage = null;
+        let failed = false;
+        await readEventStream(response, (event, data) => {
+            if (event === 'error') {
+                failed = true;
+                removeTypingIndicator(typingId);
+                addMessage('error', `❌ ${data.error}`);
+                return;
+            }
+            if (data.token) {
+                if (!botMessage) {
+                    removeTypingIndicator(typingId);
+                    botMessage = addMessage('bot', '');
+                }
+                reply += data.token;
+                botMessage.querySelector('p').innerHTML = formatBotResponse(reply);
+                chatBox.scrollTop = chatBox.scrollHeight;
+            }
+        });
+
+        if (!failed) {
+            removeTypingIndicator(typingId);
             // 🆕 NEW: Show XP gain and update progress
             const oldPoints = userStats?.total_points || 0;
             showXPGain(10);
             await loadUserProgress();
             checkLevelUp(oldPoints, userStats?.total_points || 0);
-        } else {
-            addMessage('error', `❌ ${data.detail || 'Error occurred'}`);
         }
 
     } catch (error) {
@@ -354,9 +443,8 @@ async function checkGrammar() {
     resultDiv.innerHTML = '<p class="loading">🔍 Checking grammar...</p>';
 
     try {
-        const response = await fetch(`${API_URL}/grammar-check`, {
+        const response = await authFetch('/grammar-check', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 username: currentUser,
                 text: text,
@@ -366,8 +454,9 @@ async function checkGrammar() {
 
         const data = await response.json();
 
-        if (data.error) {
-            resultDiv.innerHTML = `<p class="error">❌ ${data.error}</p>`;
+        if (data.error || data.detail) {
+            // detail: 429 when the server is busy or the user is rate limited
+            resultDiv.innerHTML = `<p class="error">❌ ${data.error || data.detail}</p>`;
         } else {
             resultDiv.innerHTML = `
                 <div class="grammar-result">
@@ -411,12 +500,17 @@ async function explainVocabulary() {
         return;
     }
 
+    const words = word.split(/[,\n]/).map(w => w.trim()).filter(Boolean);
+    if (words.length > 1) {
+        await explainVocabularyBatch(words, resultDiv);
+        return;
+    }
+
     resultDiv.innerHTML = '<p class="loading">📖 Looking up word...</p>';
 
     try {
-        const response = await fetch(`${API_URL}/vocabulary`, {
+        const response = await authFetch('/vocabulary', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 username: currentUser,
                 word: word,
@@ -426,8 +520,9 @@ async function explainVocabulary() {
 
         const data = await response.json();
 
-        if (data.error) {
-            resultDiv.innerHTML = `<p class="error">❌ ${data.error}</p>`;
+        if (data.error || data.detail) {
+            // detail: 429 when the server is busy or the user is rate limited
+            resultDiv.innerHTML = `<p class="error">❌ ${data.error || data.detail}</p>`;
         } else {
             resultDiv.innerHTML = `
                 <div class="vocab-result">
@@ -449,6 +544,55 @@ async function explainVocabulary() {
     }
 }
 
+// Word lists go to /vocabulary/batch; explanations render as they stream in
+async function explainVocabularyBatch(words, resultDiv) {
+    const language = document.getElementById('targetLang').value;
+    resultDiv.innerHTML = `<p class="loading">📖 Looking up ${words.length} words...</p>`;
+
+    try {
+        const response = await authFetch('/vocabulary/batch', {
+            method: 'POST',
+            body: JSON.stringify({ username: currentUser, words, language })
+        });
+
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            const detail = Array.isArray(data.detail) ? data.detail[0]?.msg : data.detail;
+            resultDiv.innerHTML = `<p class="error">❌ ${escapeHtml(detail || 'Unable to look up these words')}</p>`;
+            return;
+        }
+
+        resultDiv.innerHTML = '';
+        const oldPoints = userStats?.total_points || 0;
+        let explained = 0;
+
+        await readEventStream(response, (event, data) => {
+            if (event === 'word') {
+                const body = data.error
+                    ? `<p class="error">❌ ${escapeHtml(data.error)}</p>`
+                    : `<div class="explanation">${formatBotResponse(escapeHtml(data.explanation))}</div>`;
+                resultDiv.insertAdjacentHTML('beforeend', `
+                    <div class="vocab-result">
+                        <h3>📚 Word: <span class="highlight">${escapeHtml(data.word)}</span></h3>
+                        ${body}
+                    </div>
+                `);
+            } else if (event === 'done') {
+                explained = data.explained;
+            }
+        });
+
+        if (explained > 0) {
+            showXPGain(20 * explained);
+            await loadUserProgress();
+            checkLevelUp(oldPoints, userStats?.total_points || 0);
+        }
+
+    } catch (error) {
+        resultDiv.innerHTML = `<p class="error">❌ Connection Error: ${error.message}</p>`;
+    }
+}
+
 // ============ 🆕 NEW: DASHBOARD FUNCTIONS ============
 
 async function showDashboard() {
@@ -472,13 +616,14 @@ async function loadDashboardData() {
      * Populates stats, achievements, and insights
      */
     try {
-        // Load progress data
-        const progressResponse = await fetch(`${API_URL}/progress/${currentUser}`);
-        const progressData = await progressResponse.json();
+        // Stats, achievements and insights in one request; the browser
+        // revalidates it with If-None-Match, so unchanged data is a 304
+        const response = await authFetch(`/dashboard/${currentUser}`);
+        const data = await response.json();
         
-        if (progressResponse.ok && progressData.stats) {
-            updateDashboardStats(progressData.stats);
-            updateDashboardAchievements(progressData.stats.achievements || []);
+        if (response.ok && data.stats) {
+            updateDashboardStats(data.stats);
+            updateDashboardAchievements((data.achievements || []).map(a => a.achievement_id));
         } else {
             console.warn('Progress data not available');
             // Set default empty stats
@@ -491,12 +636,8 @@ async function loadDashboardData() {
             updateDashboardAchievements([]);
         }
         
-        // Load weekly insights
-        const insightsResponse = await fetch(`${API_URL}/weekly-insights/${currentUser}`);
-        const insightsData = await insightsResponse.json();
-        
-        if (insightsResponse.ok && insightsData) {
-            updateWeeklyInsights(insightsData);
+        if (response.ok && data.weekly_insights) {
+            updateWeeklyInsights(data.weekly_insights);
         } else {
             console.warn('Insights not available');
             // Show default insights
@@ -667,6 +808,37 @@ function addMessage(type, text) {
     
     chatBox.appendChild(messageDiv);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return messageDiv;
+}
+
+async function readEventStream(response, onEvent) {
+    /**
+     * Parse a Server-Sent Events response body
+     * Calls onEvent(eventName, data) for every event received
+     */
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
 }
 
 function addTypingIndicator() {
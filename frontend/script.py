@@ -1,12 +1,262 @@
+"""
+LinguaSpark frontend server.
+
+    python script.py                 # production: in-memory, precompressed, cached
+    python script.py --dev           # serve files from disk, no caching (for editing)
+    python script.py --build dist    # write the production asset set to a directory
+
+Production mode builds the asset set once at startup: every CSS/JS file gets a
+content-hashed name (app.3f9a1c2e.js) that index.html is rewritten to use, and
+is precompressed with gzip (and brotli, if the brotli package is installed).
+Requests are answered from memory by a threaded server:
+
+- hashed assets are cached by browsers for a year (immutable);
+- index.html and the original file names are revalidated on every load,
+  with ETag / Last-Modified and 304 Not Modified responses;
+- the smallest encoding the client accepts is sent, with Vary: Accept-Encoding.
+"""
+
+import argparse
+import gzip
+import hashlib
 import http.server
-import socketserver
+import importlib.util
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+PORT = int(os.getenv("PORT", "3000"))
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Only these are served; anything else in the folder (this script) is not
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".ico": "image/x-icon",
+}
+COMPRESSIBLE = ("text/html", "text/css", "text/javascript", "image/svg+xml")
+HASHED = (".css", ".js")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+BROTLI = importlib.util.find_spec("brotli") is not None
+if BROTLI:
+    import brotli
+
+class Asset:
+    """One URL path: its encodings (identity, gzip, br) and cache validators"""
+
+    def __init__(self, body, content_type, mtime, cache_control):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.mtime = int(mtime)
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.hash = digest[:8]
+        self.encodings = {"identity": (body, f'"{digest}"')}
+
+    def compress(self):
+        """Add precompressed variants that are actually smaller"""
+        body = self.encodings["identity"][0]
+        etag = self.encodings["identity"][1].strip('"')
+        candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if BROTLI:
+            candidates["br"] = brotli.compress(body, quality=11)
+        for encoding, compressed in candidates.items():
+            if len(compressed) < len(body):
+                self.encodings[encoding] = (compressed, f'"{etag}-{encoding}"')
+
+def hashed_name(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+def build(root=ROOT):
+    """Map URL paths to Assets: hashed CSS/JS, original names, and index.html"""
+    assets = {}
+    renames = {}
+    files = sorted(
+        f for f in os.listdir(root)
+        if os.path.splitext(f)[1] in CONTENT_TYPES and os.path.isfile(os.path.join(root, f))
+    )
+
+    for name in files:
+        ext = os.path.splitext(name)[1]
+        if ext == ".html":
+            continue
+        path = os.path.join(root, name)
+        with open(path, "rb") as f:
+            body = f.read()
+        mtime = os.path.getmtime(path)
+        # The original name keeps working (revalidated); the hashed one never changes
+        assets[f"/{name}"] = Asset(body, CONTENT_TYPES[ext], mtime, REVALIDATE)
+        if ext in HASHED:
+            renames[name] = hashed_name(name, assets[f"/{name}"].hash)
+            assets[f"/{renames[name]}"] = Asset(body, CONTENT_TYPES[ext], mtime, IMMUTABLE)
+
+    for name in files:
+        if not name.endswith(".html"):
+            continue
+        path = os.path.join(root, name)
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        # Point <link href> / <script src> at the hashed file names
+        for original, renamed in renames.items():
+            html = re.sub(rf'(\b(?:href|src)=["\']){re.escape(original)}(["\'])', rf'\g<1>{renamed}\g<2>', html)
+        assets[f"/{name}"] = Asset(html.encode("utf-8"), CONTENT_TYPES[".html"], os.path.getmtime(path), REVALIDATE)
+
+    if "/index.html" in assets:
+        assets["/"] = assets["/index.html"]
+    for asset in set(assets.values()):
+        if asset.content_type.split(";")[0] in COMPRESSIBLE:
+            asset.compress()
+    return assets
+
+def write_build(assets, out_dir):
+    """Write the asset set to disk (app.<hash>.js, app.<hash>.js.gz, ...) for a CDN or nginx gzip_static"""
+    os.makedirs(out_dir, exist_ok=True)
+    suffixes = {"identity": "", "gzip": ".gz", "br": ".br"}
+    for path, asset in assets.items():
+        if path == "/":
+            continue
+        for encoding, (body, _) in asset.encodings.items():
+            with open(os.path.join(out_dir, path.lstrip("/") + suffixes[encoding]), "wb") as f:
+                f.write(body)
+    print(f"✅ Wrote {len(assets) - 1} assets to {out_dir}")
+
+def accepted_encodings(header):
+    """Encodings the client accepts (q > 0), from an Accept-Encoding header"""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def etag_matches(header, etag):
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+class AssetHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the in-memory asset set built by build()"""
+
+    assets = {}
+    server_version = "LinguaSpark"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _serve(self, head):
+        path = self.path.split("?", 1)[0].split("#", 1)[0]
+        asset = self.assets.get(path)
+        if asset is None:
+            body = b"Not found"
+            self.send_response(404)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+            return
+
+        accepted = accepted_encodings(self.headers.get("Accept-Encoding"))
+        encoding = next((e for e in ("br", "gzip") if e in accepted and e in asset.encodings), "identity")
+        body, etag = asset.encodings[encoding]
+
+        if self._not_modified(asset, etag):
+            self.send_response(304)
+            self._validators(asset, etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", asset.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self._validators(asset, etag)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _not_modified(self, asset, etag):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return asset.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _validators(self, asset, etag):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", asset.last_modified)
+        self.send_header("Cache-Control", asset.cache_control)
+        if len(asset.encodings) > 1:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def log_message(self, format, *args):
+        pass
+
+class DevHandler(http.server.SimpleHTTPRequestHandler):
+    """Files straight from disk, never cached, so edits show up on reload"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=ROOT, **kwargs)
+
+    def end_headers(self):
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+def main():
+    parser = argparse.ArgumentParser(description="LinguaSpark frontend server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--dev", action="store_true", help="serve files from disk without caching")
+    parser.add_argument("--build", metavar="DIR", help="write hashed, precompressed assets to DIR and exit")
+    args = parser.parse_args()
+
+    if args.build:
+        write_build(build(), args.build)
+        return
+
+    if args.dev:
+        handler = DevHandler
+    else:
+        handler = AssetHandler
+        handler.assets = build()
+        encodings = "gzip + brotli" if BROTLI else "gzip"
+        print(f"📦 {len(handler.assets)} assets in memory ({encodings})")
 
-PORT = 3000
+    print("🌟 Starting LinguaSpark Frontend...")
+    print(f"💻 Open your browser at: http://localhost:{args.port}")
+    print("Press Ctrl+C to stop the server")
 
-print("🌟 Starting LinguaSpark Frontend...")
-print(f"💻 Open your browser at: http://localhost:{PORT}")
-print("Press Ctrl+C to stop the server")
+    # One thread per connection: a slow client no longer blocks everyone else
+    with http.server.ThreadingHTTPServer(("", args.port), handler) as httpd:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
-Handler = http.server.SimpleHTTPRequestHandler
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    httpd.serve_forever()
\ No newline at end of file
+if __name__ == "__main__":
+    main()